@@ -0,0 +1 @@
+"""Benchmarks and local stand-ins used to measure sprig's performance."""
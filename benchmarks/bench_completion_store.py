@@ -0,0 +1,97 @@
+"""Measure the completion cache kept across sessions.
+
+First a store of --entries synthetic completions is written to a
+temporary database and read back, and lookups (hits and misses) are
+timed. Then the keystroke trace of bench_keystroke_trace is replayed
+twice against the same database, as two sessions one after the other:
+the second one should be answered mostly from the cache, with far fewer
+requests.
+
+    python -m benchmarks.bench_completion_store --entries 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sprig.completion_store import CompletionStore
+from .bench_keystroke_trace import COMMANDS, complete_command, replay, synthetic_trace
+from .mock_openrouter import MockOpenRouter
+
+
+def _percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50": round(statistics.median(samples) * 1e6, 2),
+        "p99": round(samples[int(len(samples) * 0.99)] * 1e6, 2),
+    }
+
+
+async def measure_store(path: str, entries: int) -> dict:
+    rng = random.Random(0)
+    cwd, context = "/home/user/project", CompletionStore.context_key(["git status"])
+    store = CompletionStore(path, max_entries=entries)
+    await store.load()
+    prefixes = []
+    for i in range(entries):
+        prefix = f"cmd{i} --flag {rng.randrange(1000)}"
+        prefixes.append(prefix)
+        store.put(prefix, cwd, context, f" --option value-{i}")
+    start = time.perf_counter()
+    await store.aclose()
+    write = time.perf_counter() - start
+
+    store = CompletionStore(path, max_entries=entries)
+    start = time.perf_counter()
+    await store.load()
+    load = time.perf_counter() - start
+
+    hits, misses = [], []
+    for prefix in rng.sample(prefixes, 2000):
+        typed = prefix + " --opt"  # Typing along the suggestion
+        start = time.perf_counter()
+        assert store.lookup(typed, cwd, context) is not None
+        hits.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        assert store.lookup(typed + "x", cwd, context) is None
+        misses.append(time.perf_counter() - start)
+    await store.aclose()
+    return {
+        "entries": len(store),
+        "write_all_ms": round(write * 1000, 1),
+        "load_ms": round(load * 1000, 1),
+        "lookup_hit_us": _percentiles(hits),
+        "lookup_miss_us": _percentiles(misses),
+        "file_kb": round(os.path.getsize(path) / 1024),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ.setdefault("SPRIG_HISTORY_FILE", os.devnull)  # Keep benchmark commands out of the user's history
+    with tempfile.TemporaryDirectory() as directory:
+        results = {"store": await measure_store(os.path.join(directory, "store.sqlite3"), args.entries)}
+        os.environ["SPRIG_COMPLETION_CACHE"] = os.path.join(directory, "sessions.sqlite3")
+        trace = synthetic_trace(COMMANDS, args.seed)
+        for session in ("cold_session", "warm_session"):
+            async with MockOpenRouter(ttft=args.ttft, completer=complete_command) as server:
+                os.environ["OPENROUTER_BASE_URL"] = server.url
+                results[session] = await replay(trace, server, "adaptive")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=20_000)
+    parser.add_argument("--ttft", type=float, default=0.25, help="Stand-in time to first token")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
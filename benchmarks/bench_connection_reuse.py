@@ -0,0 +1,64 @@
+"""Measure connection reuse and time-to-first-suggestion of AICompleter.
+
+Runs a batch of completions against the local SSE stand-in, once with the
+shared pooled client and once closing the client before every request (the
+old one-client-per-request behaviour), and reports the number of TCP
+connections the server accepted for each.
+
+    python -m benchmarks.bench_connection_reuse --requests 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from .mock_openrouter import MockOpenRouter
+
+
+async def _run(completer, requests: int, fresh_client: bool) -> list:
+    timings = []
+    for _ in range(requests):
+        if fresh_client:
+            await completer.aclose()
+        start = time.perf_counter()
+        first = None
+        async for _suggestion in completer.get_completion("> git ", "> git add ."):
+            if first is None:
+                first = time.perf_counter() - start
+        timings.append(first)
+    return timings
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    results = {}
+    for mode in ("pooled", "fresh_client"):
+        async with MockOpenRouter(ttft=args.ttft) as server:
+            os.environ["OPENROUTER_BASE_URL"] = server.url
+            os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+            from sprig.ai_completer import AICompleter
+
+            completer = AICompleter("gpt-4o-mini")
+            await completer.warm_up()
+            timings = await _run(completer, args.requests, fresh_client=(mode == "fresh_client"))
+            await completer.aclose()
+            results[mode] = {
+                "requests": args.requests,
+                "connections": server.connections,
+                "ttfs_p50_ms": statistics.median(timings) * 1000,
+                "ttfs_max_ms": max(timings) * 1000,
+            }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--ttft", type=float, default=0.0, help="Server delay before the first token")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Round trips to the completion daemon (`python -m sprig serve`).
+
+The daemon runs as its own process against the local OpenRouter stand-in,
+with a completion cache that is not kept on disk. Reported, in ms:
+
+- python_process: starting Python and importing the completion stack,
+  which a process-per-request client would pay before doing anything
+- miss: round trip for inputs the daemon has not seen (about --ttft)
+- hit: round trip for inputs it has answered before, over a fresh
+  connection each time like the bash and zsh clients
+- cancel: from sending `cancel` to receiving the (empty) reply
+- shells: --shells clients at once, each sending a batch of requests on
+  one connection; overlapping inputs share a model request
+
+    python -m benchmarks.bench_daemon --shells 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from .mock_openrouter import MockOpenRouter
+
+COMMANDS = ["git status", "git commit -m", "docker compose up -d", "kubectl get pods -n", "ls -la",
+            "python -m pytest -q", "make test", "cargo build --release"]
+
+
+def _ms(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50": round(statistics.median(samples) * 1000, 3),
+        "p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+    }
+
+
+async def _round_trip(socket_path: str, lines: list) -> list:
+    """Send `lines` on one connection, half-close it and return the replies."""
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write("".join(line + "\n" for line in lines).encode())
+    await writer.drain()
+    writer.write_eof()
+    replies = (await reader.read()).decode().splitlines()
+    writer.close()
+    return replies
+
+
+async def _timed(socket_path: str, request_id: str, text: str) -> float:
+    start = time.perf_counter()
+    await _round_trip(socket_path, [f"complete\t{request_id}\t/home/user\t{text}\tcd /home/user"])
+    return time.perf_counter() - start
+
+
+async def _cancel_latency(socket_path: str, text: str) -> float:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(f"complete\t1\t/home/user\t{text}\n".encode())
+    await writer.drain()
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    writer.write(b"cancel\t1\n")
+    await writer.drain()
+    await reader.readline()
+    elapsed = time.perf_counter() - start
+    writer.close()
+    return elapsed
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import sprig.completion_server"], check=True)
+    results = {"python_process_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    completer = lambda text: [" --help"]  # noqa: E731
+    with tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "sprig.sock")
+        async with MockOpenRouter(ttft=args.ttft, completer=completer) as server:
+            env = dict(os.environ, OPENROUTER_BASE_URL=server.url, OPENROUTER_API_KEY="benchmark")
+            daemon = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "sprig", "serve", "--socket", socket_path, "--model", "gpt-4o-mini",
+                "--completion-cache", ":memory:", env=env, stdout=asyncio.subprocess.PIPE,
+            )
+            try:
+                await daemon.stdout.readline()  # Listening
+                inputs = [f"{command} {i}" for i in range(args.requests // len(COMMANDS) + 1)
+                          for command in COMMANDS][:args.requests]
+                misses = [await _timed(socket_path, str(i), text) for i, text in enumerate(inputs)]
+                hits = [await _timed(socket_path, str(i), text) for i, text in enumerate(inputs)]
+                results["miss_ms"] = _ms(misses)
+                results["hit_ms"] = _ms(hits)
+                results["cancel_ms"] = _ms([await _cancel_latency(socket_path, f"cancelled {i}")
+                                            for i in range(20)])
+
+                requests_before = server.requests
+                start = time.perf_counter()
+                batches = [[f"complete\t{n}\t/srv\t{COMMANDS[(shell + n) % len(COMMANDS)]} -v"
+                            for n in range(args.batch)] for shell in range(args.shells)]
+                replies = await asyncio.gather(*(_round_trip(socket_path, batch) for batch in batches))
+                results["shells"] = {
+                    "shells": args.shells,
+                    "requests": args.shells * args.batch,
+                    "answered": sum(len(r) for r in replies),
+                    "model_requests": server.requests - requests_before,
+                    "wall_ms": round((time.perf_counter() - start) * 1000, 1),
+                }
+                stats = await _round_trip(socket_path, ["stats"])
+                results["daemon"] = json.loads(stats[0].split("\t", 1)[1])["server_ms"]
+            finally:
+                daemon.terminate()
+                await daemon.wait()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="Distinct inputs timed for misses and hits")
+    parser.add_argument("--shells", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=5, help="Requests per shell connection")
+    parser.add_argument("--ttft", type=float, default=0.1, help="Stand-in time to first token")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""How the completion governor copes with a failing API.
+
+A stand-in session types the keystroke trace over and over (each round
+prefixed differently, so the cache cannot answer it) against the local
+OpenRouter stand-in, which goes through phases: healthy, then
+answering every request with a 503, then leaving every request hanging,
+then healthy again. It runs once with the governor passing everything
+through, as before, and once with the circuit breaker on. Reported per
+phase: requests that reached the stand-in, how many failed or hung, and
+suggestions shown (from the model, the cache or the local history and
+path index); and the seconds from the API recovering to the first
+request it answered again, which with the circuit breaker waits out the
+cooldown.
+
+    python -m benchmarks.bench_governor --phase-seconds 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from .bench_keystroke_trace import COMMANDS, complete_command, synthetic_trace
+from .mock_openrouter import MockOpenRouter
+
+PHASES = [  # Name, failure rate, hang rate
+    ("healthy", 0.0, 0.0),
+    ("errors", 1.0, 0.0),
+    ("hangs", 0.0, 1.0),
+    ("recovered", 0.0, 0.0),
+]
+
+
+class _Session:
+    current_input = ""
+
+
+async def _type(client, terminal: _Session, deadline: float, shown: list) -> None:
+    seed = 0
+    while time.monotonic() < deadline:
+        commands = [f"echo round {seed}; {command}" for command in COMMANDS]  # New to the cache every round
+        for delay, key in synthetic_trace(commands, seed):
+            if time.monotonic() >= deadline:
+                return
+            await asyncio.sleep(delay)
+            if key == "enter":
+                client.cancel_pending()
+                client.record_command(terminal.current_input)
+                terminal.current_input = ""
+            elif key == "backspace":
+                terminal.current_input = terminal.current_input[:-1]
+            else:
+                terminal.current_input += key
+            client.on_input_changed()
+        seed += 1
+
+
+async def run(args: argparse.Namespace, governed: bool) -> dict:
+    from sprig.autocomplete_client import AutocompleteClient
+    from sprig.completion_service import CompletionService
+    from sprig.completion_store import CompletionStore
+    from sprig.history_store import HistoryStore
+
+    async with MockOpenRouter(ttft=args.ttft, completer=complete_command, failure_status=503) as server:
+        os.environ["OPENROUTER_BASE_URL"] = server.url
+        service = CompletionService("gpt-4o-mini", history=HistoryStore(os.devnull),
+                                    store=CompletionStore(":memory:"))
+        service.governor.enabled = governed
+        terminal = _Session()
+        client = AutocompleteClient(terminal, service=service)
+        await client.warm_up()
+        shown = []
+        client.set_suggestion_callback(lambda tail: tail and shown.append(terminal.current_input + tail))
+
+        seconds = [args.phase_seconds] * (len(PHASES) - 1) + [args.recovery_seconds]
+        typing = asyncio.create_task(_type(client, terminal, time.monotonic() + sum(seconds), shown))
+        results = {}
+        recovery = None
+        for (name, failure_rate, hang_rate), phase_seconds in zip(PHASES, seconds):
+            server.failure_rate, server.hang_rate = failure_rate, hang_rate
+            before = (server.requests, server.failed, server.hung, len(shown))
+            served = server.requests - server.failed - server.hung
+            start = time.monotonic()
+            while time.monotonic() - start < phase_seconds:
+                await asyncio.sleep(0.05)
+                if name == "recovered" and recovery is None and \
+                        server.requests - server.failed - server.hung > served:
+                    recovery = round(time.monotonic() - start, 2)
+            results[name] = {
+                "requests": server.requests - before[0],
+                "failed": server.failed - before[1],
+                "hung": server.hung - before[2],
+                "suggestions_shown": len(shown) - before[3],
+            }
+        await typing
+        await client.aclose()
+        await service.aclose()
+        results["recovery_s"] = recovery
+        results["governor"] = service.governor.stats
+        return results
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    return {"ungoverned": await run(args, governed=False), "governed": await run(args, governed=True)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--phase-seconds", type=float, default=15.0, help="How long each phase lasts")
+    parser.add_argument("--recovery-seconds", type=float, default=30.0,
+                        help="How long the last phase lasts; the circuit may stay open for up to a minute")
+    parser.add_argument("--ttft", type=float, default=0.25, help="Stand-in time to first token when healthy")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare time to first suggestion for a single model, hedging and racing.
+
+Two local OpenRouter stand-ins play the two models. The primary is fast
+but, with probability ``--slow-rate``, stalls for ``--slow-ttft`` seconds
+(a slow provider route); the secondary is steadily slower. Each policy
+sends the same number of sequential requests and reports latency
+percentiles and how many requests reached the secondary.
+
+    python -m benchmarks.bench_hedging --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from typing import Callable, List
+
+from .mock_openrouter import MockOpenRouter
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def primary_ttft(args: argparse.Namespace, rng: random.Random) -> Callable[[], float]:
+    def ttft() -> float:
+        if rng.random() < args.slow_rate:
+            return args.slow_ttft
+        return max(0.0, rng.gauss(args.fast_ttft, args.fast_ttft / 5))
+    return ttft
+
+
+async def run_policy(policy: str, args: argparse.Namespace) -> dict:
+    from sprig.ai_completer import AICompleter
+    from sprig.hedging import HedgedCompleter
+
+    rng = random.Random(args.seed)
+    async with MockOpenRouter(ttft=primary_ttft(args, rng)) as primary_server, \
+            MockOpenRouter(ttft=args.secondary_ttft) as secondary_server:
+        primary = AICompleter("gpt-4o-mini", base_url=primary_server.url)
+        if policy == "single":
+            completer = primary
+        else:
+            secondary = AICompleter("anthropic-sonnet", base_url=secondary_server.url, client=primary.client)
+            completer = HedgedCompleter(primary, secondary, mode=policy)
+        await completer.warm_up()
+
+        latencies = []
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            completion = completer.get_completion("git ", "")
+            try:
+                async for _suggestion in completion:
+                    latencies.append(time.perf_counter() - start)
+                    break
+            finally:
+                await completion.aclose()
+        await completer.aclose()
+
+    result = {
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+        "primary_requests": primary_server.requests - 1,  # Minus the warm-up request
+        "secondary_requests": max(0, secondary_server.requests - 1),
+    }
+    if policy != "single":
+        result.update(completer.stats)
+    return result
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    return {policy: await run_policy(policy, args) for policy in ("single", "hedge", "race")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--fast-ttft", type=float, default=0.05, help="Primary's usual time to first token")
+    parser.add_argument("--slow-ttft", type=float, default=1.5, help="Primary's time to first token when slow")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="Share of primary requests that are slow")
+    parser.add_argument("--secondary-ttft", type=float, default=0.15, help="Secondary's time to first token")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Interrupt an output flood in SprigApp and time how quickly it stops.
+
+Runs `yes | head -n N` on the real pseudo-terminal shell (POSIX only),
+types a few keys while it floods, then presses Ctrl+C. Reports the key
+handling delay during the flood, the time from Ctrl+C until output stops
+reaching the screen, and frame times.
+
+    python -m benchmarks.bench_interrupt --lines 5000000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from textual.events import Key
+
+from .suite import FrameProbe, wait_for
+
+
+async def measure(lines: int, flood_seconds: float, width: int, height: int) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ.setdefault("SPRIG_HISTORY_FILE", os.devnull)  # Keep benchmark commands out of the user's history
+    os.environ.setdefault("SPRIG_COMPLETION_CACHE", ":memory:")  # Start every run with a cold cache
+    os.environ.setdefault("OPENROUTER_BASE_URL", "http://127.0.0.1:9")  # Completions are not measured
+    from sprig.app import SprigApp
+
+    app = SprigApp(model_name="gpt-4o-mini")
+    terminal = app.terminal
+    probe = FrameProbe(terminal)
+    output_times = []
+    chars = 0
+    handle_output = terminal.handle_shell_output
+
+    async def timed_output(text):
+        nonlocal chars
+        chars += len(text)
+        output_times.append(time.perf_counter())
+        await handle_output(text)
+
+    # Keys are timed where their effects land: the input changing, the interrupt being sent
+    key_times = {}
+    input_changed = terminal.autocomplete.on_input_changed
+
+    def timed_input_changed():
+        if terminal.current_input:
+            key_times.setdefault(terminal.current_input[-1], time.perf_counter())
+        input_changed()
+
+    terminal.handle_shell_output = timed_output
+    terminal.autocomplete.on_input_changed = timed_input_changed
+
+    async with app.run_test(size=(width, height)) as pilot:
+        await wait_for(lambda: terminal.shell.process is not None, 10)
+        await asyncio.sleep(1.0)  # Let the shell read its rc files
+        send_interrupt = terminal.shell.send_interrupt
+
+        def timed_interrupt():
+            key_times["ctrl+c"] = time.perf_counter()
+            send_interrupt()
+
+        terminal.shell.send_interrupt = timed_interrupt
+        command = f"yes | head -n {lines}"
+        terminal.current_input = command
+        terminal.cursor_position = len(command)
+        await pilot.press("enter")
+        await wait_for(lambda: terminal.flooding, 10)
+        probe.reset()
+        flood_start, start_chars = time.perf_counter(), chars
+
+        key_delays = []
+        for key in "abc":
+            await asyncio.sleep(flood_seconds / 4)
+            sent = time.perf_counter()
+            app.post_message(Key(key, key))  # As the driver does, without the pilot's waits
+            await wait_for(lambda: key in key_times, 5)
+            key_delays.append(key_times[key] - sent)
+
+        pressed, flood_chars = time.perf_counter(), chars - start_chars
+        app.post_message(Key("ctrl+c", None))
+        await wait_for(lambda: "ctrl+c" in key_times, 5)
+        handled = key_times["ctrl+c"]
+        await asyncio.sleep(1.0)
+        probe.flush()
+        after = [t for t in output_times if t > handled]
+
+    return {
+        "lines": lines,
+        "flood_mb_per_sec": round(flood_chars / (pressed - flood_start) / 1e6, 1),
+        "key_delay_ms": [round(d * 1000, 2) for d in key_delays],
+        "interrupt_handled_ms": round((handled - pressed) * 1000, 2),
+        "output_after_interrupt_ms": round(((after[-1] if after else handled) - handled) * 1000, 2),
+        "chunks_after_interrupt": len(after),
+        "frames": len(probe.frames),
+        "frame_ms": probe.frames.summary(1000),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5_000_000)
+    parser.add_argument("--flood-seconds", type=float, default=1.0, help="Flood time before Ctrl+C")
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=40)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(measure(args.lines, args.flood_seconds, args.width, args.height)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
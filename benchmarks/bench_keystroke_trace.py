@@ -0,0 +1,152 @@
+"""Replay a keystroke trace and count completion requests against suggestions shown.
+
+The trace is replayed in real time against AutocompleteClient and the
+local OpenRouter stand-in, once with the event-driven adaptive debounce,
+once with the old fixed 200 ms poll and once with the adaptive debounce
+but a single suggestion per request. The stand-in completes the input to
+every command in COMMANDS it could be, one per line, so a "useful"
+suggestion is one that matches what the user went on to type.
+
+A trace is a JSON list of ``[seconds_since_previous_key, key]`` pairs,
+where key is a single character, "backspace" or "enter". Without
+``--trace`` a synthetic trace with human-like timing is generated.
+
+    python -m benchmarks.bench_keystroke_trace --ttft 0.25
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+from typing import List
+
+from .mock_openrouter import MockOpenRouter
+
+COMMANDS = [
+    "git status",
+    "git commit -m 'fix parser'",
+    "docker compose up -d",
+    "kubectl get pods -n staging",
+    "python -m pytest -q",
+    "ls -la",
+    "git status",
+    "docker compose logs -f web",
+]
+
+
+def synthetic_trace(commands: List[str], seed: int = 0) -> list:
+    """Type each command with jittered gaps and the odd pause between words."""
+    rng = random.Random(seed)
+    trace = []
+    for command in commands:
+        delay = rng.uniform(0.8, 1.5)
+        for char in command:
+            trace.append([round(delay, 3), char])
+            delay = max(0.03, rng.gauss(0.11, 0.04))
+            if char == " " and rng.random() < 0.25:
+                delay += rng.uniform(0.3, 0.9)
+        trace.append([round(rng.uniform(0.3, 0.8), 3), "enter"])
+    return trace
+
+
+def complete_command(text: str) -> List[str]:
+    """Stand-in completer: the rest of each command in COMMANDS that starts with `text`, one per line."""
+    tails = []
+    for command in COMMANDS:
+        tail = command[len(text):]
+        if command.startswith(text) and tail and tail not in tails:
+            tails.append(tail)
+    tokens = []
+    for tail in tails or ["--help"]:
+        tokens += [tail, "\n"]
+    return tokens[:-1]
+
+
+class _TraceTerminal:
+    current_input = ""
+
+
+async def replay(trace: list, server: MockOpenRouter, policy: str, candidates: int = 3) -> dict:
+    from sprig.autocomplete_client import AutocompleteClient
+
+    terminal = _TraceTerminal()
+    client = AutocompleteClient(terminal, "gpt-4o-mini", candidates=candidates)
+    await client.warm_up()
+    shown = []
+    client.set_suggestion_callback(lambda tail: tail and shown.append(terminal.current_input + tail))
+
+    poller = None
+    if policy == "poll":
+        async def poll():
+            while True:
+                await asyncio.sleep(0.2)
+                client.check_for_autocomplete()
+        poller = asyncio.create_task(poll())
+
+    requests_before = server.requests
+    aborted_before = server.aborted
+    typed = []
+    for delay, key in trace:
+        await asyncio.sleep(delay)
+        if key == "enter":
+            client.cancel_pending()
+            typed.append(terminal.current_input)
+            client.record_command(terminal.current_input)
+            terminal.current_input = ""
+        elif key == "backspace":
+            terminal.current_input = terminal.current_input[:-1]
+        else:
+            terminal.current_input += key
+        if policy == "adaptive":
+            client.on_input_changed()
+    await asyncio.sleep(0.5)
+
+    if poller:
+        poller.cancel()
+    await client.aclose()
+    useful = sum(1 for suggestion in shown if suggestion in typed)
+    return {
+        "requests": server.requests - requests_before,
+        "aborted_streams": server.aborted - aborted_before,
+        "suggestions_shown": len(shown),
+        "useful_suggestions": useful,
+        "requests_per_command": (server.requests - requests_before) / max(1, len(typed)),
+        "candidate_hits": client.stats.counters["candidate_hits"],
+        "cache_hits": client.stats.counters["cache_hits"],
+        "stored_hits": client.stats.counters["stored_hits"],
+        "local_hits": client.stats.counters["local_hits"],
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    if args.trace:
+        with open(args.trace) as f:
+            trace = json.load(f)
+    else:
+        trace = synthetic_trace(COMMANDS, args.seed)
+
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ.setdefault("SPRIG_HISTORY_FILE", os.devnull)  # Keep benchmark commands out of the user's history
+    os.environ.setdefault("SPRIG_COMPLETION_CACHE", ":memory:")  # Start every run with a cold cache
+    results = {}
+    runs = {"poll": ("poll", args.candidates), "adaptive": ("adaptive", args.candidates),
+            "adaptive_one_candidate": ("adaptive", 1)}
+    for name, (policy, candidates) in runs.items():
+        async with MockOpenRouter(ttft=args.ttft, completer=complete_command) as server:
+            os.environ["OPENROUTER_BASE_URL"] = server.url
+            results[name] = await replay(trace, server, policy, candidates)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trace", help="JSON keystroke trace to replay")
+    parser.add_argument("--ttft", type=float, default=0.25, help="Stand-in time to first token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--candidates", type=int, default=3, help="Suggestions asked for per request")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
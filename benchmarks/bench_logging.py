@@ -0,0 +1,63 @@
+"""Measure what logging costs the calling thread (the event loop in the app).
+
+Logs SSE-chunk-like debug records through the old synchronous
+RotatingFileHandler setup and through the queue pipeline in
+sprig.logging_config, with the logger at DEBUG and at INFO, and reports
+the time per call on the caller's side.
+
+    python -m benchmarks.bench_logging --records 20000
+"""
+import argparse
+import json
+import logging
+import tempfile
+import time
+from logging.handlers import RotatingFileHandler
+
+from sprig.logging_config import LOG_FORMAT, _start_pipeline
+
+CHUNK = '{"choices": [{"index": 0, "delta": {"content": " --short"}}]}'
+
+
+def _time_calls(logger: logging.Logger, records: int) -> float:
+    start = time.perf_counter()
+    for i in range(records):
+        logger.debug("Processing chunk %d: %s", i, CHUNK)
+    return (time.perf_counter() - start) / records * 1e6
+
+
+def run(setup: str, level: int, records: int, log_dir: str) -> float:
+    logger = logging.getLogger(f"bench.{setup}.{logging.getLevelName(level)}")
+    logger.propagate = False
+    logger.setLevel(level)
+    listener = None
+    if setup == "sync":
+        handler = RotatingFileHandler(f"{log_dir}/{logger.name}.log", maxBytes=1024*1024, backupCount=5)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    else:
+        listener = _start_pipeline(logger, f"{logger.name}.log", log_dir)
+    try:
+        return _time_calls(logger, records)
+    finally:
+        if listener:
+            listener.stop()
+        for handler in logger.handlers:
+            handler.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+    results = {}
+    with tempfile.TemporaryDirectory() as log_dir:
+        for setup in ("sync", "queued"):
+            for level in (logging.DEBUG, logging.INFO):
+                key = f"{setup}_{logging.getLevelName(level).lower()}_us_per_call"
+                results[key] = round(run(setup, level, args.records, log_dir), 3)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Build time, query latency and freshness of the local path and command index.
+
+A synthetic tree of --files files, spread over --dirs directories up to
+four levels deep, is generated in a temporary directory. Reported:
+
+- build_ms: listing the tree (PathIndex.set_root) and PATH, on the worker
+- path_query_us / command_query_us: PathIndex.complete for path arguments
+  and command names, p50 and p99 in microseconds
+- answered: share of the queries the index was sure enough to answer,
+  i.e. that would not go to the model
+- fresh_ms: from creating a file to the index completing it, with queries
+  made every 10 ms as if the user were typing
+
+    python -m benchmarks.bench_path_index --files 20000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sprig.path_index import PathIndex
+
+WORDS = ["src", "lib", "test", "docs", "build", "config", "util", "main", "parser", "server", "client", "model"]
+
+
+def _us(samples: list) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50": round(statistics.median(samples) * 1e6, 2),
+        "p99": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 2),
+    }
+
+
+def _make_tree(root: str, files: int, dirs: int, rng: random.Random) -> list:
+    directories = [""]
+    for i in range(dirs):
+        parent = rng.choice([d for d in directories if d.count("/") < 3])
+        directories.append(os.path.join(parent, f"{rng.choice(WORDS)}_{i}"))
+        os.mkdir(os.path.join(root, directories[-1]))
+    paths = []
+    for i in range(files):
+        path = os.path.join(rng.choice(directories), f"{rng.choice(WORDS)}_{i}.py")
+        open(os.path.join(root, path), "w").close()
+        paths.append(path)
+    return paths
+
+
+def _wait_idle(index: PathIndex) -> None:
+    index._executor.submit(lambda: None).result()  # One worker, so this runs after everything queued
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument("--dirs", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        paths = _make_tree(root, args.files, args.dirs, rng)
+        index = PathIndex()
+        start = time.perf_counter()
+        index.set_root(root)
+        index.complete("ls", root)  # Lists PATH too
+        _wait_idle(index)
+        results["build_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        results["directories"] = len(index._listings)
+        results["commands"] = len(index._commands)
+
+        queries = []
+        for path in rng.sample(paths, min(args.queries, len(paths))):
+            queries.append("vim " + path[:rng.randint(1, len(path))])
+        commands = index._commands
+        command_queries = [command[:rng.randint(1, len(command))] for command in rng.choices(commands, k=args.queries)]
+        for name, batch in (("path", queries), ("command", command_queries)):
+            samples, answered = [], 0
+            for text in batch:
+                start = time.perf_counter()
+                answer = index.complete(text, root)
+                samples.append(time.perf_counter() - start)
+                answered += answer is not None
+            results[f"{name}_query_us"] = _us(samples)
+            results[f"{name}_answered"] = round(answered / len(batch), 3)
+
+        fresh = []
+        for i in range(5):
+            time.sleep(index.CHECK_INTERVAL)  # Let the listing go stale, as it would between prompts
+            open(os.path.join(root, f"zz_new_{i}.txt"), "w").close()
+            start = time.perf_counter()
+            while index.complete(f"cat zz_new_{i}", root) is None:
+                time.sleep(0.01)
+            fresh.append(time.perf_counter() - start)
+        results["fresh_ms"] = round(statistics.median(fresh) * 1000, 1)
+        index.close()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
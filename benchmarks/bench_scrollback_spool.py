@@ -0,0 +1,82 @@
+"""Feed a long build log through VTScreen with the scrollback spool.
+
+Reports feed throughput, traced memory growth while more lines are fed
+once the in-memory ring has filled (the same with and without the spool),
+the spool size, random line access latency and find (rfind) latency
+through the whole scrollback.
+--no-spool drops old lines instead, for comparison.
+
+    python -m benchmarks.bench_scrollback_spool --lines 1000000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from sprig.scrollback import ScrollbackSpool
+from sprig.vt_screen import VTScreen
+
+CHUNK_LINES = 10_000
+TRACED_CHUNKS = 20
+
+
+def build_chunk(first: int) -> str:
+    lines = []
+    for i in range(first, first + CHUNK_LINES):
+        line = f"[{i:8d}] compiling module_{i % 977}.c -O2 -Wall"
+        lines.append(line + " \x1b[32mok\x1b[0m" if i % 10 == 0 else line)
+    return "\r\n".join(lines) + "\r\n"
+
+
+def measure(lines: int, memory_lines: int, spool: bool) -> dict:
+    vt = VTScreen(120, 40, scrollback_lines=memory_lines, spool=ScrollbackSpool() if spool else None)
+    chunks = max(1, lines // CHUNK_LINES)
+    start = time.perf_counter()
+    for n in range(chunks):
+        vt.feed(build_chunk(n * CHUNK_LINES))
+    elapsed = time.perf_counter() - start
+
+    # Memory is traced separately, as tracing slows the feed down several times
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for n in range(chunks, chunks + TRACED_CHUNKS):
+        vt.feed(build_chunk(n * CHUNK_LINES))
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    rng = random.Random(0)
+    indexes = [rng.randrange(len(vt)) for _ in range(1000)]
+    start = time.perf_counter()
+    for index in indexes:
+        vt.line(index)
+    access = (time.perf_counter() - start) / len(indexes)
+
+    finds = {}
+    for query in ("module_976.c", "[       5]", "MODULE", "not in the log"):
+        start = time.perf_counter()
+        found = vt.rfind(query)
+        finds[query] = {"line": found, "ms": round((time.perf_counter() - start) * 1000, 2)}
+
+    return {
+        "spool": spool,
+        "lines": len(vt),
+        "feed_lines_per_sec": round(chunks * CHUNK_LINES / elapsed),
+        f"traced_growth_mb_over_{TRACED_CHUNKS * CHUNK_LINES}_lines": round(growth / 2**20, 2),
+        "spool_mb": round(vt.scrollback.spool.size / 2**20, 1) if spool else 0,
+        "line_access_us": round(access * 1e6, 2),
+        "find": finds,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1_000_000)
+    parser.add_argument("--memory-lines", type=int, default=10_000, help="Lines kept in memory")
+    parser.add_argument("--no-spool", action="store_true", help="Drop old lines instead of spooling them")
+    args = parser.parse_args()
+    print(json.dumps(measure(args.lines, args.memory_lines, not args.no_spool), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""What several terminal sessions cost, with one shared completion engine.
+
+engine: --sessions stand-in sessions type the keystroke trace at once
+(each with its own seed) against the local OpenRouter stand-in, once
+sharing one CompletionService and once with a service each, as every
+session had before. Reported: TCP connections opened, model requests,
+suggestions shown, and the fewest and most suggestions any one session
+got (how evenly the shared request slots were handed out).
+
+ui: SprigApp runs headless with 1 and then --tabs tabs, every shell
+printing a steady stream of lines (kept modest, so the shells leave the
+CPU to Sprig on small machines), only one tab visible. Reported: CPU
+seconds Sprig used per second, frames drawn and lines captured per
+second; and the same for --tabs tabs with the background ones still
+drawing, for comparison. HOME is an empty directory, so the user's shell
+startup files are not timed.
+
+    python -m benchmarks.bench_sessions --sessions 10 --tabs 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from .bench_keystroke_trace import COMMANDS, complete_command, synthetic_trace
+from .mock_openrouter import MockOpenRouter
+
+BUSY_LOOP = "while :; do seq 1 20; sleep 0.05; done\n"  # About 400 lines a second
+
+
+class _Session:
+    current_input = ""
+
+
+async def _type(client, terminal: _Session, trace: list, shown: list) -> None:
+    client.set_suggestion_callback(lambda tail: tail and shown.append(terminal.current_input + tail))
+    for delay, key in trace:
+        await asyncio.sleep(delay)
+        if key == "enter":
+            client.cancel_pending()
+            client.record_command(terminal.current_input)
+            terminal.current_input = ""
+        elif key == "backspace":
+            terminal.current_input = terminal.current_input[:-1]
+        else:
+            terminal.current_input += key
+        client.on_input_changed()
+    await asyncio.sleep(0.5)
+
+
+async def engine(args: argparse.Namespace, shared: bool) -> dict:
+    from sprig.autocomplete_client import AutocompleteClient
+    from sprig.completion_service import CompletionService
+    from sprig.completion_store import CompletionStore
+    from sprig.history_store import HistoryStore
+
+    def new_service() -> CompletionService:
+        return CompletionService("gpt-4o-mini", history=HistoryStore(os.devnull), store=CompletionStore(":memory:"))
+
+    async with MockOpenRouter(ttft=args.ttft, completer=complete_command) as server:
+        os.environ["OPENROUTER_BASE_URL"] = server.url
+        service = new_service() if shared else None
+        services = []
+        clients, terminals = [], []
+        for _ in range(args.sessions):
+            terminal = _Session()
+            own = service or new_service()
+            services.append(own)
+            clients.append(AutocompleteClient(terminal, service=own))
+            terminals.append(terminal)
+        await asyncio.gather(*(client.warm_up() for client in clients))
+        shown = [[] for _ in clients]
+        commands = COMMANDS[:args.commands]
+        await asyncio.gather(*(_type(client, terminal, synthetic_trace(commands, seed), shown[seed])
+                               for seed, (client, terminal) in enumerate(zip(clients, terminals))))
+        for client in clients:
+            await client.aclose()
+        for own in {id(s): s for s in services}.values():
+            await own.aclose()
+        counts = [len(s) for s in shown]
+        return {
+            "connections": server.connections,
+            "model_requests": server.requests,
+            "suggestions_shown": sum(counts),
+            "fewest_per_session": min(counts),
+            "most_per_session": max(counts),
+        }
+
+
+async def ui(tabs: int, seconds: float, draw_hidden: bool = False) -> dict:
+    from sprig.app import SprigApp
+    from sprig.terminal import TerminalEmulator
+
+    frames = 0
+    render_frame = TerminalEmulator._render_frame
+
+    def counted(self):
+        nonlocal frames
+        frames += 1
+        render_frame(self)
+
+    TerminalEmulator._render_frame = counted
+    on_hide = TerminalEmulator.on_hide
+    if draw_hidden:  # As before background tabs stopped drawing
+        TerminalEmulator.on_hide = lambda self: None
+    app = SprigApp(model_name="gpt-4o-mini")
+    try:
+        async with app.run_test(size=(100, 30)) as pilot:
+            for _ in range(tabs - 1):
+                await app.action_new_session()
+            await pilot.pause()
+            deadline = time.monotonic() + 10
+            while time.monotonic() < deadline and not all(t.shell.process for t in app.terminals):
+                await asyncio.sleep(0.05)
+            await asyncio.sleep(0.5)
+            for terminal in app.terminals:
+                terminal._write_to_shell(BUSY_LOOP)
+            await asyncio.sleep(0.5)
+            fed = 0
+            feed = [t.vt.feed for t in app.terminals]
+
+            def counting(original):
+                def feed_counted(text):
+                    nonlocal fed
+                    fed += text.count("\n")
+                    return original(text)
+                return feed_counted
+
+            for terminal, original in zip(app.terminals, feed):
+                terminal.vt.feed = counting(original)
+            frames = 0
+            cpu, wall = time.process_time(), time.monotonic()
+            await asyncio.sleep(seconds)
+            cpu, wall = time.process_time() - cpu, time.monotonic() - wall
+            for terminal in app.terminals:
+                terminal.shell.send_interrupt()
+    finally:
+        TerminalEmulator._render_frame = render_frame
+        TerminalEmulator.on_hide = on_hide
+    return {
+        "tabs": tabs,
+        "draw_hidden": draw_hidden,
+        "cpu_per_second": round(cpu / wall, 3),
+        "frames_per_second": round(frames / wall, 1),
+        "lines_per_second": round(fed / wall),
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ["SPRIG_HISTORY_FILE"] = os.devnull
+    os.environ["SPRIG_COMPLETION_CACHE"] = ":memory:"
+    results = {"engine": {"shared": await engine(args, shared=True),
+                          "per_session": await engine(args, shared=False)}}
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        async with MockOpenRouter() as server:
+            os.environ["OPENROUTER_BASE_URL"] = server.url
+            results["ui"] = [await ui(1, args.seconds), await ui(args.tabs, args.seconds),
+                             await ui(args.tabs, args.seconds, draw_hidden=True)]
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="Sessions typing at once (engine)")
+    parser.add_argument("--commands", type=int, default=3, help="Commands each session types (engine)")
+    parser.add_argument("--ttft", type=float, default=0.25, help="Stand-in time to first token")
+    parser.add_argument("--tabs", type=int, default=10, help="Busy tabs (ui)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="How long the busy tabs are measured (ui)")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(main_async(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Measure how fast Shell delivers output to its callback.
+
+A child process prints a fixed number of lines as fast as it can; the
+benchmark reports the lines per second that reach the output callback.
+--pty runs the child on the POSIX pseudo-terminal backend instead of pipes.
+
+    python -m benchmarks.bench_shell_throughput --lines 200000 [--pty]
+"""
+import argparse
+import asyncio
+import json
+import shlex
+import sys
+import time
+
+from sprig.shell import Shell
+
+
+async def measure(lines: int, width: int, pty: bool = False) -> dict:
+    script = f"import sys; sys.stdout.write(('x' * {width} + '\\n') * {lines})"
+    command = f"{shlex.quote(sys.executable)} -c {shlex.quote(script)}"
+    if pty:
+        from sprig.pty_shell import PtyShell
+        shell = PtyShell(command=command)
+    else:
+        shell = Shell(command=command)
+    received = 0
+    callbacks = 0
+    done = asyncio.Event()
+
+    async def on_output(text):
+        nonlocal received, callbacks
+        received += text.count("\n")
+        callbacks += 1
+        if received >= lines:
+            done.set()
+
+    start = time.perf_counter()
+    await shell.start(on_output)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await shell.terminate()
+    return {
+        "backend": "pty" if pty else "pipe",
+        "lines": received,
+        "callbacks": callbacks,
+        "seconds": elapsed,
+        "lines_per_sec": received / elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200_000)
+    parser.add_argument("--width", type=int, default=80, help="Characters per line")
+    parser.add_argument("--pty", action="store_true", help="Use the pseudo-terminal backend")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(measure(args.lines, args.width, args.pty)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
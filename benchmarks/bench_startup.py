@@ -0,0 +1,139 @@
+"""Time from launching Sprig to an interactive prompt, with an import breakdown.
+
+Each round starts a fresh interpreter that runs SprigApp headless (the
+real startup path: imports, compose, mount) and reports, relative to the
+moment the parent launched it:
+
+- imports_ms: `sprig.app` imported
+- first_prompt_ms: the input prompt first painted (the app is usable)
+- shell_ready_ms: the shell has read its startup files (first OSC 7
+  report on the pseudo-terminal; the process started, on Windows)
+- completer_ready_ms: the completion connection warm-up finished
+- history_loaded_ms: the history file has been read
+
+Completions go to a local mock server, history to os.devnull and the
+completion cache stays in memory. HOME is an empty directory, so the
+user's shell startup files are not timed (--user-rc keeps them). A
+separate `python -X importtime` run gives the self time spent importing
+each top-level package.
+
+    python -m benchmarks.bench_startup --rounds 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from .mock_openrouter import MockOpenRouter
+
+MILESTONES = ("imports_ms", "first_prompt_ms", "shell_ready_ms", "completer_ready_ms", "history_loaded_ms")
+
+
+def child(launched: float, width: int, height: int) -> None:
+    """Run the app headless and print when each milestone was reached."""
+    marks = {}
+
+    def mark(name: str) -> None:
+        marks.setdefault(name, round((time.monotonic() - launched) * 1000, 1))
+
+    from sprig.app import SprigApp
+    from sprig.terminal import TerminalEmulator
+    mark("imports_ms")
+
+    render_line = TerminalEmulator.render_line
+
+    def timed_render_line(self, y):
+        if self.scroll_offset.y + y >= len(self.vt):
+            mark("first_prompt_ms")
+        return render_line(self, y)
+
+    TerminalEmulator.render_line = timed_render_line
+    app = SprigApp(model_name="gpt-4o-mini")
+    terminal = app.terminal
+
+    async def watch(pilot) -> None:
+        deadline = time.monotonic() + 30
+        while len(marks) < len(MILESTONES) and time.monotonic() < deadline:
+            shell = terminal.shell
+            if shell.process is not None and getattr(shell, "_osc_seen", True):
+                mark("shell_ready_ms")
+            if terminal.autocomplete.ready:
+                mark("completer_ready_ms")
+            if terminal.history.loaded:
+                mark("history_loaded_ms")
+            await asyncio.sleep(0.001)
+        app.exit()
+
+    app.run(headless=True, size=(width, height), auto_pilot=watch)
+    print(json.dumps(marks))
+
+
+def import_breakdown(top: int) -> dict:
+    """Self import time per top-level package for `import sprig.app`, in ms."""
+    import subprocess
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import sprig.app"],
+                            capture_output=True, text=True, check=True)
+    packages = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us)
+        if name.strip() == "sprig.app":
+            total = int(cumulative_us)
+    ranked = sorted(packages.items(), key=lambda item: -item[1])[:top]
+    return {
+        "total_ms": round(total / 1000, 1),
+        "packages_ms": {name: round(us / 1000, 1) for name, us in ranked},
+    }
+
+
+async def run_rounds(args: argparse.Namespace) -> dict:
+    env = dict(os.environ, SPRIG_HISTORY_FILE=os.devnull, SPRIG_COMPLETION_CACHE=":memory:",
+               OPENROUTER_API_KEY="benchmark")
+    samples = defaultdict(list)
+    with tempfile.TemporaryDirectory() as home:
+        if not args.user_rc:
+            env["HOME"] = home
+        async with MockOpenRouter() as server:
+            env["OPENROUTER_BASE_URL"] = server.url
+            for _ in range(args.rounds):
+                launched = time.monotonic()
+                process = await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "benchmarks.bench_startup", "--child", str(launched),
+                    "--width", str(args.width), "--height", str(args.height),
+                    env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+                )
+                out, _ = await process.communicate()
+                marks = json.loads(out.decode().strip().splitlines()[-1])
+                for name, value in marks.items():
+                    samples[name].append(value)
+    return {name: {"median": statistics.median(samples[name]), "max": max(samples[name])}
+            for name in MILESTONES if samples[name]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--top", type=int, default=12, help="Packages listed in the import breakdown")
+    parser.add_argument("--user-rc", action="store_true", help="Keep HOME, so the shell reads the user's startup files")
+    parser.add_argument("--child", type=float, metavar="LAUNCHED", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child is not None:
+        child(args.child, args.width, args.height)
+        return
+    results = {"startup": asyncio.run(run_rounds(args)), "imports": import_breakdown(args.top)}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
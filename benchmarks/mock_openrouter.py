@@ -0,0 +1,198 @@
+"""A minimal local stand-in for the OpenRouter chat completions API.
+
+The server speaks just enough HTTP/1.1 (keep-alive, chunked transfer) to
+stream Server-Sent Events the way OpenRouter does, and counts the TCP
+connections it accepts so that connection reuse can be verified. Time to
+first token and token rate can be set, and faults injected: a share of
+requests answered with an error status (500 unless set otherwise), a
+share that hang, never answered until the client gives up, and streams
+cut off after `drop_after` tokens. All can be changed while the server
+runs, to degrade and then restore it.
+
+Run it standalone with:
+
+    python -m benchmarks.mock_openrouter --port 8765 --ttft 0.1
+    python -m benchmarks.mock_openrouter --port 8765 --failure-rate 0.5 --hang-rate 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+from typing import Callable, List, Optional, Union
+
+
+class MockOpenRouter:
+    """Local SSE server that mimics `POST /chat/completions` streaming."""
+
+    def __init__(self, tokens: Optional[List[str]] = None, ttft: Union[float, Callable[[], float]] = 0.0,
+                 token_interval: float = 0.0, host: str = "127.0.0.1", port: int = 0,
+                 completer: Optional[Callable[[str], List[str]]] = None,
+                 tokens_per_second: Optional[float] = None, failure_rate: float = 0.0,
+                 hang_rate: float = 0.0, failure_status: int = 500, drop_after: Optional[int] = None,
+                 seed: Optional[int] = None):
+        self.tokens = tokens if tokens is not None else ["status", " --short"]
+        # Optional function from the user's current input to response tokens
+        self.completer = completer
+        # Seconds before the first token, or a function returning them per request
+        self.ttft = ttft
+        self.token_interval = 1 / tokens_per_second if tokens_per_second else token_interval
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.failure_status = failure_status
+        self.drop_after = drop_after  # Tokens sent before the connection is dropped mid-stream
+        self._random = random.Random(seed)
+        self.host = host
+        self.port = port
+        self.connections = 0
+        self.requests = 0
+        self.aborted = 0  # Streams the client closed before they finished
+        self.failed = 0  # Requests answered with an injected error status
+        self.hung = 0  # Requests left unanswered until the client closed the connection
+        self.dropped = 0  # Streams cut off after `drop_after` tokens
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        """Base URL to use in place of `https://openrouter.ai/api/v1`."""
+        return f"http://{self.host}:{self.port}/api/v1"
+
+    async def start(self) -> "MockOpenRouter":
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> "MockOpenRouter":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", "0")))
+
+                self.requests += 1
+                if method == "POST" and path.endswith("/chat/completions"):
+                    if self.hang_rate and self._random.random() < self.hang_rate:
+                        await self._hang(reader)
+                        break
+                    if self.failure_rate and self._random.random() < self.failure_rate:
+                        await self._fail(writer)
+                    else:
+                        await self._stream_completion(writer, json.loads(body or b"{}"))
+                else:
+                    writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n")
+                    await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except ConnectionError:
+            self.aborted += 1
+        except (asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _stream_completion(self, writer: asyncio.StreamWriter, request: dict) -> None:
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+        await writer.drain()
+        await asyncio.sleep(self.ttft() if callable(self.ttft) else self.ttft)
+        tokens = self.tokens
+        if self.completer is not None:
+            tokens = self.completer(self.current_input(request))
+        for i, token in enumerate(tokens):
+            if i == self.drop_after:
+                self.dropped += 1
+                writer.transport.abort()
+                return
+            if i:
+                await asyncio.sleep(self.token_interval)
+            event = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self._write_chunk(writer, f"data: {json.dumps(event)}\n\n")
+            await writer.drain()
+        self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _hang(self, reader: asyncio.StreamReader) -> None:
+        self.hung += 1
+        while await reader.read(4096):
+            pass
+
+    async def _fail(self, writer: asyncio.StreamWriter) -> None:
+        self.failed += 1
+        body = json.dumps({"error": {"code": self.failure_status, "message": "Injected failure"}}).encode()
+        writer.write(
+            b"HTTP/1.1 %d Injected Failure\r\n"
+            b"Content-Type: application/json\r\n"
+            b"Content-Length: %d\r\n\r\n%s" % (self.failure_status, len(body), body)
+        )
+        await writer.drain()
+
+    @staticmethod
+    def current_input(request: dict) -> str:
+        """Extract the user's input from a sprig completion prompt."""
+        prompt = request.get("messages", [{}])[-1].get("content", "")
+        match = re.search(r"^Current input: >\s?(.*)$", prompt, re.MULTILINE)
+        return match.group(1) if match else ""
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, text: str) -> None:
+        data = text.encode()
+        writer.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    server = MockOpenRouter(ttft=args.ttft, token_interval=args.token_interval, port=args.port,
+                            failure_rate=args.failure_rate, hang_rate=args.hang_rate,
+                            failure_status=args.failure_status)
+    await server.start()
+    print(f"Mock OpenRouter listening on {server.url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local OpenRouter SSE stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--token-interval", type=float, default=0.0, help="Seconds between tokens")
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="Share of requests answered with --failure-status")
+    parser.add_argument("--failure-status", type=int, default=500, help="Status of the injected failures")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Share of requests never answered")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""A stand-in shell with predictable output, for driving sprig in benchmarks.
+
+Reads one command per line on stdin and answers on stdout:
+
+    flood N [WIDTH]   print N numbered lines of WIDTH characters
+    anything else     print a short, fixed listing for the command
+
+Each answer ends with a ``__done__ <command>`` marker line so a driver can
+tell when the command has finished.
+
+    python -m benchmarks.scripted_shell
+"""
+import sys
+
+LISTING = ["README.md", "benchmarks", "requirements.txt", "sprig"]
+
+
+def respond(command: str, out) -> None:
+    words = command.split()
+    if words[:1] == ["flood"]:
+        count = int(words[1]) if len(words) > 1 else 1000
+        width = int(words[2]) if len(words) > 2 else 80
+        filler = "x" * width
+        chunk = 10_000
+        for start in range(0, count, chunk):
+            out.write("".join(f"{i:>8} {filler}\n" for i in range(start, min(count, start + chunk))))
+    elif words:
+        out.write(f"$ {command}\n")
+        out.write("".join(f"{name}\n" for name in LISTING))
+    out.write(f"__done__ {command}\n")
+    out.flush()
+
+
+def main() -> None:
+    for line in sys.stdin:
+        respond(line.strip(), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Headless benchmark suite: SprigApp under Textual's pilot.
+
+The app runs against the local OpenRouter stand-in (configurable time to
+first token, token rate and failure rate). On every platform the
+scripted shell, run over pipes, stands in for the user's shell (bash on
+a pseudo-terminal on Linux and macOS, cmd.exe on Windows), so runs are
+comparable and do not depend on the user's rc files. Three scenarios
+run in one app:
+
+- typing: a keystroke trace is replayed. Reports keystroke-to-ghost-text
+  latency (key press until the input line is drawn with a suggestion), the
+  completion latency spans and API calls per typed command.
+- flood: the shell prints a large burst. Reports output lines per second
+  reaching the scrollback, and frame times while it streams in.
+- scrollback: the shell keeps printing past the scrollback capacity.
+  Reports memory traced after each round, so growth should level off
+  once the ring buffer is full.
+
+Results are printed as JSON and can be saved with --output. Pass
+--compare with an earlier results file to print the change per metric.
+
+    python -m benchmarks.suite --output before.json
+    python -m benchmarks.suite --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, Optional
+
+from .bench_keystroke_trace import COMMANDS, complete_command, synthetic_trace
+from .mock_openrouter import MockOpenRouter
+
+SCRIPTED_SHELL = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripted_shell.py")
+KEY_NAMES = {" ": "space"}
+
+
+class FrameProbe:
+    """Times TerminalEmulator frames and notes when ghost text is drawn.
+
+    A frame is the scheduler's work plus the `render_line` calls that
+    paint it, which Textual makes after the frame returns.
+    """
+
+    def __init__(self, terminal):
+        from sprig.latency import RollingHistogram
+
+        self.terminal = terminal
+        self.frames = RollingHistogram(window=100_000)
+        self.ghost = RollingHistogram(window=100_000)
+        self.keys_without_ghost = 0
+        self._frame_work = None  # Seconds spent on the frame being painted
+        self._key_time: Optional[float] = None
+        self._render_frame = terminal._render_frame
+        self._render_line = terminal.render_line
+        self._get_input_strips = terminal._get_input_strips
+        terminal._render_frame = self._timed_frame
+        terminal.render_line = self._timed_line
+        terminal._get_input_strips = self._watch_input_strips
+
+    def reset(self) -> None:
+        from sprig.latency import RollingHistogram
+
+        self.flush()
+        self.frames = RollingHistogram(window=100_000)
+
+    def key_pressed(self) -> None:
+        if self._key_time is not None:
+            self.keys_without_ghost += 1
+        self._key_time = time.perf_counter()
+
+    def forget_key(self) -> None:
+        """Stop waiting for ghost text, e.g. after enter clears the input."""
+        self._key_time = None
+
+    def flush(self) -> None:
+        if self._frame_work is not None:
+            self.frames.add(self._frame_work)
+            self._frame_work = None
+
+    def _timed_frame(self) -> None:
+        self.flush()
+        start = time.perf_counter()
+        self._render_frame()
+        self._frame_work = time.perf_counter() - start
+
+    def _timed_line(self, y: int):
+        start = time.perf_counter()
+        strip = self._render_line(y)
+        if self._frame_work is not None:
+            self._frame_work += time.perf_counter() - start
+        return strip
+
+    def _watch_input_strips(self):
+        rebuilt = self.terminal._input_strips is None
+        strips = self._get_input_strips()
+        if rebuilt and self._key_time is not None and self.terminal.suggestion:
+            self.ghost.add(time.perf_counter() - self._key_time)
+            self._key_time = None
+        return strips
+
+
+def stand_in_tokens(text: str):
+    """Complete from COMMANDS, split into four-character tokens."""
+    rest = complete_command(text)[0]
+    return [rest[i:i + 4] for i in range(0, len(rest), 4)]
+
+
+async def wait_for(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.005)
+    return True
+
+
+async def run_command(pilot, terminal, command: str, timeout: float = 120.0) -> bool:
+    """Type `command`, press enter and wait for the scripted shell's end marker."""
+    terminal.current_input = command
+    terminal.cursor_position = len(command)
+    await pilot.press("enter")
+    marker = f"__done__ {command}"
+    vt = terminal.vt
+    return await wait_for(lambda: len(vt) and vt.line_text(len(vt) - 1) == marker, timeout)
+
+
+async def typing_scenario(pilot, app, probe: FrameProbe, server: MockOpenRouter, seed: int) -> dict:
+    terminal = app.terminal
+    trace = synthetic_trace(COMMANDS, seed)
+    requests_before = server.requests
+    for delay, key in trace:
+        await asyncio.sleep(delay)
+        if key == "enter":
+            probe.forget_key()
+        else:
+            probe.key_pressed()
+        await pilot.press(KEY_NAMES.get(key, key))
+    await asyncio.sleep(0.5)
+    probe.forget_key()
+
+    stats = terminal.autocomplete.stats.summary()
+    requests = server.requests - requests_before
+    return {
+        "keystroke_to_ghost_ms": probe.ghost.summary(1000),
+        "keys_without_ghost": probe.keys_without_ghost,
+        "completion_latency_ms": stats["latency_ms"],
+        "cancel_rate": stats["cancel_rate"],
+        "api_calls": requests,
+        "api_calls_per_command": round(requests / len(COMMANDS), 2),
+        "failed_requests": server.failed,
+    }
+
+
+async def flood_scenario(pilot, app, probe: FrameProbe, lines: int) -> dict:
+    terminal = app.terminal
+    probe.reset()
+    before = len(terminal.vt)
+    start = time.perf_counter()
+    finished = await run_command(pilot, terminal, f"flood {lines}")
+    elapsed = time.perf_counter() - start
+    await pilot.pause()
+    probe.flush()
+    received = min(lines, len(terminal.vt) - before)
+    return {
+        "lines": lines,
+        "finished": finished,
+        "seconds": round(elapsed, 3),
+        "lines_per_sec": round(received / elapsed),
+        "frames": len(probe.frames),
+        "frame_ms": probe.frames.summary(1000),
+    }
+
+
+async def scrollback_scenario(pilot, app, capacity: int, rounds: int) -> dict:
+    terminal = app.terminal
+    per_round = max(1, capacity // 2)
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        traced = []
+        for _ in range(rounds):
+            await run_command(pilot, terminal, f"flood {per_round}")
+            await pilot.pause()
+            traced.append(tracemalloc.get_traced_memory()[0] - baseline)
+    finally:
+        tracemalloc.stop()
+    full = len(terminal.vt)
+    return {
+        "capacity": capacity,
+        "lines_per_round": per_round,
+        "traced_mb_per_round": [round(size / 2**20, 2) for size in traced],
+        "bytes_per_line": round(traced[-1] / max(1, full)),
+    }
+
+
+def metadata(args: argparse.Namespace) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import textual
+
+    return {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "textual": textual.__version__,
+        "params": vars(args),
+    }
+
+
+async def run_suite(args: argparse.Namespace) -> dict:
+    os.environ.setdefault("OPENROUTER_API_KEY", "benchmark")
+    os.environ.setdefault("SPRIG_HISTORY_FILE", os.devnull)  # Keep benchmark commands out of the user's history
+    os.environ.setdefault("SPRIG_COMPLETION_CACHE", ":memory:")  # Start every run with a cold cache
+    results = {"meta": metadata(args)}
+    async with MockOpenRouter(ttft=args.ttft, tokens_per_second=args.tps, failure_rate=args.failure_rate,
+                              completer=stand_in_tokens, seed=args.seed) as server:
+        os.environ["OPENROUTER_BASE_URL"] = server.url
+        from sprig.app import SprigApp
+        from sprig.shell import Shell
+
+        app = SprigApp(model_name="gpt-4o-mini", scrollback_lines=args.scrollback)
+        app.terminal.shell = Shell(command=f'"{sys.executable}" -u "{SCRIPTED_SHELL}"')
+        probe = FrameProbe(app.terminal)
+        async with app.run_test(size=(args.width, args.height)) as pilot:
+            await wait_for(lambda: app.terminal.shell.process is not None, 10)
+            results["typing"] = await typing_scenario(pilot, app, probe, server, args.seed)
+            results["flood"] = await flood_scenario(pilot, app, probe, args.flood_lines)
+            results["scrollback"] = await scrollback_scenario(pilot, app, args.scrollback, args.rounds)
+    return results
+
+
+def _flatten(results: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline: dict, results: dict) -> str:
+    """A table of every numeric metric in both result sets."""
+    old = _flatten({k: v for k, v in baseline.items() if k != "meta"})
+    new = _flatten({k: v for k, v in results.items() if k != "meta"})
+    rows = [f"{'metric':<48} {'before':>12} {'after':>12} {'change':>8}"]
+    for name in sorted(old.keys() & new.keys()):
+        change = f"{(new[name] - old[name]) / old[name]:+.1%}" if old[name] else "-"
+        rows.append(f"{name:<48} {old[name]:>12} {new[name]:>12} {change:>8}")
+    return "\n".join(rows)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ttft", type=float, default=0.15, help="Stand-in time to first token")
+    parser.add_argument("--tps", type=float, default=50.0, help="Stand-in tokens per second")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--flood-lines", type=int, default=100_000)
+    parser.add_argument("--scrollback", type=int, default=100_000, help="Scrollback capacity in lines")
+    parser.add_argument("--rounds", type=int, default=4, help="Scrollback rounds of capacity/2 lines")
+    parser.add_argument("--width", type=int, default=120)
+    parser.add_argument("--height", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_suite(args))
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print(compare(json.load(f), results))
+
+
+if __name__ == "__main__":
+    main()
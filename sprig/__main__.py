@@ -1,63 +1,98 @@
-from textual.app import App, ComposeResult
-from textual.containers import Container
-from textual.widgets import Header, Footer
-from textual.binding import Binding
-from .terminal import TerminalEmulator
 from .logging_config import setup_logging
 import argparse
+import asyncio
+import socket
 from .ai_completer import AICompleter
+from .latency import default_stats_path
 
 logger = setup_logging()
 
-class SprigApp(App[None]):
-    CSS = """
-    #terminal-container {
-        height: 1fr;
-    }
-    """
-
-    BINDINGS = [
-        Binding("ctrl+c,ctrl+q", "quit", "Quit", show=True),
-        Binding("ctrl+l", "clear", "Clear", show=True),
-    ]
-
-    def __init__(self, model_name: str = "anthropic-sonnet"):
-        super().__init__()
-        self.terminal = TerminalEmulator(model_name=model_name)
-        logger.info("SprigApp initialized")
-
-    def compose(self) -> ComposeResult:
-        yield Header()
-        with Container(id="terminal-container"):
-            yield self.terminal
-        yield Footer()
-
-    def on_mount(self) -> None:
-        """Handle app mount."""
-        logger.debug("App mounted")
-        self.terminal.focus()
-
-    def on_ready(self) -> None:
-        """Handle app ready."""
-        logger.debug("App ready")
-        self.terminal.focus()
-
-    def action_clear(self):
-        logger.debug("Clear action triggered")
-        self.terminal.clear()
-
 def main():
     parser = argparse.ArgumentParser(description="Sprig Terminal Emulator")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=["serve"],
+        help="serve: run the completion daemon for bash and zsh instead of the terminal"
+    )
     parser.add_argument(
         "--model", 
         choices=list(AICompleter.MODELS.keys()),
         default="anthropic-sonnet",
         help="AI model to use for command completion"
     )
+    parser.add_argument(
+        "--scrollback",
+        type=int,
+        default=10_000,
+        help="Number of output lines kept in memory; older output is spooled to disk"
+    )
+    parser.add_argument(
+        "--spool-mb",
+        type=int,
+        default=1024,
+        help="Disk space for spooled scrollback, in MiB (0 keeps only --scrollback lines)"
+    )
+    parser.add_argument(
+        "--hedge",
+        choices=list(AICompleter.MODELS.keys()),
+        help="Second model to ask when --model is slow to produce its first token"
+    )
+    parser.add_argument(
+        "--race",
+        action="store_true",
+        help="With --hedge, ask both models at once instead of waiting"
+    )
+    parser.add_argument(
+        "--stats-file",
+        default=default_stats_path(),
+        help="Where to write completion latency stats as JSON on exit (default: ~/.cache/sprig/latency_stats.json)"
+    )
+    parser.add_argument(
+        "--history-file",
+        help="Command history file (default: $SPRIG_HISTORY_FILE or ~/.local/share/sprig/history)"
+    )
+    parser.add_argument(
+        "--completion-cache",
+        help="Completion cache database, or :memory: to keep none across sessions "
+             "(default: $SPRIG_COMPLETION_CACHE or ~/.cache/sprig/completions.sqlite3)"
+    )
+    parser.add_argument(
+        "--socket",
+        help="Socket for serve mode (default: $SPRIG_SOCKET, $XDG_RUNTIME_DIR/sprig.sock or /tmp/sprig-<uid>.sock)"
+    )
     args = parser.parse_args()
-    
-    app = SprigApp(model_name=args.model)
+    if args.race and not args.hedge:
+        parser.error("--race needs a second model from --hedge")
+
+    if args.mode == "serve":
+        if not hasattr(socket, "AF_UNIX"):
+            parser.error("serve needs Unix domain sockets, which this platform does not have")
+        from .completion_server import run_server
+        from .completion_store import CompletionStore
+
+        asyncio.run(run_server(
+            args.socket,
+            model_name=args.model,
+            hedge_model=args.hedge,
+            hedge_mode="race" if args.race else "hedge",
+            store=CompletionStore(args.completion_cache),
+        ))
+        return
+
+    from .app import SprigApp  # Only now, so serve mode starts without textual and the UI
+
+    app = SprigApp(
+        model_name=args.model,
+        scrollback_lines=args.scrollback,
+        hedge_model=args.hedge,
+        hedge_mode="race" if args.race else "hedge",
+        history_path=args.history_file,
+        spool_mb=args.spool_mb,
+        completion_cache_path=args.completion_cache,
+    )
     app.run()
+    app.service.stats.dump(args.stats_file)
 
 if __name__ == "__main__":
     main()
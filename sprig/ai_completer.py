@@ -1,27 +1,52 @@
+import asyncio
 import os
-import httpx
-from dotenv import load_dotenv
-from typing import List, Optional, Dict
+import importlib.util
+import re
+from typing import TYPE_CHECKING, List, Optional, Dict, Tuple
 import logging
 import json
-from .logging_config import setup_logging
+from .logging_config import get_category_logger, setup_logging  # Also loads .env
+from .latency import CompletionSpan
+from .prompt_context import estimate_tokens
+
+if TYPE_CHECKING:
+    import httpx  # Imported on first use: with httpcore it takes longer than the rest of startup
 
-load_dotenv()
 logger = setup_logging()
+stream_logger = get_category_logger("stream")
+
+# HTTP/2 needs the optional `h2` package (installed with `httpx[http2]`).
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_NUMBERED = re.compile(r"^\d+[.)]\s+")  # "1. " that some models put before each candidate
 
 class AICompleter:
     MODELS = {
         "anthropic-sonnet": {
             "id": "anthropic/claude-3.5-sonnet:beta",
-            "description": "Anthropic Sonnet - Short responses, good for command completion"
+            "description": "Anthropic Sonnet - Short responses, good for command completion",
+            "context_tokens": 2000,
         },
         "gpt-4o-mini": {
             "id": "openai/gpt-4o-mini",
-            "description": "GPT-4o Mini - Fast and efficient for command completion"
+            "description": "GPT-4o Mini - Fast and efficient for command completion",
+            "context_tokens": 1000,
         },
     }
+
+    # Suggestions are single commands: stop generating at the first of these.
+    # Several candidates come one per line, so then only the fence stops them.
+    STOP_SEQUENCES = ["\n", "```"]
+    MULTI_STOP_SEQUENCES = ["```"]
     
-    def __init__(self, model_name: str = "anthropic-sonnet"):
+    def __init__(self, model_name: str = "anthropic-sonnet", base_url: Optional[str] = None,
+                 client: Optional["httpx.AsyncClient"] = None, share_with: Optional["AICompleter"] = None):
+        """Create a completer for `model_name`.
+
+        `client` shares another completer's connection pool, and `share_with`
+        shares the pool of another completer once it creates one; a shared
+        client is not closed by `aclose`.
+        """
         self.api_key = os.getenv("OPENROUTER_API_KEY")
         if not self.api_key:
             logger.error("OPENROUTER_API_KEY environment variable is missing")
@@ -31,104 +56,270 @@ class AICompleter:
             logger.error(f"Invalid model name: {model_name}")
             model_name = "anthropic-sonnet"  # Default to anthropic-sonnet
             
+        self.name = model_name
         self.model = self.MODELS[model_name]
         logger.info(f"AICompleter initialized with model: {model_name}")
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = base_url or os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json",
         }
+        self._client: Optional["httpx.AsyncClient"] = client
+        self._owns_client = client is None and share_with is None
+        self._share_with = share_with
+        self._streams = set()  # Stream tasks still running, including abandoned ones
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """The shared HTTP client, created on first use.
+
+        One pooled client is kept for the lifetime of the completer so that
+        every suggestion reuses an already established (keep-alive, HTTP/2 when
+        available) connection instead of paying DNS, TCP and TLS setup.
+        """
+        if self._share_with is not None:
+            return self._share_with.client
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._owns_client = True
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=10,
+                    max_keepalive_connections=5,
+                    keepalive_expiry=120.0,
+                ),
+                timeout=5.0,
+            )
+            logger.debug(f"Created HTTP client (http2={HTTP2_AVAILABLE})")
+        return self._client
+
+    async def warm_up(self) -> None:
+        """Open a connection to the API ahead of the first completion request.
+
+        The client is created in a worker thread, so that importing httpx
+        does not hold up the event loop.
+        """
+        client = await asyncio.to_thread(lambda: self.client)
+        import httpx  # Already loaded by the thread
+
+        try:
+            response = await client.head(self.base_url)
+            logger.debug(f"Connection warmed up ({response.http_version}, status {response.status_code})")
+        except httpx.HTTPError as e:
+            logger.warning(f"Connection warm-up failed: {str(e)}")
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        # Connections are about to close anyway, so unfinished streams can be cancelled
+        for stream in list(self._streams):
+            stream.cancel()
+        await asyncio.gather(*self._streams, return_exceptions=True)
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            logger.debug("HTTP client closed")
+        self._client = None
+
+    @property
+    def context_tokens(self) -> int:
+        """Token budget for the terminal context sent with each request."""
+        return self.model.get("context_tokens", 1000)
 
-    async def get_completion(self, current_input: str, terminal_lines: List[str]):
-        """Get AI-powered completion suggestions for the current input."""
+    async def get_completion(self, current_input: str, context: str, span: Optional[CompletionSpan] = None,
+                             candidates: int = 1):
+        """Get AI-powered completion suggestions for the current input.
+
+        `context` is the prepared terminal history (see PromptContext). Each
+        item yielded is the ranked list of suggestions so far, best first:
+        the model is asked for up to `candidates` of them in one response,
+        one per line, and the list grows as they stream in. The first
+        response byte, each token and the first suggestion are marked on
+        `span`.
+
+        The HTTP stream is read in its own task. httpcore cannot shield the
+        release of a connection from asyncio cancellation, so cancelling a
+        task while its response is closing leaks the connection from the
+        pool. Cancelling this generator therefore only cancels the stream
+        while it is still waiting for data; once the response is closing it
+        is left to finish.
+        """
+        suggestions: asyncio.Queue = asyncio.Queue()
+        closing = asyncio.Event()
+        stream = asyncio.create_task(self._stream(current_input, context, suggestions, closing, span, candidates))
+        self._streams.add(stream)
+        stream.add_done_callback(self._streams.discard)
         try:
-            prompt = self._create_prompt(current_input, terminal_lines)
-            logger.debug(f"Generated prompt: {prompt}")
+            while True:
+                ranked = await suggestions.get()
+                if ranked is None:
+                    return
+                yield ranked
+        finally:
+            if not stream.done() and not closing.is_set():
+                stream.cancel()
+
+    async def _stream(self, current_input: str, context: str, suggestions: asyncio.Queue,
+                      closing: asyncio.Event, span: Optional[CompletionSpan], candidates: int = 1) -> None:
+        """Stream a completion, putting each candidate list on `suggestions` and None at the end.
+
+        `closing` is set once the response no longer needs to be read. A
+        stream that breaks off before [DONE] or a stop sequence sets
+        `span.error`, so callers know the last candidates may be cut short.
+        """
+        import httpx
+
+        try:
+            prompt = self._create_prompt(current_input, context, candidates)
+            logger.debug("Generated prompt: %d chars (~%d tokens)", len(prompt), estimate_tokens(prompt))
             
-            logger.debug(f"Making streaming request to {self.base_url} with model {self.model['id']}")
-            async with httpx.AsyncClient() as client:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": self.model["id"],
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a helpful terminal assistant. Complete the user's command based on common terminal commands and their history. Provide only the completion, no explanation."
-                            },
-                            {"role": "user", "content": prompt}
-                        ],
-                        "max_tokens": 50,
-                        "temperature": 0.3,
-                        "stream": True
-                    },
-                    timeout=5.0
-                ) as response:
-                    logger.debug(f"Got initial response with status {response.status_code}")
-                    if response.status_code != 200:
-                        logger.error(f"API request failed with status {response.status_code}: {response.text}")
-                        return
-
-                    full_response = ""
-                    chunk_count = 0
-                    async for line in response.aiter_lines():
-                        if not line or line.strip() == "":
+            logger.debug("Making streaming request to %s with model %s", self.base_url, self.model["id"])
+            async with self.client.stream(
+                "POST",
+                f"{self.base_url}/chat/completions",
+                json={
+                    "model": self.model["id"],
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": "You are a helpful terminal assistant. Complete the user's command based on common terminal commands and their history. Provide only the completion, no explanation."
+                        },
+                        {"role": "user", "content": prompt}
+                    ],
+                    "max_tokens": 50 * candidates,
+                    "temperature": 0.3,
+                    "stop": self.STOP_SEQUENCES if candidates == 1 else self.MULTI_STOP_SEQUENCES,
+                    "stream": True
+                },
+                timeout=5.0
+            ) as response:
+                logger.debug("Got initial response with status %d", response.status_code)
+                if span:
+                    span.mark("first_byte")
+                if response.status_code != 200:
+                    closing.set()
+                    await response.aread()
+                    logger.error(f"API request failed with status {response.status_code}: {response.text}")
+                    if span:
+                        span.error = f"status {response.status_code}"
+                    return
+
+                full_response = ""
+                shown: List[str] = []
+                chunk_count = 0
+                done = False
+                async for line in response.aiter_lines():
+                    if not line or line.strip() == "":
+                        continue
+                    if line.startswith("data: "):
+                        chunk_count += 1
+                        line_content = line[6:].strip()  # Skip "data: " prefix
+                        
+                        # Handle stream completion message. Keep reading until the
+                        # body ends so the connection goes back to the pool.
+                        if line_content == "[DONE]":
+                            stream_logger.debug("Received [DONE] message from stream")
+                            done = True
+                            closing.set()
                             continue
-                        if line.startswith("data: "):
-                            chunk_count += 1
-                            line_content = line[6:].strip()  # Skip "data: " prefix
                             
-                            # Handle stream completion message
-                            if line_content == "[DONE]":
-                                logger.debug("Received [DONE] message from stream")
-                                break
-                                
-                            logger.debug(f"Processing chunk {chunk_count}: {line_content}")
-                            try:
-                                data = json.loads(line_content)
-                                if data.get("choices") and len(data["choices"]) > 0:
-                                    delta = data["choices"][0].get("delta", {})
-                                    if "content" in delta:
-                                        content = delta["content"]
-                                        full_response += content
-                                        logger.debug(f"Current full response: {full_response}")
-
-                                        suggestion = full_response.strip()
-                                        if suggestion:
-                                            logger.debug(f"Yielding suggestion: {suggestion}")
-                                            yield suggestion
-                            except json.JSONDecodeError as e:
-                                if line_content != "[DONE]":  # Don't log error for expected [DONE] message
-                                    logger.error(f"JSON decode error on chunk: {line_content} - {str(e)}")
-                                continue
-                            except Exception as e:
-                                logger.error(f"Error processing stream chunk: {str(e)}")
-                                continue
-
-                    logger.debug(f"Stream completed. Processed {chunk_count} chunks")
+                        stream_logger.debug("Processing chunk %d: %s", chunk_count, line_content)
+                        try:
+                            data = json.loads(line_content)
+                            if data.get("choices") and len(data["choices"]) > 0:
+                                delta = data["choices"][0].get("delta", {})
+                                if "content" in delta:
+                                    content = delta["content"]
+                                    if span:
+                                        span.token()
+                                    full_response += content
+
+                                    ranked, stopped = self._split_candidates(full_response, candidates)
+                                    if ranked and ranked != shown:
+                                        stream_logger.debug("Yielding suggestions: %s", ranked)
+                                        if span:
+                                            span.mark("first_token")
+                                        suggestions.put_nowait(ranked)
+                                        shown = ranked
+                                    if stopped:
+                                        # Leaving the `async with` closes the stream
+                                        logger.debug("Stop sequence reached, closing stream")
+                                        closing.set()
+                                        return
+                        except json.JSONDecodeError as e:
+                            if line_content != "[DONE]":  # Don't log error for expected [DONE] message
+                                logger.error(f"JSON decode error on chunk: {line_content} - {str(e)}")
+                            continue
+                        except Exception as e:
+                            logger.error(f"Error processing stream chunk: {str(e)}")
+                            continue
+
+                logger.debug("Stream completed. Processed %d chunks", chunk_count)
+                if not done:
+                    logger.warning("Completion stream ended without [DONE]")
+                    if span:
+                        span.error = "truncated"
 
         except httpx.ConnectTimeout:
             logger.error("Connection timeout while connecting to OpenRouter API")
+            if span:
+                span.error = "connect timeout"
             return
         except httpx.ReadTimeout:
             logger.error("Read timeout while streaming from OpenRouter API")
+            if span:
+                span.error = "read timeout"
             return
         except Exception as e:
             logger.exception(f"Error getting completion: {str(e)}")
+            if span:
+                span.error = type(e).__name__
             return
+        finally:
+            suggestions.put_nowait(None)
 
-    def _create_prompt(self, current_input: str, terminal_lines: List[str]) -> str:
+    def _cut_at_stop_sequence(self, text: str) -> Tuple[str, bool]:
+        """Strip `text` and cut it at the first stop sequence.
 
-        terminal_body = "\n".join(terminal_lines)
+        Returns the suggestion and whether a stop sequence was found.
+        """
+        text = text.lstrip()
+        end = min((i for i in (text.find(stop) for stop in self.STOP_SEQUENCES) if i >= 0), default=-1)
+        if end >= 0:
+            return text[:end].strip(), True
+        return text.strip(), False
 
+    def _split_candidates(self, text: str, limit: int) -> Tuple[List[str], bool]:
+        """The distinct candidates in a (partial) response, and whether it is complete.
+
+        The last line may still be streaming; it counts as a candidate too.
+        """
+        if limit == 1:
+            suggestion, stopped = self._cut_at_stop_sequence(text)
+            return ([suggestion] if suggestion else []), stopped
+        fence = text.find("```")
+        if fence >= 0:
+            text = text[:fence]
+        lines = text.split("\n")
+        ranked = []
+        for line in lines:
+            candidate = _NUMBERED.sub("", line.strip())
+            if candidate and candidate not in ranked:
+                ranked.append(candidate)
+        finished = len(ranked) - (1 if lines[-1].strip() else 0)  # Lines ended by a newline
+        return ranked[:limit], fence >= 0 or finished >= limit
+
+    def _create_prompt(self, current_input: str, context: str, candidates: int = 1) -> str:
         """Create a prompt for the AI model."""
-        logger.debug(f"Using terminal contents: {terminal_lines}")
-        
+        if candidates == 1:
+            task = "Complete this command. Only return the completion part, nothing else."
+        else:
+            task = (f"Give up to {candidates} different ways to complete this command, most likely first, "
+                    "one per line. Only return the completion part of each, nothing else. Do not number them.")
         return f"""Terminal history:
-{terminal_body}
+{context}
 
 Current input: {current_input}
 
-Complete this command. Only return the completion part, nothing else. Do not explain. Do not wrap in quotes."""
+{task} Do not explain. Do not wrap in quotes."""
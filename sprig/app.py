@@ -0,0 +1,145 @@
+from textual.app import App, ComposeResult
+from textual.widgets import Header, Footer, Static, TabbedContent, TabPane
+from textual.binding import Binding
+from .terminal import TerminalEmulator
+from .logging_config import setup_logging
+from typing import List, Optional
+from .completion_service import CompletionService
+from .completion_store import CompletionStore
+from .history_store import HistoryStore
+
+logger = setup_logging()
+
+class SprigApp(App[None]):
+    CSS = """
+    #sessions, #sessions ContentSwitcher, #sessions TabPane {
+        height: 1fr;
+    }
+
+    #sessions TabPane {
+        padding: 0;
+    }
+
+    #sessions.single > ContentTabs {
+        display: none;
+    }
+
+    #stats-panel {
+        height: auto;
+        padding: 0 1;
+        background: $panel;
+        display: none;
+    }
+    """
+
+    STATS_REFRESH = 0.5  # Seconds between stats panel updates
+
+    BINDINGS = [
+        Binding("ctrl+c,ctrl+q", "quit", "Quit", show=True),
+        Binding("ctrl+l", "clear", "Clear", show=True),
+        # Priority, because the terminal consumes every key it is sent
+        Binding("ctrl+t", "toggle_stats", "Stats", show=True, priority=True),
+        Binding("alt+t", "new_session", "New tab", show=True, priority=True),
+        Binding("alt+w", "close_session", "Close tab", priority=True),
+        Binding("alt+right", "next_session(1)", "Next tab", priority=True),
+        Binding("alt+left", "next_session(-1)", "Previous tab", priority=True),
+    ]
+
+    def __init__(self, model_name: str = "anthropic-sonnet", scrollback_lines: int = 10_000,
+                 hedge_model: Optional[str] = None, hedge_mode: str = "hedge",
+                 history_path: Optional[str] = None, spool_mb: int = 1024,
+                 completion_cache_path: Optional[str] = None):
+        """Each tab is a terminal session; they all share one CompletionService."""
+        super().__init__()
+        self.service = CompletionService(model_name, hedge_model, hedge_mode, HistoryStore(history_path),
+                                         CompletionStore(completion_cache_path))
+        self._terminal_options = {"scrollback_lines": scrollback_lines, "spool_mb": spool_mb}
+        self._sessions_opened = 0
+        self.sessions = TabbedContent(id="sessions", classes="single")
+        self._first = TerminalEmulator(service=self.service, **self._terminal_options)
+        self.stats_panel = Static(id="stats-panel")
+        self._stats_timer = None
+        logger.info("SprigApp initialized")
+
+    @property
+    def terminal(self) -> TerminalEmulator:
+        """The terminal in the active tab."""
+        pane = self.sessions.active_pane if self.sessions.is_mounted else None
+        return pane.query_one(TerminalEmulator) if pane is not None else self._first
+
+    @property
+    def terminals(self) -> List[TerminalEmulator]:
+        return list(self.sessions.query(TerminalEmulator)) or [self._first]
+
+    def _pane(self, terminal: TerminalEmulator) -> TabPane:
+        self._sessions_opened += 1
+        return TabPane(f"Shell {self._sessions_opened}", terminal, id=f"session-{self._sessions_opened}")
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with self.sessions:
+            yield self._pane(self._first)
+        yield self.stats_panel
+        yield Footer()
+
+    def on_load(self) -> None:
+        """Start the shell before the UI is built, so both get ready at once."""
+        self._first.start_shell()
+
+    def on_mount(self) -> None:
+        """Handle app mount."""
+        logger.debug("App mounted")
+        self.terminal.focus()
+
+    def on_ready(self) -> None:
+        """Handle app ready."""
+        logger.debug("App ready")
+        self.terminal.focus()
+
+    async def on_unmount(self) -> None:
+        await self.service.aclose()
+
+    def on_tabbed_content_tab_activated(self, event: TabbedContent.TabActivated) -> None:
+        for terminal in event.pane.query(TerminalEmulator):  # None yet while the pane is being added
+            terminal.focus()
+
+    async def action_new_session(self) -> None:
+        """Open a terminal in a new tab and switch to it."""
+        terminal = TerminalEmulator(service=self.service, **self._terminal_options)
+        terminal.start_shell()
+        pane = self._pane(terminal)
+        await self.sessions.add_pane(pane)
+        self.sessions.active = pane.id
+        self.sessions.set_class(self.sessions.tab_count == 1, "single")
+        terminal.focus()
+
+    async def action_close_session(self) -> None:
+        """Close the active tab, or the app with the last one."""
+        if self.sessions.tab_count <= 1:
+            self.exit()
+            return
+        await self.sessions.remove_pane(self.sessions.active)
+        self.sessions.set_class(self.sessions.tab_count == 1, "single")
+        self.terminal.focus()
+
+    def action_next_session(self, step: int) -> None:
+        panes = list(self.sessions.query(TabPane))
+        position = panes.index(self.sessions.active_pane)
+        self.sessions.active = panes[(position + step) % len(panes)].id
+
+    def action_clear(self):
+        logger.debug("Clear action triggered")
+        self.terminal.clear()
+
+    def action_toggle_stats(self) -> None:
+        """Show or hide the completion latency panel."""
+        self.stats_panel.display = not self.stats_panel.display
+        if self.stats_panel.display:
+            self._update_stats()
+            self._stats_timer = self.set_interval(self.STATS_REFRESH, self._update_stats)
+        elif self._stats_timer:
+            self._stats_timer.stop()
+            self._stats_timer = None
+
+    def _update_stats(self) -> None:
+        self.stats_panel.update(f"{self.service.stats.format()}\n{self.service.governor.status()}")
@@ -1,7 +1,16 @@
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import asyncio
 import logging
-from .ai_completer import AICompleter
+import os
+import time
+from collections import deque
+from .completion_cache import CompletionCache
+from .completion_service import CompletionService
+from .completion_store import CompletionStore
+from .debounce import AdaptiveDebouncer
+from .history_store import HistoryStore
+from .latency import CompletionSpan
+from .prompt_context import PromptContext
 from .logging_config import setup_logging
 
 logger = setup_logging()
@@ -9,15 +18,55 @@ logger = setup_logging()
 class AutocompleteClient:
     """Handles autocomplete functionality with task management and cancellation."""
     
-    def __init__(self, terminal, model_name: str = "anthropic-sonnet"):
-        """Initialize the autocomplete client."""
-        logger.info(f"Initializing AutocompleteClient with model: {model_name}")
-        self.ai_completer = AICompleter(model_name)
+    def __init__(self, terminal, model_name: str = "anthropic-sonnet", max_in_flight: int = 2,
+                 hedge_model: Optional[str] = None, hedge_mode: str = "hedge",
+                 history: Optional[HistoryStore] = None, store: Optional[CompletionStore] = None,
+                 candidates: int = 3, service: Optional[CompletionService] = None):
+        """Initialize the autocomplete client.
+
+        `service` is the completion engine shared with the app's other
+        sessions. Without one, the client makes its own from the remaining
+        arguments: with `hedge_model`, completions are hedged (or raced)
+        across both models (see HedgedCompleter), `history` is the command
+        history store shared with the terminal (a default one is opened if
+        not given), and `store` the completion cache kept across sessions.
+        Each request asks for up to `candidates` suggestions; see `cycle`.
+        Command names and paths the PathIndex can complete never reach the
+        model.
+        """
+        self._owns_service = service is None
+        if service is None:
+            logger.info(f"Initializing AutocompleteClient with model: {model_name}")
+            service = CompletionService(model_name, hedge_model, hedge_mode, history, store)
+        self.service = service
+        self.ai_completer = service.ai_completer
         self._current_task = None
+        self._pending_text = None  # Input the current task was started for
         self._last_input = ""
         self._suggestion = ""
         self._suggestion_callback = None
+        self.candidates = candidates
+        self._candidates: List[str] = []  # Whole input lines from the last response, best first
+        self._shown_candidate: Optional[str] = None
+        self._cycled = False  # The user picked a candidate; streaming must not replace it
         self.terminal = terminal
+        self.cache = CompletionCache()
+        self.store = service.store
+        self._recent_commands = deque(maxlen=CompletionStore.CONTEXT_COMMANDS)
+        self._store_context = CompletionStore.context_key(self._recent_commands)
+        self.history = service.history
+        self.paths = service.paths
+        self.context = PromptContext(token_budget=self.ai_completer.context_tokens)
+        self.debouncer = AdaptiveDebouncer()
+        self.max_in_flight = max_in_flight
+        self._in_flight = set()  # Tasks not finished yet, including cancelled ones still closing
+        self._debounce_handle: Optional[asyncio.TimerHandle] = None
+        self._deferred = False
+        self.requests_started = 0
+        self.stats = service.stats
+        self._input_changed_at: Optional[float] = None  # Last keystroke not yet requested for
+        self._unpainted_span: Optional[CompletionSpan] = None
+        self.ready = False  # Set once the completer's connection is warmed up
         
     @property
     def suggestion(self) -> str:
@@ -30,61 +79,299 @@ class AutocompleteClient:
             logger.debug("Cancelling pending autocomplete task")
             self._current_task.cancel()
             self._current_task = None
+            self._pending_text = None
             logger.debug("Task cancelled")
         else:
             logger.debug("No pending task to cancel")
         
+    async def warm_up(self) -> None:
+        """Warm up the completion service (see CompletionService.warm_up) and index the working directory."""
+        self.paths.set_root(self._cwd())
+        try:
+            await self.service.warm_up()
+        finally:
+            self.ready = True
+
+    async def aclose(self) -> None:
+        """Cancel pending work, and close the completion service if it is the client's own."""
+        self._cancel_debounce()
+        self.cancel_pending()
+        if self._owns_service:
+            await self.service.aclose()
+
     def set_suggestion_callback(self, callback) -> None:
         """Set the callback to be invoked when a suggestion is received."""
         self._suggestion_callback = callback
         
-    async def get_suggestion(self, current_input: str, lines: list[str]) -> Optional[str]:
-        """Get an autocomplete suggestion for the current input."""
-        try:
-            logger.debug(f"Getting suggestion for input: {current_input}")
-            
-            async for suggestion in self.ai_completer.get_completion(
-                current_input,
-                lines
-            ):
-                if suggestion:
-                    # Only update suggestion and notify callback if task hasn't been cancelled
-                    if not (self._current_task and self._current_task.cancelled()):
-                        self._suggestion = suggestion
-                        if self._suggestion_callback:
-                            self._suggestion_callback(suggestion)
-                        return suggestion
-                    else:
-                        logger.debug("Task was cancelled, discarding suggestion")
-                        return None
-            
+    def record_command(self, command: str) -> None:
+        """Add an executed command to the history and prompt context."""
+        self.history.append(command)
+        self.context.add_command(command)
+        self._recent_commands.append(command.strip())
+        self._store_context = CompletionStore.context_key(self._recent_commands)
+        self._candidates = []
+
+    def record_output(self, lines: List[str]) -> None:
+        """Add shell output lines to the prompt context."""
+        self.context.add_output(lines)
+
+    def cycle(self, step: int = 1) -> bool:
+        """Show the next (or with a negative `step`, previous) candidate for the input.
+
+        Returns False when fewer than two candidates fit what has been typed.
+        """
+        text = self.terminal.current_input
+        matching = self._matching_candidates(text)
+        if len(matching) < 2:
+            return False
+        shown = text + self._suggestion
+        pos = matching.index(shown) if shown in matching else (-1 if step > 0 else 0)
+        self._shown_candidate = matching[(pos + step) % len(matching)]
+        self._cycled = True
+        self._set_suggestion(self._shown_candidate[len(text):])
+        return True
+
+    @property
+    def candidate_position(self) -> Optional[Tuple[int, int]]:
+        """(position, count) of the shown suggestion among several fitting candidates."""
+        text = self.terminal.current_input
+        matching = self._matching_candidates(text)
+        shown = text + self._suggestion
+        if len(matching) < 2 or shown not in matching:
             return None
-        except Exception as e:
-            logger.error(f"Error getting suggestion: {str(e)}", exc_info=True)
-            self._suggestion = ""
+        return matching.index(shown) + 1, len(matching)
+
+    def _matching_candidates(self, text: str) -> List[str]:
+        return [candidate for candidate in self._candidates
+                if candidate.startswith(text) and len(candidate) > len(text)]
+
+    def _candidate_tail(self, text: str) -> Optional[str]:
+        """The rest of the candidate to show for `text`, keeping the one shown if it still fits."""
+        matching = self._matching_candidates(text)
+        if not matching:
+            self._candidates = []
+            self._cycled = False
             return None
-            
+        if self._shown_candidate not in matching:
+            self._shown_candidate = matching[0]
+        return self._shown_candidate[len(text):]
+
+    def _publish(self, span: Optional[CompletionSpan] = None) -> None:
+        """Show the best candidate that still fits the input.
+
+        The user may have typed further along a suggestion since the request
+        started; the suggestion is then shifted to the remaining tail. The
+        span's paint time is taken when the terminal next draws the input.
+        """
+        current = self.terminal.current_input
+        matching = self._matching_candidates(current)
+        if not matching:
+            return
+        self._shown_candidate = matching[0]
+        tail = matching[0][len(current):]
+        if tail != self._suggestion:
+            self._suggestion = tail
+            if span is not None and span.painted is None:
+                self._unpainted_span = span
+            if self._suggestion_callback:
+                self._suggestion_callback(tail)
+
+    def _cwd(self) -> str:
+        shell = getattr(self.terminal, "shell", None)
+        return shell.cwd if shell is not None else os.getcwd()
+
+    def mark_painted(self) -> None:
+        """Called by the terminal after drawing the input line."""
+        if self._unpainted_span is not None:
+            self.stats.painted(self._unpainted_span)
+            self._unpainted_span = None
+
+    async def get_suggestion(self, current_input: str, context: str,
+                             cache_key: Optional[tuple] = None,
+                             span: Optional[CompletionSpan] = None) -> Optional[str]:
+        """Stream autocomplete suggestions for the current input and return the best one.
+
+        The best candidate that fits the input is published as tokens
+        arrive. While the streamed text is still a prefix of the suggestion
+        on screen (e.g. one from history) it is not replaced, so the ghost
+        text does not flicker, and a candidate the user picked with `cycle`
+        is never replaced. Only a finished stream is cached; cancelling the
+        task closes the HTTP stream right away and drops its candidates. The
+        request waits for a slot from the completion service first.
+        """
+        request_text = cache_key[0] if cache_key else ""
+        store_key = (self._cwd(), self._store_context)
+        span = span or self.stats.start_span()
+        async with self.service.slot(self):
+            completion = self.ai_completer.get_completion(current_input, context, span, self.candidates)
+            suggestion = None
+            streamed = None  # This request's candidates, while the stream is still unfinished
+            first = True
+            cancelled = False
+            try:
+                logger.debug("Getting suggestion for input: %s", current_input)
+
+                async for ranked in completion:
+                    suggestion = ranked[0]
+                    if first:
+                        self.debouncer.record_latency(time.monotonic() - span.request_start)
+                        first = False
+                    self._candidates = streamed = [request_text + candidate for candidate in ranked]
+                    shown = request_text + self._suggestion_for(request_text)
+                    if not self._cycled and not shown.startswith(request_text + suggestion):
+                        self._publish(span)
+
+                if span.error:
+                    # The stream broke off: what arrived may be cut short, so keep none of it
+                    if self._candidates is streamed:
+                        self._candidates = []
+                    return None
+                if cache_key and suggestion is not None:
+                    self.cache.put(*cache_key, suggestion)  # Only once the stream has finished, never a partial
+                if suggestion:
+                    if not self._cycled:
+                        self._publish(span)
+                    if cache_key:
+                        self.store.put(request_text, *store_key, suggestion)
+                return suggestion
+            except asyncio.CancelledError:
+                cancelled = True
+                if streamed is not None and self._candidates is streamed:
+                    self._candidates = []  # Cut off mid-stream: they may be truncated
+                raise
+            except Exception as e:
+                logger.error(f"Error getting suggestion: {str(e)}", exc_info=True)
+                return None
+            finally:
+                # Close the stream even when returning early or being cancelled
+                await completion.aclose()
+                self.stats.finish(span, cancelled)
+
+    def _suggestion_for(self, request_text: str) -> str:
+        """The shown suggestion expressed relative to `request_text`."""
+        current = self.terminal.current_input
+        if not current.startswith(request_text):
+            return ""
+        return current[len(request_text):] + self._suggestion
+
+    def _set_suggestion(self, suggestion: str) -> None:
+        self._suggestion = suggestion
+        if self._suggestion_callback:
+            self._suggestion_callback(suggestion)
+
+    def _serve_instant(self, text: str) -> bool:
+        """Show a suggestion that needs no request; True if no request is needed.
+
+        A command name or path the PathIndex is sure of wins, then a
+        candidate from the last response that the input still fits, then
+        the tail of a cached suggestion the user is typing along, from this
+        session's cache or else from the one kept across sessions, and a
+        request still streaming that suggestion is kept running. Otherwise
+        any in-flight request no longer matches the input and is cancelled,
+        and the best history match is shown until the AI answers.
+        """
+        cwd = self._cwd()
+        self.paths.set_root(cwd)
+        cached = self.paths.complete(text, cwd)
+        if cached is not None:
+            self.stats.count("local_hits")
+        if cached is None:
+            cached = self._candidate_tail(text)
+            if cached is not None:
+                self.stats.count("cache_hits" if self._shown_candidate == self._candidates[0] else "candidate_hits")
+        if cached is None:
+            cached = self.cache.lookup(text, self.context.version)
+            if cached is not None:
+                self.stats.count("cache_hits")
+        if cached is None:
+            cached = self.store.lookup(text, cwd, self._store_context)
+            if cached is not None:
+                self.stats.count("stored_hits")
+        if cached is not None:
+            logger.debug("Cache hit for input: %r", text)
+            if self._pending_text is None or not text.startswith(self._pending_text):
+                self.cancel_pending()
+            self._set_suggestion(cached)
+            return True
+
+        if self._current_task and not self._current_task.done():
+            logger.debug("Cancelling existing task, input no longer matches")
+            self.cancel_pending()
+        from_history = self.history.index.complete(text)
+        if from_history:
+            self.stats.count("history_hits")
+        self._set_suggestion(from_history)
+        return False
+
+    def _cancel_debounce(self) -> None:
+        if self._debounce_handle is not None:
+            self._debounce_handle.cancel()
+            self._debounce_handle = None
+
+    def on_input_changed(self) -> None:
+        """React to an edit of the input line.
+
+        Instant suggestions are shown right away; the AI request is scheduled
+        after the adaptive debounce delay and rescheduled by every keystroke.
+        """
+        self.debouncer.record_keystroke()
+        self._input_changed_at = time.monotonic()
+        self._cancel_debounce()
+        if self._serve_instant(self.terminal.current_input):
+            return
+        delay = self.debouncer.delay
+        logger.debug("Scheduling autocomplete in %.0f ms", delay * 1000)
+        self._debounce_handle = asyncio.get_running_loop().call_later(delay, self.check_for_autocomplete)
+
     def check_for_autocomplete(self) -> None:
-        """Check if input has changed and request autocomplete if needed."""
-        current_input = '> ' + self.terminal.current_input
-        lines = self.terminal.output_lines
+        """Request autocomplete for the current input if it needs one."""
+        self._cancel_debounce()
+        text = self.terminal.current_input
+        current_input = '> ' + text
         current_input = current_input.strip()
         
         if current_input == self._last_input:
             return
         
         # Log the state
-        logger.debug(f"Checking autocomplete - Current input: '{current_input}', Last input: '{self._last_input}'")
-            
-            
+        logger.debug("Checking autocomplete - Current input: %r, Last input: %r", current_input, self._last_input)
+
+        if self._serve_instant(text):
+            self._last_input = current_input
+            return
+
+        if not self.ai_completer.available:
+            # Not marked as requested: ask again for the same input once the API may be back
+            logger.debug("Completion API unavailable, keeping to local suggestions")
+            self._debounce_handle = asyncio.get_running_loop().call_later(
+                self.ai_completer.retry_after, self.check_for_autocomplete)
+            return
+
+        # Cancelled tasks still count until their streams are closed
+        if len(self._in_flight) >= self.max_in_flight:
+            logger.debug("Too many requests in flight, deferring autocomplete")
+            self._deferred = True
+            return
+
         logger.debug("Input changed, requesting autocomplete")
         self._last_input = current_input
-        
-        # Cancel any existing task
-        if self._current_task and not self._current_task.done():
-            logger.debug("Cancelling existing task before starting new one")
-            self.cancel_pending()
-            
+
         # Create new task and store reference
         logger.debug("Creating new autocomplete task")
-        self._current_task = asyncio.create_task(self.get_suggestion(current_input, lines))
\ No newline at end of file
+        self._pending_text = text
+        self._cycled = False
+        self.requests_started += 1
+        span = self.stats.start_span(self._input_changed_at)
+        self._input_changed_at = None
+        context = f"Working directory: {self._cwd()}\n{self.context.build()}"
+        self._current_task = asyncio.create_task(
+            self.get_suggestion(current_input, context, cache_key=(text, self.context.version), span=span)
+        )
+        self._in_flight.add(self._current_task)
+        self._current_task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self._in_flight.discard(task)
+        if self._deferred:
+            self._deferred = False
+            self.check_for_autocomplete()
@@ -0,0 +1,55 @@
+from collections import OrderedDict
+from typing import Hashable, Optional
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+class CompletionCache:
+    """LRU cache of suggestions keyed on the input prefix and a context fingerprint.
+
+    A suggestion cached for ``prefix`` stays valid while the user keeps typing
+    its characters: for input ``prefix + typed`` where the suggestion starts
+    with ``typed``, the remaining tail is served without a new request.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def put(self, prefix: str, fingerprint: Hashable, suggestion: str) -> None:
+        """Store the suggestion produced for `prefix` under `fingerprint`."""
+        if not suggestion:
+            return
+        key = (prefix, fingerprint)
+        self._entries[key] = suggestion
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, text: str, fingerprint: Hashable) -> Optional[str]:
+        """Return the remaining suggestion tail for `text`, or None on a miss.
+
+        Prefixes of `text` are tried longest first, so the most specific
+        suggestion wins.
+        """
+        for end in range(len(text), -1, -1):
+            key = (text[:end], fingerprint)
+            suggestion = self._entries.get(key)
+            if suggestion is None:
+                continue
+            typed = text[end:]
+            if len(suggestion) > len(typed) and suggestion.startswith(typed):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return suggestion[len(typed):]
+        self.misses += 1
+        return None
+
+    def clear(self) -> None:
+        """Drop all cached suggestions."""
+        self._entries.clear()
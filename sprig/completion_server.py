@@ -0,0 +1,247 @@
+import asyncio
+import json
+import os
+import re
+import signal
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+from .ai_completer import AICompleter
+from .completion_store import CompletionStore, normalize
+from .governor import CompletionGovernor
+from .hedging import HedgedCompleter
+from .latency import LatencyStats, RollingHistogram
+from .prompt_context import PromptContext
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+_ESCAPED = re.compile(r"\\(.)")
+_UNESCAPED = {"n": "\n", "t": "\t"}
+
+
+def default_socket_path() -> str:
+    """`$SPRIG_SOCKET`, else `sprig.sock` in `$XDG_RUNTIME_DIR`, else `sprig-<uid>.sock` in /tmp."""
+    path = os.environ.get("SPRIG_SOCKET")
+    if path:
+        return path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "sprig.sock")
+    return os.path.join(tempfile.gettempdir(), f"sprig-{os.getuid()}.sock")
+
+
+def escape(field: str) -> str:
+    return field.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def unescape(field: str) -> str:
+    if "\\" not in field:
+        return field
+    return _ESCAPED.sub(lambda match: _UNESCAPED.get(match.group(1), match.group(1)), field)
+
+
+class CompletionServer:
+    """Completions for shells outside Sprig, served over a Unix domain socket.
+
+    One long-lived process keeps the completer's pooled connections warm and
+    answers from the CompletionStore, so shells only pay a local round trip.
+    The protocol is line based, with tab separated fields escaped like the
+    history file (backslash, `\\t`, `\\n`):
+
+        complete <id> <cwd> <input> [<earlier command>...]   ->  <id> <suggestion>
+        cancel <id>                                          ->  (the request answers "")
+        stats                                                ->  stats <json>
+
+    The earlier commands, oldest first, are the prompt context. A client may
+    send several requests before reading; each is answered as soon as it is
+    ready, so replies can come back out of order. After the client shuts
+    down its side, outstanding requests are still answered, then the
+    connection is closed; a client that disconnects cancels them.
+
+    Identical requests in flight (same input, directory and recent commands)
+    share one model request, and at most `max_in_flight` model requests run
+    at once.
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, model_name: str = "anthropic-sonnet",
+                 hedge_model: Optional[str] = None, hedge_mode: str = "hedge",
+                 store: Optional[CompletionStore] = None, max_in_flight: int = 8):
+        self.socket_path = socket_path or default_socket_path()
+        if hedge_model:
+            self.ai_completer = HedgedCompleter.create(model_name, hedge_model, hedge_mode)
+        else:
+            self.ai_completer = AICompleter(model_name)
+        self.governor = CompletionGovernor(self.ai_completer)
+        self.ai_completer = self.governor
+        self.store = store if store is not None else CompletionStore()
+        self.stats = LatencyStats()
+        self.round_trips = RollingHistogram()  # Request read to reply written
+        self.max_in_flight = max_in_flight
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._requests: Dict[Tuple[str, str, str], Tuple[asyncio.Task, List[int]]] = {}
+        self._connections = set()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._warm_up: Optional[asyncio.Future] = None
+
+    async def start(self) -> None:
+        """Listen on the socket and warm up in the background."""
+        if os.path.exists(self.socket_path):
+            try:
+                _, writer = await asyncio.open_unix_connection(self.socket_path)
+            except OSError:
+                os.unlink(self.socket_path)  # Left behind by a daemon that died
+            else:
+                writer.close()
+                raise RuntimeError(f"A Sprig daemon is already serving {self.socket_path}")
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self._server = await asyncio.start_unix_server(self._handle_connection, self.socket_path)
+        os.chmod(self.socket_path, 0o600)  # Completions reveal what the user types
+        self._warm_up = asyncio.gather(self.ai_completer.warm_up(), self.store.load())
+        logger.info(f"Serving completions on {self.socket_path}")
+
+    async def aclose(self) -> None:
+        """Stop listening, drop the connections and release the completer."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._warm_up is not None:
+            self._warm_up.cancel()
+            await asyncio.gather(self._warm_up, return_exceptions=True)
+        await self.ai_completer.aclose()
+        await self.store.aclose()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def complete(self, text: str, cwd: str, commands: List[str]) -> str:
+        """The suggestion for `text`, from the store or else from the model."""
+        context = CompletionStore.context_key(commands[-CompletionStore.CONTEXT_COMMANDS:])
+        cached = self.store.lookup(text, cwd, context)
+        if cached is not None:
+            self.stats.count("stored_hits")
+            return cached
+        if not self.governor.available:
+            return ""  # The API is failing: leave it to the shell's own completion
+
+        key = (normalize(text), cwd, context)
+        if key in self._requests:
+            task, waiters = self._requests[key]
+        else:
+            task = asyncio.create_task(self._request(text, cwd, context, commands))
+            waiters = [0]
+            self._requests[key] = (task, waiters)
+            task.add_done_callback(lambda _: self._requests.pop(key, None))
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            waiters[0] -= 1
+            if not waiters[0] and not task.done():
+                task.cancel()  # Nobody is waiting for it any more
+
+    async def _request(self, text: str, cwd: str, context: str, commands: List[str]) -> str:
+        async with self._slots:
+            prompt_context = PromptContext(token_budget=self.ai_completer.context_tokens)
+            for command in commands:
+                prompt_context.add_command(command)
+            span = self.stats.start_span()
+            prompt = f"Working directory: {cwd}\n{prompt_context.build()}"
+            completion = self.ai_completer.get_completion(f"> {text}".strip(), prompt, span)
+            ranked = []
+            cancelled = False
+            try:
+                async for ranked in completion:
+                    pass
+            except asyncio.CancelledError:
+                cancelled = True
+                raise
+            finally:
+                await completion.aclose()
+                self.stats.finish(span, cancelled)
+        if span.error:
+            return ""  # The stream broke off or timed out: the text may be cut short, so neither keep nor send it
+        suggestion = ranked[0] if ranked else ""
+        self.store.put(text, cwd, context, suggestion)
+        return suggestion
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        requests: Dict[str, asyncio.Task] = {}  # Completions by request id, until answered
+        replies = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                fields = line.decode("utf-8", "replace").rstrip("\n").split("\t")
+                if fields[0] == "complete" and len(fields) >= 4:
+                    request_id, cwd, text = fields[1], unescape(fields[2]), unescape(fields[3])
+                    commands = [unescape(field) for field in fields[4:]]
+                    request = asyncio.create_task(self.complete(text, cwd, commands))
+                    requests[request_id] = request
+                    reply = asyncio.create_task(self._reply(writer, request_id, request))
+                    replies.add(reply)
+                    reply.add_done_callback(replies.discard)
+                    reply.add_done_callback(lambda _, request_id=request_id: requests.pop(request_id, None))
+                elif fields[0] == "cancel" and len(fields) == 2:
+                    if fields[1] in requests:
+                        requests[fields[1]].cancel()
+                elif fields[0] == "stats":
+                    writer.write(f"stats\t{json.dumps(self.summary())}\n".encode("utf-8"))
+                else:
+                    logger.warning(f"Ignoring malformed request: {line[:200]!r}")
+            # The client is done sending but still reading
+            await asyncio.gather(*replies, return_exceptions=True)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in (*requests.values(), *replies):
+                task.cancel()
+            writer.close()
+            self._connections.discard(connection)
+
+    async def _reply(self, writer: asyncio.StreamWriter, request_id: str, request: asyncio.Task) -> None:
+        received = time.monotonic()
+        try:
+            suggestion = await request
+        except asyncio.CancelledError:
+            if not request.cancelled():
+                raise
+            suggestion = ""  # Cancelled by the client, which still gets its reply
+        except Exception as e:
+            logger.error(f"Error completing request {request_id}: {e}", exc_info=True)
+            suggestion = ""
+        if not writer.is_closing():
+            writer.write(f"{request_id}\t{escape(suggestion)}\n".encode("utf-8"))
+            self.round_trips.add(time.monotonic() - received)
+
+    def summary(self) -> dict:
+        """Completion latencies and counters, server round trips, store and governor counters."""
+        summary = self.stats.summary()
+        summary["server_ms"] = self.round_trips.summary(1000)
+        summary["store"] = self.store.stats()
+        summary["governor"] = dict(self.governor.stats, state=self.governor.state)
+        summary["connections"] = len(self._connections)
+        return summary
+
+
+async def run_server(socket_path: Optional[str] = None, **kwargs) -> None:
+    """Serve completions until SIGINT or SIGTERM."""
+    server = CompletionServer(socket_path, **kwargs)
+    await server.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Sprig completion daemon listening on {server.socket_path}", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        await server.aclose()
@@ -0,0 +1,118 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Hashable, Optional
+from .ai_completer import AICompleter
+from .completion_store import CompletionStore
+from .governor import CompletionGovernor
+from .hedging import HedgedCompleter
+from .history_store import HistoryStore
+from .latency import LatencyStats
+from .path_index import PathIndex
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+
+class CompletionService:
+    """The completion engine shared by every session in the app.
+
+    It holds the one completer (so one HTTP connection pool), the
+    completion cache kept across sessions, the command history, the path
+    index and the latency stats. The completer is wrapped in a
+    CompletionGovernor, so requests stop while the API is failing. Each
+    session's AutocompleteClient keeps only what is its own: the input,
+    prompt context, debounce and pending request.
+
+    Model requests from all sessions go through `slot`: at most
+    `max_in_flight` run at once, and a freed slot goes to the sessions
+    waiting in turn, so one busy session cannot starve the others. A
+    request cancelled while it waits gives up its place in the queue.
+    """
+
+    def __init__(self, model_name: str = "anthropic-sonnet", hedge_model: Optional[str] = None,
+                 hedge_mode: str = "hedge", history: Optional[HistoryStore] = None,
+                 store: Optional[CompletionStore] = None, max_in_flight: int = 4):
+        if hedge_model:
+            self.ai_completer = HedgedCompleter.create(model_name, hedge_model, hedge_mode)
+        else:
+            self.ai_completer = AICompleter(model_name)
+        self.governor = CompletionGovernor(self.ai_completer)
+        self.ai_completer = self.governor  # Every request goes through the circuit breaker and budgets
+        self.history = history if history is not None else HistoryStore()
+        self.store = store if store is not None else CompletionStore()
+        self.paths = PathIndex()
+        self.stats = LatencyStats()
+        self.max_in_flight = max_in_flight
+        self._free = max_in_flight
+        self._waiting: "OrderedDict[Hashable, Deque[asyncio.Future]]" = OrderedDict()  # Sessions in turn order
+        self._warm_up: Optional[asyncio.Future] = None
+        self.ready = False  # Set once the completer's connection is warmed up
+
+    @property
+    def waiting(self) -> Dict[Hashable, int]:
+        """Requests waiting for a slot, per session."""
+        return {session: len(waiters) for session, waiters in self._waiting.items()}
+
+    async def warm_up(self) -> None:
+        """Pre-open the completer's connection and load the completions cached by earlier sessions.
+
+        Every session calls this; the work is done once.
+        """
+        if self._warm_up is None:
+            self._warm_up = asyncio.ensure_future(asyncio.gather(self.ai_completer.warm_up(), self.store.load()))
+        try:
+            await asyncio.shield(self._warm_up)
+        finally:
+            self.ready = self._warm_up.done()
+
+    async def aclose(self) -> None:
+        """Release the completer's connections and flush the completion cache and history."""
+        if self._warm_up is not None and not self._warm_up.done():
+            self._warm_up.cancel()
+            await asyncio.gather(self._warm_up, return_exceptions=True)
+        await self.ai_completer.aclose()
+        await self.store.aclose()
+        self.paths.close()
+        await asyncio.to_thread(self.history.close)
+
+    @asynccontextmanager
+    async def slot(self, session: Hashable):
+        """Hold one of the `max_in_flight` model request slots for `session`."""
+        await self._acquire(session)
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, session: Hashable) -> None:
+        if self._free and not self._waiting:
+            self._free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(session, deque()).append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # Granted just as it was cancelled: pass the slot on
+            else:
+                waiters = self._waiting.get(session)
+                if waiters is not None and waiter in waiters:
+                    waiters.remove(waiter)
+                    if not waiters:
+                        del self._waiting[session]
+            raise
+
+    def _release(self) -> None:
+        while self._waiting:
+            session, waiters = next(iter(self._waiting.items()))
+            waiter = waiters.popleft()
+            if waiters:
+                self._waiting.move_to_end(session)  # Its next request waits for the other sessions
+            else:
+                del self._waiting[session]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._free += 1
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from .logging_config import setup_logging
+from .user_dirs import user_cache_dir
+
+logger = setup_logging()
+
+_SPACES = re.compile(r"\s+")
+
+Key = Tuple[str, str, str]  # (normalized prefix, cwd, context key)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    prefix TEXT NOT NULL,
+    cwd TEXT NOT NULL,
+    context TEXT NOT NULL,
+    suggestion TEXT NOT NULL,
+    created REAL NOT NULL,
+    used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (prefix, cwd, context)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS completions_used ON completions (used);
+"""
+
+
+def default_cache_path() -> str:
+    """`$SPRIG_COMPLETION_CACHE`, else `sprig/completions.sqlite3` in the user's cache directory."""
+    path = os.environ.get("SPRIG_COMPLETION_CACHE")
+    if path:
+        return path
+    return os.path.join(user_cache_dir(), "completions.sqlite3")
+
+
+def normalize(text: str) -> str:
+    """Input as it is cached: leading blanks dropped, runs of blanks made one space."""
+    return _SPACES.sub(" ", text.lstrip())
+
+
+class CompletionStore:
+    """Completions kept across sessions in an SQLite database.
+
+    Entries are keyed on the normalized input prefix, the shell's working
+    directory and `context_key` of the last few commands, and served like
+    CompletionCache serves them: a suggestion stays valid while the user
+    types along it. They expire `ttl` seconds after they were produced, and
+    beyond `max_entries` the least recently used ones are evicted.
+
+    Lookups never touch the database: `load` reads the entries into memory
+    in a worker thread, and new entries, hits and evictions are written
+    back by the same thread in one transaction every FLUSH_DELAY seconds.
+    Several sessions may share the file; each trims it to its limits when
+    it loads. `":memory:"` keeps the entries for this session only.
+    """
+
+    CONTEXT_COMMANDS = 2  # Recent commands that make up the context key
+    FLUSH_DELAY = 2.0
+
+    def __init__(self, path: Optional[str] = None, ttl: float = 7 * 24 * 3600, max_entries: int = 20_000):
+        self.path = path or default_cache_path()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Key, Tuple[str, float]]" = OrderedDict()  # -> (suggestion, created)
+        self._writes: Dict[Key, Optional[Tuple[str, float]]] = {}  # None deletes the entry
+        self._touched: Dict[Key, int] = {}  # Hits since the last flush
+        self._lock = threading.Lock()  # Guards the two dicts above
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._db = None  # Only used on the executor's thread
+        self._failed = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def context_key(commands: Iterable[str]) -> str:
+        """A short digest of the recent commands a completion was made after."""
+        digest = hashlib.blake2b("\n".join(commands).encode("utf-8", "replace"), digest_size=8)
+        return digest.hexdigest()
+
+    def lookup(self, text: str, cwd: str, context: str) -> Optional[str]:
+        """Return the remaining suggestion tail for `text`, or None on a miss."""
+        text = normalize(text)
+        expired_before = time.time() - self.ttl
+        for end in range(len(text), -1, -1):
+            key = (text[:end], cwd, context)
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            suggestion, created = entry
+            if created < expired_before:
+                del self._entries[key]
+                self._write(key, None)
+                continue
+            typed = text[end:]
+            if len(suggestion) > len(typed) and suggestion.startswith(typed):
+                self._entries.move_to_end(key)
+                with self._lock:
+                    self._touched[key] = self._touched.get(key, 0) + 1
+                self._schedule_flush()
+                self.hits += 1
+                return suggestion[len(typed):]
+        self.misses += 1
+        return None
+
+    def put(self, prefix: str, cwd: str, context: str, suggestion: str) -> None:
+        """Store the suggestion the model produced for `prefix`."""
+        if not suggestion or self._failed:
+            return
+        key = (normalize(prefix), cwd, context)
+        entry = (suggestion, time.time())
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._write(key, entry)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._write(evicted, None)
+
+    async def load(self) -> None:
+        """Read the stored entries in the worker thread; lookups miss until then."""
+        if self.loaded:
+            return
+        start = time.perf_counter()
+        entries = await asyncio.get_running_loop().run_in_executor(self._worker(), self._read)
+        for key, entry in self._entries.items():  # Produced while loading, so newer
+            entries[key] = entry
+            entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        self._entries, self.loaded = entries, True
+        logger.info(f"Loaded {len(entries)} cached completions in {time.perf_counter() - start:.3f}s")
+
+    async def aclose(self) -> None:
+        """Write out what is pending and close the database."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if self._executor is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+        self._executor.shutdown(wait=False)
+        self._executor = None
+
+    def stats(self) -> dict:
+        """Entry count and this session's hit and miss counters."""
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def _worker(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprig-completions")
+        return self._executor
+
+    def _write(self, key: Key, entry: Optional[Tuple[str, float]]) -> None:
+        with self._lock:
+            self._writes[key] = entry
+        self._schedule_flush()
+
+    def _schedule_flush(self) -> None:
+        if self._flush_handle is None and not self._failed:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.FLUSH_DELAY, self._submit_flush)
+
+    def _submit_flush(self) -> None:
+        self._flush_handle = None
+        self._worker().submit(self._flush)
+
+    # The methods below run on the worker thread
+
+    def _connect(self):
+        if self._db is None:
+            import sqlite3  # Only the worker thread needs it
+
+            directory = os.path.dirname(self.path)
+            if directory and self.path != ":memory:":
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, timeout=1.0)
+            db.execute("PRAGMA journal_mode=WAL")  # Other sessions keep reading while one writes
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            self._db = db
+        return self._db
+
+    def _fail(self, action: str, error: Exception) -> None:
+        logger.warning(f"Could not {action} completion cache {self.path}, not using it: {error}")
+        self._failed = True
+
+    def _read(self) -> "OrderedDict[Key, Tuple[str, float]]":
+        entries = OrderedDict()
+        try:
+            db = self._connect()
+            with db:
+                db.execute("DELETE FROM completions WHERE created < ?", (time.time() - self.ttl,))
+                db.execute("DELETE FROM completions WHERE used < "
+                           "(SELECT used FROM completions ORDER BY used DESC LIMIT 1 OFFSET ?)",
+                           (self.max_entries - 1,))
+            rows = db.execute("SELECT prefix, cwd, context, suggestion, created FROM completions ORDER BY used")
+            for prefix, cwd, context, suggestion, created in rows:
+                entries[(prefix, cwd, context)] = (suggestion, created)
+        except Exception as e:
+            self._fail("read", e)
+        return entries
+
+    def _flush(self) -> None:
+        with self._lock:
+            writes, self._writes = self._writes, {}
+            touched, self._touched = self._touched, {}
+        if self._failed or not (writes or touched):
+            return
+        now = time.time()
+        puts = [(*key, *entry, now) for key, entry in writes.items() if entry is not None]
+        deletes = [key for key, entry in writes.items() if entry is None]
+        try:
+            db = self._connect()
+            with db:
+                db.executemany(
+                    "INSERT INTO completions (prefix, cwd, context, suggestion, created, used) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (prefix, cwd, context) DO UPDATE SET "
+                    "suggestion = excluded.suggestion, created = excluded.created, used = excluded.used",
+                    puts)
+                db.executemany("DELETE FROM completions WHERE prefix = ? AND cwd = ? AND context = ?", deletes)
+                db.executemany("UPDATE completions SET used = ?, hits = hits + ? "
+                               "WHERE prefix = ? AND cwd = ? AND context = ?",
+                               [(now, count, *key) for key, count in touched.items()])
+        except Exception as e:
+            self._fail("write to", e)
+
+    def _close(self) -> None:
+        self._flush()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
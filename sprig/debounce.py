@@ -0,0 +1,59 @@
+import statistics
+import time
+from collections import deque
+from typing import Optional
+
+class AdaptiveDebouncer:
+    """Picks how long to wait after a keystroke before requesting a completion.
+
+    The delay follows the user's typing cadence (an exponentially weighted
+    average of the gaps between keystrokes), so a fast typist is not
+    interrupted between keys and a slow one is not kept waiting. It grows
+    with the rolling median model latency: the slower a request, the more a
+    premature one costs when the next keystroke supersedes it.
+    """
+
+    def __init__(self, min_delay: float = 0.05, max_delay: float = 0.4,
+                 cadence_factor: float = 1.5, latency_factor: float = 0.1,
+                 smoothing: float = 0.3, pause_threshold: float = 1.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.cadence_factor = cadence_factor
+        self.latency_factor = latency_factor
+        self.smoothing = smoothing
+        self.pause_threshold = pause_threshold
+        self._interval: Optional[float] = None
+        self._last_keystroke: Optional[float] = None
+        self._latencies: deque = deque(maxlen=20)
+
+    def record_keystroke(self, now: Optional[float] = None) -> None:
+        """Note a keystroke; gaps longer than `pause_threshold` are not cadence."""
+        now = time.monotonic() if now is None else now
+        if self._last_keystroke is not None:
+            gap = now - self._last_keystroke
+            if gap < self.pause_threshold:
+                if self._interval is None:
+                    self._interval = gap
+                else:
+                    self._interval += self.smoothing * (gap - self._interval)
+        self._last_keystroke = now
+
+    def record_latency(self, seconds: float) -> None:
+        """Note how long a request took to produce its first suggestion."""
+        self._latencies.append(seconds)
+
+    @property
+    def typing_interval(self) -> Optional[float]:
+        return self._interval
+
+    @property
+    def latency(self) -> Optional[float]:
+        return statistics.median(self._latencies) if self._latencies else None
+
+    @property
+    def delay(self) -> float:
+        """Seconds to wait after the latest keystroke."""
+        delay = self.cadence_factor * (self._interval if self._interval is not None else self.min_delay * 2)
+        if self._latencies:
+            delay += self.latency_factor * self.latency
+        return min(self.max_delay, max(self.min_delay, delay))
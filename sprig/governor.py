@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+from .latency import CompletionSpan, RollingHistogram
+from .prompt_context import estimate_tokens
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+
+class _Budget:
+    """A token bucket that refills `per_minute` units a minute, up to a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute / 60)
+        self._updated = now
+
+    def has(self, amount: float) -> bool:
+        self._refill()
+        return self.level >= amount
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+
+class CompletionGovernor:
+    """Keeps completion requests off an API that is failing or slow.
+
+    Wraps a completer (AICompleter or HedgedCompleter) and has the same
+    interface. The outcome of each request (ok, slow, failed or timed out)
+    goes into a rolling window when its stream ends. A request that has
+    produced no suggestion within `first_token_timeout` (a multiple of the
+    recent time to first token) is given up on instead of waiting for the
+    HTTP timeout.
+
+    When too many recent requests failed, or were slow or failed, the
+    circuit opens: requests are refused at once for a cooldown, and
+    `available` is False so that callers fall back to their local
+    suggestions without asking. After the cooldown one probe request is
+    let through (half-open); if it succeeds the circuit closes, otherwise
+    it opens again for twice as long, up to MAX_COOLDOWN.
+
+    Requests and prompt tokens are also budgeted per minute, so a burst of
+    sessions cannot flood the API; over budget, requests are refused the
+    same way.
+    """
+
+    WINDOW = 20  # Recent outcomes the failure and slow rates are taken over
+    MIN_REQUESTS = 5  # Outcomes needed before the rates can open the circuit
+    FAILURE_RATE = 0.5
+    SLOW_RATE = 0.8  # Slow or failed
+    CONSECUTIVE_FAILURES = 3  # Open the circuit regardless of the rates
+    SLOW_CALL = 2.0  # Seconds to the first suggestion above which a request counts as slow
+    COOLDOWN = 5.0
+    MAX_COOLDOWN = 60.0
+
+    def __init__(self, completer, requests_per_minute: float = 240, tokens_per_minute: float = 400_000,
+                 default_timeout: float = 3.0, min_timeout: float = 1.0, max_timeout: float = 5.0):
+        self.completer = completer
+        self.enabled = True  # False passes every request through untimed, still counting outcomes
+        self.state = "closed"
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._outcomes: deque = deque(maxlen=self.WINDOW)
+        self._consecutive_failures = 0
+        self._ttfts = RollingHistogram(window=50)
+        self._cooldown = self.COOLDOWN
+        self._retry_at = 0.0
+        self._probing = False
+        self._requests = _Budget(requests_per_minute)
+        self._tokens = _Budget(tokens_per_minute)
+        self.stats = {"allowed": 0, "refused": 0, "throttled": 0, "failed": 0, "timeouts": 0, "slow": 0,
+                      "opened": 0}
+
+    @property
+    def name(self) -> str:
+        return getattr(self.completer, "name", type(self.completer).__name__)
+
+    @property
+    def context_tokens(self) -> int:
+        return self.completer.context_tokens
+
+    @property
+    def first_token_timeout(self) -> float:
+        """Seconds to wait for the first suggestion: four times the recent p90, within bounds."""
+        if len(self._ttfts) < 5:
+            return self.default_timeout
+        return min(self.max_timeout, max(self.min_timeout, 4 * self._ttfts.percentile(0.9)))
+
+    @property
+    def available(self) -> bool:
+        """Whether a request now would be let through."""
+        if not self.enabled:
+            return True
+        if self.state == "open" and time.monotonic() < self._retry_at:
+            return False
+        if self.state != "closed" and self._probing:
+            return False
+        return self._requests.has(1)
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until `available` may be True again."""
+        if self.state == "open":
+            return max(0.0, self._retry_at - time.monotonic())
+        return 60 / self._requests.per_minute  # Until the probe finishes or the budget refills
+
+    def status(self) -> str:
+        """One line for the stats panel."""
+        if self.state == "open":
+            wait = max(0.0, self._retry_at - time.monotonic())
+            return f"API circuit open, local suggestions only; retrying in {wait:.0f}s"
+        if self.state == "half_open":
+            return "API circuit half-open, probing"
+        return (f"API ok  timeout {self.first_token_timeout * 1000:.0f} ms  "
+                f"failed {self.stats['failed']}  timeouts {self.stats['timeouts']}  refused {self.stats['refused']}")
+
+    async def warm_up(self) -> None:
+        await self.completer.warm_up()
+
+    async def aclose(self) -> None:
+        await self.completer.aclose()
+
+    async def get_completion(self, current_input: str, context: str, span: Optional[CompletionSpan] = None,
+                             candidates: int = 1):
+        """Yield the completer's suggestions, unless the circuit or the budgets refuse the request."""
+        probe = self._admit(estimate_tokens(context) + estimate_tokens(current_input) + 50 * candidates)
+        if probe is None:
+            return
+        span = span or CompletionSpan()
+        start = time.monotonic()
+        deadline = self.first_token_timeout if self.enabled else None
+        completion = self.completer.get_completion(current_input, context, span, candidates)
+        outcome = None  # Stays None if the caller gives up first, which says nothing about the API
+        try:
+            try:
+                ranked = await asyncio.wait_for(completion.__anext__(), deadline)
+            except StopAsyncIteration:
+                outcome = "failed" if span.error else "ok"  # An empty answer is still an answer
+                return
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                span.error = "timeout"
+                logger.warning(f"No suggestion after {deadline:.1f}s, giving up on the request")
+                return
+            latency = time.monotonic() - start
+            self._ttfts.add(latency)
+            # Kept if the caller stops reading early; a stream that breaks off midway fails below
+            outcome = "slow" if latency > self.SLOW_CALL else "ok"
+            yield ranked
+            async for ranked in completion:
+                yield ranked
+            if span.error:
+                outcome = "failed"
+        finally:
+            await completion.aclose()
+            self._record(outcome, probe)
+
+    def _admit(self, tokens: int) -> Optional[bool]:
+        """Take the request's budget; whether it is a probe, or None if it is refused."""
+        if not self.enabled:
+            self.stats["allowed"] += 1
+            return False
+        if self.state == "open":
+            if time.monotonic() < self._retry_at:
+                self.stats["refused"] += 1
+                return None
+            self.state = "half_open"
+        if self.state == "half_open" and self._probing:
+            self.stats["refused"] += 1
+            return None
+        if not self._requests.has(1) or not self._tokens.has(tokens):
+            self.stats["throttled"] += 1
+            return None
+        self._requests.take(1)
+        self._tokens.take(tokens)
+        self.stats["allowed"] += 1
+        probe = self.state == "half_open"
+        if probe:
+            self._probing = True
+            logger.info(f"Probing {self.name} after {self._cooldown:.0f}s")
+        return probe
+
+    def _record(self, outcome: Optional[str], probe: bool) -> None:
+        if probe:
+            self._probing = False
+        if outcome is None:
+            return
+        if outcome == "failed":
+            self.stats["failed"] += 1
+        elif outcome == "timeout":
+            self.stats["timeouts"] += 1
+        elif outcome == "slow":
+            self.stats["slow"] += 1
+        self._outcomes.append(outcome)
+        bad = outcome in ("failed", "timeout")
+        self._consecutive_failures = self._consecutive_failures + 1 if bad else 0
+        if not self.enabled:
+            return
+        if probe:
+            if outcome == "ok":
+                self._close()
+            else:
+                self._open(min(self.MAX_COOLDOWN, self._cooldown * 2))
+        elif self.state == "closed" and self._should_open():
+            self._open(self.COOLDOWN)
+
+    def _should_open(self) -> bool:
+        if self._consecutive_failures >= self.CONSECUTIVE_FAILURES:
+            return True
+        if len(self._outcomes) < self.MIN_REQUESTS:
+            return False
+        failed = sum(1 for outcome in self._outcomes if outcome in ("failed", "timeout"))
+        slow = sum(1 for outcome in self._outcomes if outcome == "slow")
+        return failed >= self.FAILURE_RATE * len(self._outcomes) or \
+            failed + slow >= self.SLOW_RATE * len(self._outcomes)
+
+    def _open(self, cooldown: float) -> None:
+        self.state = "open"
+        self._cooldown = cooldown
+        self._retry_at = time.monotonic() + cooldown
+        self.stats["opened"] += 1
+        logger.warning(f"Completion API failing or slow ({list(self._outcomes)[-5:]}); "
+                       f"using local suggestions for {cooldown:.0f}s")
+
+    def _close(self) -> None:
+        self.state = "closed"
+        self._cooldown = self.COOLDOWN
+        self._outcomes.clear()
+        self._consecutive_failures = 0
+        logger.info("Completion API recovered, closing the circuit")
@@ -0,0 +1,157 @@
+import asyncio
+import time
+from typing import Optional
+from .ai_completer import AICompleter
+from .latency import CompletionSpan, RollingHistogram
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+class HedgedCompleter:
+    """Completes with two models to cut tail latency.
+
+    In "hedge" mode the primary (fast) model is asked first, and the
+    secondary model only if the primary has not produced a token within a
+    percentile of its own recent time-to-first-token. If the primary fails
+    outright the secondary is asked at once. In "race" mode both are asked
+    together. Whichever produces a suggestion first wins; the other request
+    is cancelled, which closes its stream.
+
+    Each model streams into a span of its own, and only the winner's marks,
+    tokens and error are copied to the caller's span. A primary cancelled
+    because the secondary won still adds its wait to the hedge delay's
+    samples, as a lower bound on its time to first token, so slow rounds
+    are not left out.
+
+    The class has the same interface as AICompleter, so AutocompleteClient
+    can use either.
+    """
+
+    MODES = ("hedge", "race")
+
+    def __init__(self, primary: AICompleter, secondary: AICompleter, mode: str = "hedge",
+                 percentile: float = 0.9, default_delay: float = 0.75, min_samples: int = 5):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown hedging mode: {mode}")
+        self.primary = primary
+        self.secondary = secondary
+        self.mode = mode
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._ttfts = RollingHistogram(window=50)
+        self.stats = {"requests": 0, "hedged": 0, "primary_wins": 0, "secondary_wins": 0,
+                      "primary_tokens": 0, "secondary_tokens": 0}
+        logger.info(f"HedgedCompleter: {mode} {primary.name} -> {secondary.name}")
+
+    @classmethod
+    def create(cls, model_name: str, hedge_model: str, mode: str = "hedge") -> "HedgedCompleter":
+        """Build a hedged pair whose completers share one connection pool."""
+        primary = AICompleter(model_name)
+        secondary = AICompleter(hedge_model, share_with=primary)
+        return cls(primary, secondary, mode)
+
+    @property
+    def context_tokens(self) -> int:
+        """Both models get the same prompt, so use the smaller budget."""
+        return min(self.primary.context_tokens, self.secondary.context_tokens)
+
+    @property
+    def hedge_delay(self) -> float:
+        """Seconds to wait for the primary's first token before hedging."""
+        if len(self._ttfts) < self.min_samples:
+            return self.default_delay
+        return self._ttfts.percentile(self.percentile)
+
+    async def warm_up(self) -> None:
+        await asyncio.to_thread(lambda: self.primary.client)  # Create the shared client once, off the event loop
+        await asyncio.gather(self.primary.warm_up(), self.secondary.warm_up())
+
+    async def aclose(self) -> None:
+        await self.secondary.aclose()
+        await self.primary.aclose()
+
+    async def get_completion(self, current_input: str, context: str, span: Optional[CompletionSpan] = None,
+                             candidates: int = 1):
+        """Yield suggestions from whichever model answers first."""
+        self.stats["requests"] += 1
+        span = span or CompletionSpan()
+        queue: asyncio.Queue = asyncio.Queue()
+        primary_failed = asyncio.Event()
+        spans = {name: CompletionSpan(span.input_changed) for name in ("primary", "secondary")}
+        lost = set()  # Cancelled because the other model won, not by the caller
+
+        async def run(name: str, completer: AICompleter):
+            start = time.monotonic()
+            completion = completer.get_completion(current_input, context, spans[name], candidates)
+            produced = False
+            try:
+                async for suggestion in completion:
+                    if not produced and name == "primary":
+                        self._ttfts.add(time.monotonic() - start)
+                    produced = True
+                    await queue.put((name, suggestion))
+            finally:
+                await completion.aclose()
+                self.stats[f"{name}_tokens"] += spans[name].tokens
+                if not produced and name == "primary":
+                    if name in lost:
+                        self._ttfts.add(time.monotonic() - start)  # At least this long
+                    primary_failed.set()
+                queue.put_nowait((name, None))
+
+        async def run_secondary():
+            if self.mode == "hedge":
+                try:
+                    await asyncio.wait_for(primary_failed.wait(), timeout=self.hedge_delay)
+                    logger.debug("Primary produced nothing, asking secondary")
+                except asyncio.TimeoutError:
+                    logger.debug("No token after %.0f ms, hedging", self.hedge_delay * 1000)
+            self.stats["hedged"] += 1
+            await run("secondary", self.secondary)
+
+        tasks = {
+            "primary": asyncio.create_task(run("primary", self.primary)),
+            "secondary": asyncio.create_task(run_secondary()),
+        }
+        winner: Optional[str] = None
+        finished = set()
+        try:
+            while len(finished) < len(tasks):
+                name, suggestion = await queue.get()
+                if suggestion is None:
+                    finished.add(name)
+                    if name == winner:
+                        self._merge(spans[name], span)
+                        break
+                    if winner is None and len(finished) == len(tasks):
+                        errors = [model_span.error for model_span in spans.values()]
+                        span.error = errors[0] if all(errors) else None  # Failed only if both models did
+                    continue
+                if winner is None:
+                    winner = name
+                    self.stats[f"{name}_wins"] += 1
+                    loser = "secondary" if name == "primary" else "primary"
+                    lost.add(loser)
+                    tasks[loser].cancel()
+                    finished.add(loser)
+                    logger.debug("%s model won the race", name)
+                if name == winner:
+                    self._merge(spans[name], span)
+                    yield suggestion
+        finally:
+            # Cancel each task once: a second cancel would interrupt the
+            # stream's cleanup and leave its connection checked out of the pool
+            for name, task in tasks.items():
+                if name not in finished:
+                    task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    @staticmethod
+    def _merge(source: CompletionSpan, span: CompletionSpan) -> None:
+        """Copy the winning model's progress to the caller's span."""
+        span.first_byte = span.first_byte or source.first_byte
+        span.first_token = span.first_token or source.first_token
+        span.last_token = source.last_token
+        span.tokens = source.tokens
+        span.error = source.error
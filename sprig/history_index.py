@@ -0,0 +1,307 @@
+import heapq
+import os
+import re
+import time
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, count
+from typing import Dict, Iterable, List, Optional, Tuple
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+class _Entry:
+    """A distinct command with its usage statistics."""
+
+    __slots__ = ("command", "lower", "count", "last_used", "score")
+
+    def __init__(self, command: str):
+        self.command = command
+        lower = command.lower()
+        self.lower = command if lower == command else lower  # Shared when equal
+        self.count = 0
+        self.last_used = 0.0
+        self.score = 0.0
+
+
+class _Node:
+    """Radix tree node; `best` is the highest scoring entry in its subtree."""
+
+    __slots__ = ("label", "children", "entry", "best")
+
+    def __init__(self, label: str):
+        self.label = label
+        self.children = {}
+        self.entry: Optional[_Entry] = None
+        self.best: Optional[_Entry] = None
+
+
+class HistoryIndex:
+    """Index over past commands, ranked by frequency and recency.
+
+    Commands are stored in a radix tree whose nodes cache the best command of
+    their subtree, so a prefix lookup costs O(len(prefix)) regardless of the
+    history size.
+
+    Ranking uses exponentially decayed frequency ("frecency"): every use adds a
+    weight that doubles each `half_life` commands. Only the used command's
+    score changes, so the cached per-node winners stay valid; the weights are
+    rescaled uniformly before they overflow, which preserves the ordering.
+
+    For search (Ctrl+R) the commands are also kept as one rank-ordered
+    text; see `prepare_search`.
+    """
+
+    SEARCH_DEPTH = 4  # Substring matches looked at per result when ranking
+    SNAPSHOT_STALE = 1000  # Commands used since the search snapshot before it is rebuilt
+
+    def __init__(self, half_life: int = 500):
+        self._root = _Node("")
+        self._entries: Dict[str, _Entry] = {}
+        self._growth = 2 ** (1 / half_life)
+        self._weight = 1.0
+        self._snapshot: Optional[Tuple[List[_Entry], Dict[bool, Tuple[str, array]]]] = None
+        self._recent: Dict[str, _Entry] = {}  # Used since the snapshot was taken
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, command: str) -> bool:
+        return command in self._entries
+
+    def add(self, command: str, timestamp: Optional[float] = None) -> None:
+        """Record one use of `command`."""
+        command = command.strip()
+        if not command:
+            return
+
+        path = self._insert(command)
+        entry = path[-1].entry
+        if entry is None:
+            entry = path[-1].entry = self._new_entry(command)
+
+        self._weight *= self._growth
+        if self._weight > 1e100:
+            self._rescale()
+        entry.count += 1
+        entry.last_used = timestamp if timestamp is not None else time.time()
+        entry.score += self._weight
+
+        for node in path:
+            if node.best is None or entry.score > node.best.score:
+                node.best = entry
+        if self._snapshot is not None:
+            self._recent[command] = entry
+
+    def extend(self, commands: Iterable[str]) -> None:
+        """Record a batch of commands, oldest first."""
+        for command in commands:
+            self.add(command)
+
+    def load(self, records: Iterable[Tuple[str, float]]) -> None:
+        """Bulk-add (command, timestamp) uses, oldest first, into an empty index.
+
+        Uses are aggregated per command before anything is inserted, and
+        weights are taken relative to the newest use, so they cannot
+        overflow; later `add` calls outrank every loaded use as they should.
+        """
+        if self._entries:
+            raise ValueError("HistoryIndex.load needs an empty index")
+        records = list(records)
+        newest, growth = len(records), self._growth
+        totals: Dict[str, list] = {}
+        for position, (command, timestamp) in enumerate(records):
+            command = command.strip()
+            if not command:
+                continue
+            weight = growth ** (position - newest)
+            total = totals.get(command)
+            if total is None:
+                totals[command] = [1, timestamp, weight]
+            else:
+                total[0] += 1
+                total[1] = timestamp
+                total[2] += weight
+
+        for command, (uses, last_used, score) in totals.items():
+            path = self._insert(command)
+            entry = path[-1].entry = self._new_entry(command)
+            entry.count, entry.last_used, entry.score = uses, last_used, score
+            for node in path:
+                if node.best is None or score > node.best.score:
+                    node.best = entry
+        self._weight = 1.0
+
+    def _new_entry(self, command: str) -> _Entry:
+        entry = self._entries[command] = _Entry(command)
+        return entry
+
+    def best(self, prefix: str) -> Optional[str]:
+        """Return the highest ranked command starting with `prefix`."""
+        node = self._find(prefix)
+        return node.best.command if node and node.best else None
+
+    def complete(self, prefix: str) -> str:
+        """Return the text that completes `prefix` to its best match, or ''."""
+        if not prefix:
+            return ""
+        command = self.best(prefix)
+        if command is None or len(command) <= len(prefix):
+            return ""
+        return command[len(prefix):]
+
+    def matches(self, prefix: str, limit: int = 10) -> List[str]:
+        """The `limit` highest ranked commands starting with `prefix`, best first.
+
+        A best-first walk of the tree: a node's cached best score bounds
+        everything below it, so only about `limit` branches are opened.
+        """
+        node = self._find(prefix)
+        if node is None or node.best is None:
+            return []
+        tiebreak = count()
+        heap = [(-node.best.score, next(tiebreak), node)]
+        results = []
+        while heap and len(results) < limit:
+            _, _, item = heapq.heappop(heap)
+            if isinstance(item, _Entry):
+                results.append(item.command)
+                continue
+            if item.entry is not None:
+                heapq.heappush(heap, (-item.entry.score, next(tiebreak), item.entry))
+            for child in item.children.values():
+                if child.best is not None:
+                    heapq.heappush(heap, (-child.best.score, next(tiebreak), child))
+        return results
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """Commands matching `query` for reverse search, best first.
+
+        Commands containing `query` come first: those starting with it,
+        then those with it at the start of a word, then the rest, each by
+        rank. Fewer than `limit` of those are topped up with fuzzy matches,
+        commands containing the query's characters in order. Matching
+        ignores case unless the query has capitals.
+        """
+        if not query:
+            return self.matches("", limit)
+        exact_case = query.lower() != query
+        needle = query if exact_case else query.lower()
+        text_of = (lambda entry: entry.command) if exact_case else (lambda entry: entry.lower)
+        text, starts, ranked = self._search_snapshot(exact_case)
+        recent = self._recent
+
+        def scan(find, wanted: int, accept) -> List[_Entry]:
+            """The first `wanted` matching entries in rank order, plus recently used ones."""
+            found = [entry for entry in recent.values() if accept(entry)]
+            wanted += len(found)
+            position = find(text, 0)
+            while position >= 0 and len(found) < wanted:
+                line = bisect_right(starts, position) - 1
+                entry = ranked[line]
+                if entry.command not in recent and accept(entry):
+                    found.append(entry)
+                position = find(text, starts[line + 1])
+            return found
+
+        def tier(entry: _Entry) -> int:
+            command = text_of(entry)
+            position = command.find(needle)
+            if position == 0:
+                return 0
+            return 1 if command[position - 1] in " /-_.=" else 2
+
+        matches = scan(lambda text, start: text.find(needle, start), limit * self.SEARCH_DEPTH,
+                       lambda entry: needle in text_of(entry))
+        matches.sort(key=lambda entry: (tier(entry), -entry.score))
+        results = [entry.command for entry in matches[:limit]]
+        if len(results) < limit and len(needle) > 1:
+            pattern = re.compile("[^\n]*?".join(map(re.escape, needle)))
+            found = set(results)
+
+            def find(text: str, start: int) -> int:
+                match = pattern.search(text, start)
+                return match.start() if match else -1
+
+            extra = scan(find, limit - len(results),
+                         lambda entry: entry.command not in found and pattern.search(text_of(entry)) is not None)
+            extra.sort(key=lambda entry: -entry.score)
+            results.extend(entry.command for entry in extra[:limit - len(results)])
+        return results
+
+    def prepare_search(self) -> None:
+        """Build the snapshot `search` scans: every command, lowercased, in rank order.
+
+        A search is then a C-speed `str.find` over one string that stops
+        after the first matches, which are also the best ranked. Commands
+        used after the snapshot are checked separately, until so many have
+        been that it is rebuilt. The original-case text for queries with
+        capitals is only built when one is made.
+        """
+        ranked = sorted(self._entries.values(), key=lambda entry: -entry.score)
+        self._snapshot = (ranked, {False: self._join(entry.lower for entry in ranked)})
+        self._recent = {}
+
+    def _search_snapshot(self, exact_case: bool) -> Tuple[str, array, List[_Entry]]:
+        if self._snapshot is None or len(self._recent) > self.SNAPSHOT_STALE:
+            self.prepare_search()
+        ranked, texts = self._snapshot
+        if exact_case not in texts:
+            texts[exact_case] = self._join(entry.command for entry in ranked)
+        text, starts = texts[exact_case]
+        return text, starts, ranked
+
+    @staticmethod
+    def _join(commands: Iterable[str]) -> Tuple[str, array]:
+        """Join `commands` into lines, with the offset of each line and one past the end."""
+        commands = list(commands)
+        return "\n".join(commands), array("I", accumulate((len(command) + 1 for command in commands), initial=0))
+
+    def _find(self, prefix: str) -> Optional[_Node]:
+        node = self._root
+        rest = prefix
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                return None
+            label = child.label
+            if len(rest) <= len(label):
+                return child if label.startswith(rest) else None
+            if not rest.startswith(label):
+                return None
+            rest = rest[len(label):]
+            node = child
+        return node
+
+    def _insert(self, command: str) -> list:
+        """Insert `command` into the tree and return the node path to it."""
+        node = self._root
+        path = [node]
+        rest = command
+        while rest:
+            child = node.children.get(rest[0])
+            if child is None:
+                child = node.children[rest[0]] = _Node(rest)
+                path.append(child)
+                break
+
+            common = len(os.path.commonprefix((child.label, rest)))
+            if common < len(child.label):
+                # Split the edge; the new node covers exactly the old subtree
+                middle = _Node(child.label[:common])
+                middle.best = child.best
+                child.label = child.label[common:]
+                middle.children[child.label[0]] = child
+                node.children[rest[0]] = middle
+                child = middle
+
+            path.append(child)
+            node = child
+            rest = rest[common:]
+        return path
+
+    def _rescale(self) -> None:
+        logger.debug(f"Rescaling history scores for {len(self._entries)} commands")
+        for entry in self._entries.values():
+            entry.score /= self._weight
+        self._weight = 1.0
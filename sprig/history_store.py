@@ -0,0 +1,172 @@
+import asyncio
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from .history_index import HistoryIndex
+from .logging_config import setup_logging
+
+try:
+    import fcntl
+except ImportError:  # Windows: records are still written with a single append
+    fcntl = None
+
+logger = setup_logging()
+
+_ESCAPED = re.compile(r"\\(.)")
+
+
+def default_history_path() -> str:
+    """`$SPRIG_HISTORY_FILE`, else `sprig/history` in the user's data directory."""
+    path = os.environ.get("SPRIG_HISTORY_FILE")
+    if path:
+        return path
+    if os.name == "nt":
+        base = os.environ.get("APPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+    return os.path.join(base, "sprig", "history")
+
+
+def _escape(command: str) -> str:
+    return command.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _unescape(command: str) -> str:
+    if "\\" not in command:
+        return command
+    return _ESCAPED.sub(lambda match: "\n" if match.group(1) == "n" else match.group(1), command)
+
+
+class HistoryStore:
+    """Command history kept on disk and shared by every running session.
+
+    The file is append-only with one record per line: timestamp, session id
+    and the command, tab separated, with backslashes and newlines escaped.
+    Each record goes out in one O_APPEND write under an advisory lock, so
+    sessions writing at the same time never interleave records, and a
+    reader that sees a partly written last line simply leaves it for later.
+    Records are written in order on a worker thread, so the event loop never
+    waits for the lock or the disk; `close` waits for the ones still queued.
+
+    `index` (a HistoryIndex) answers prefix lookups and searches. It starts
+    with this session's commands only; `load` reads the file in a thread
+    and swaps in the full index, and `refresh` picks up what other
+    sessions have appended since.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or default_history_path()
+        self.session = uuid.uuid4().hex[:8]
+        self.index = HistoryIndex()
+        self.loaded = False
+        self._offset = 0  # Bytes of the file already read
+        self._pending: List[Tuple[str, float]] = []  # This session's commands from before the load
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    def append(self, command: str) -> None:
+        """Record an executed command in the index and the file."""
+        command = command.strip()
+        if not command:
+            return
+        timestamp = time.time()
+        self.index.add(command, timestamp)
+        if not self.loaded:
+            self._pending.append((command, timestamp))
+
+        record = f"{timestamp:.3f}\t{self.session}\t{_escape(command)}\n".encode("utf-8")
+        if self._writer is None:
+            self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprig-history")
+        self._writer.submit(self._write, record)
+
+    def close(self) -> None:
+        """Finish writing the queued records."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def _write(self, record: bytes) -> None:
+        """Append one record to the file; runs on the writer thread."""
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                os.write(fd, record)
+            finally:
+                os.close(fd)  # Also releases the lock
+        except OSError as e:
+            logger.warning(f"Could not save command to history file {self.path}: {e}")
+
+    async def load(self) -> None:
+        """Read the history file in a worker thread and switch to the full index."""
+        if self.loaded:
+            return
+        start = time.perf_counter()
+        index, offset, records = await asyncio.to_thread(self._read_file)
+        for command, timestamp in self._pending:  # Newer than anything in the file
+            index.add(command, timestamp)
+        self.index, self._offset, self.loaded = index, offset, True
+        self._pending = []
+        logger.info(f"Loaded {records} history records ({len(index)} distinct commands) "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def refresh(self) -> None:
+        """Add the commands other sessions have appended since the last read."""
+        if not self.loaded:
+            return
+        try:
+            if os.path.getsize(self.path) <= self._offset:
+                return
+            records, self._offset = self._read_records(self._offset)
+        except OSError as e:
+            logger.warning(f"Could not read history file {self.path}: {e}")
+            return
+        for command, timestamp in records:
+            self.index.add(command, timestamp)
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """Ranked matches for reverse search, including other sessions' latest commands."""
+        self.refresh()
+        return self.index.search(query, limit)
+
+    def _read_file(self) -> Tuple[HistoryIndex, int, int]:
+        index = HistoryIndex()
+        try:
+            records, offset = self._read_records(0)
+        except FileNotFoundError:
+            records, offset = [], 0
+        except OSError as e:
+            logger.warning(f"Could not read history file {self.path}: {e}")
+            records, offset = [], 0
+        index.load(records)
+        index.prepare_search()
+        return index, offset, len(records)
+
+    def _read_records(self, offset: int) -> Tuple[List[Tuple[str, float]], int]:
+        """Other sessions' (command, timestamp) records from `offset` on, and the new offset.
+
+        Only complete lines are read, so a record still being written is
+        picked up by the next read.
+        """
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        records = []
+        session = self.session
+        for line in data[:end].decode("utf-8", errors="replace").split("\n"):
+            fields = line.split("\t", 2)
+            if len(fields) != 3 or fields[1] == session:
+                continue
+            try:
+                timestamp = float(fields[0])
+            except ValueError:
+                continue
+            records.append((_unescape(fields[2]), timestamp))
+        return records, offset + end
@@ -0,0 +1,189 @@
+import json
+import math
+import os
+import time
+from collections import deque
+from typing import Dict, Optional
+from .logging_config import setup_logging
+from .user_dirs import user_cache_dir
+
+logger = setup_logging()
+
+
+def default_stats_path() -> str:
+    """`sprig/latency_stats.json` in the user's cache directory, next to the completion cache."""
+    return os.path.join(user_cache_dir(), "latency_stats.json")
+
+
+class RollingHistogram:
+    """Percentiles over the most recent `window` samples."""
+
+    def __init__(self, window: int = 500):
+        self._samples: deque = deque(maxlen=window)
+        self.total = 0  # Samples ever added, including ones that left the window
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+        self.total += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]  # Nearest rank
+
+    def summary(self, scale: float = 1.0) -> Dict[str, Optional[float]]:
+        """Count, p50/p95/p99 and max, multiplied by `scale`."""
+        if not self._samples:
+            return {"count": 0}
+        return {
+            "count": self.total,
+            "p50": round(self.percentile(0.5) * scale, 2),
+            "p95": round(self.percentile(0.95) * scale, 2),
+            "p99": round(self.percentile(0.99) * scale, 2),
+            "max": round(max(self._samples) * scale, 2),
+        }
+
+
+class CompletionSpan:
+    """Timestamps of one completion request, from the keystroke to the painted suggestion.
+
+    Each mark is set once, with `time.monotonic()`; later marks of the same
+    name are ignored. `last_token` is the exception and moves with every
+    token. Hedged requests give each model a span of its own and copy the
+    winner's to this one.
+    `error` says why the request failed, if it did.
+    """
+
+    __slots__ = ("input_changed", "request_start", "first_byte", "first_token",
+                 "last_token", "painted", "tokens", "error")
+
+    def __init__(self, input_changed: Optional[float] = None):
+        now = time.monotonic()
+        self.input_changed = input_changed if input_changed is not None else now
+        self.request_start = now
+        self.first_byte: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.last_token: Optional[float] = None
+        self.painted: Optional[float] = None
+        self.tokens = 0
+        self.error: Optional[str] = None
+
+    def mark(self, name: str) -> None:
+        if getattr(self, name) is None:
+            setattr(self, name, time.monotonic())
+
+    def token(self) -> None:
+        """Note a streamed token."""
+        self.tokens += 1
+        self.last_token = time.monotonic()
+
+
+class LatencyStats:
+    """Rolling latency histograms and counters for completion requests.
+
+    Each phase is the time between two span marks. Request phases are
+    recorded when the request finishes; the paint phases when the
+    suggestion first reaches the screen.
+    """
+
+    REQUEST_PHASES = {
+        "debounce": ("input_changed", "request_start"),
+        "first_byte": ("request_start", "first_byte"),
+        "first_token": ("request_start", "first_token"),
+        "stream": ("first_token", "last_token"),
+    }
+    PAINT_PHASES = {
+        "paint": ("first_token", "painted"),
+        "end_to_end": ("input_changed", "painted"),
+    }
+
+    def __init__(self, window: int = 500):
+        self.phases = {name: RollingHistogram(window) for name in (*self.REQUEST_PHASES, *self.PAINT_PHASES)}
+        self.tokens = RollingHistogram(window)
+        self.counters = {
+            "requests": 0,
+            "completed": 0,
+            "cancelled": 0,
+            "empty": 0,  # Finished without a suggestion
+            "failed": 0,  # Finished with an error from the API or the connection
+            "candidate_hits": 0,  # Served from another candidate of an earlier response
+            "cache_hits": 0,
+            "stored_hits": 0,  # From the completion cache kept across sessions
+            "history_hits": 0,
+            "local_hits": 0,  # Command names and paths completed from the PathIndex
+        }
+
+    def count(self, name: str) -> None:
+        self.counters[name] += 1
+
+    def start_span(self, input_changed: Optional[float] = None) -> CompletionSpan:
+        self.counters["requests"] += 1
+        return CompletionSpan(input_changed)
+
+    def finish(self, span: CompletionSpan, cancelled: bool = False) -> None:
+        """Record a request that completed or was cancelled."""
+        if cancelled:
+            self.counters["cancelled"] += 1
+        elif span.first_token is None:
+            self.counters["failed" if span.error else "empty"] += 1
+        else:
+            self.counters["completed"] += 1
+            self.tokens.add(span.tokens)
+        self._record(span, self.REQUEST_PHASES)
+
+    def painted(self, span: CompletionSpan) -> None:
+        """Record that the span's first suggestion is on screen."""
+        span.mark("painted")
+        self._record(span, self.PAINT_PHASES)
+
+    def _record(self, span: CompletionSpan, phases: dict) -> None:
+        for name, (start, end) in phases.items():
+            start_time, end_time = getattr(span, start), getattr(span, end)
+            if start_time is not None and end_time is not None:
+                self.phases[name].add(end_time - start_time)
+
+    @property
+    def cancel_rate(self) -> float:
+        finished = sum(self.counters[name] for name in ("completed", "cancelled", "empty", "failed"))
+        return self.counters["cancelled"] / finished if finished else 0.0
+
+    def summary(self) -> dict:
+        """Latencies in milliseconds, tokens per request and counters."""
+        return {
+            "latency_ms": {name: histogram.summary(1000) for name, histogram in self.phases.items()},
+            "tokens_per_request": self.tokens.summary(),
+            "cancel_rate": round(self.cancel_rate, 3),
+            "counters": dict(self.counters),
+        }
+
+    def format(self) -> str:
+        """A few lines of text for the stats panel."""
+        lines = []
+        for name, histogram in self.phases.items():
+            s = histogram.summary(1000)
+            if s["count"]:
+                lines.append(f"{name:<12} p50 {s['p50']:>7.1f}  p95 {s['p95']:>7.1f}  p99 {s['p99']:>7.1f} ms  (n={s['count']})")
+            else:
+                lines.append(f"{name:<12} -")
+        tokens = self.tokens.percentile(0.5)
+        lines.append(
+            f"requests {self.counters['requests']}  cancelled {self.cancel_rate:.0%}  "
+            f"tokens/request {tokens if tokens is not None else '-'}  "
+            f"candidate hits {self.counters['candidate_hits']}  "
+            f"cache hits {self.counters['cache_hits']} (+{self.counters['stored_hits']} stored)  history hits {self.counters['history_hits']}  "
+            f"local hits {self.counters['local_hits']}"
+        )
+        return "\n".join(lines)
+
+    def dump(self, path: str) -> None:
+        """Write the summary to `path` as JSON, creating its directory."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        logger.info(f"Latency stats written to {path}")
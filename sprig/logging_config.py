@@ -1,57 +1,152 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List
+from dotenv import load_dotenv
 
-def setup_logging(name="sprig"):
-    """Set up logging configuration for the main application."""
+load_dotenv()  # SPRIG_LOG_LEVEL and the OpenRouter settings may be set in .env
+
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+DEFAULT_LEVEL = "INFO"
+
+# Records per second allowed for high-volume categories (see
+# get_category_logger); the rest are dropped and counted.
+RATE_LIMITS = {
+    "sprig.keys": 20,
+    "sprig.stream": 50,
+    "sprig.shell.io": 50,
+}
+
+_listeners: List[QueueListener] = []
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    """Parse `SPRIG_LOG_LEVEL`, e.g. "INFO" or "WARNING,sprig.stream=DEBUG".
+
+    A bare level applies to every sprig logger; `name=LEVEL` entries set
+    the level of one logger (and its children).
+    """
+    levels = {"sprig": logging.getLevelName(DEFAULT_LEVEL)}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, level = part.rpartition("=")
+        levels[name or "sprig"] = logging.getLevelName(level.upper())
+    return {name: level for name, level in levels.items() if isinstance(level, int)}
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """Queues records without formatting them.
+
+    The stock QueueHandler merges the message and its arguments before
+    queueing; here that is left to the listener thread, so the event loop
+    only pays for building the record. Arguments must therefore not be
+    mutated after the call, which holds for the strings and numbers the
+    app logs.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most `per_second` records through, dropping the rest.
+
+    A token bucket one second deep, so short bursts pass. When records have
+    been dropped, the next one that passes says how many.
+    """
+
+    def __init__(self, per_second: float):
+        super().__init__()
+        self.per_second = per_second
+        self._tokens = per_second
+        self._last = time.monotonic()
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.per_second, self._tokens + (now - self._last) * self.per_second)
+        self._last = now
+        if self._tokens < 1:
+            self.dropped += 1
+            return False
+        self._tokens -= 1
+        if self.dropped:
+            record.msg = f"[{self.dropped} similar messages dropped] {record.msg}"
+            self.dropped = 0
+        return True
+
+
+class _LazyFileHandler(RotatingFileHandler):
+    """Opens its file, creating the log directory, when the first record is written.
+
+    Records are written by the listener thread, so importing a module that
+    sets up logging costs no file system calls on the main thread.
+    """
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def _start_pipeline(logger: logging.Logger, filename: str, log_dir: str = LOG_DIR) -> QueueListener:
+    """Route `logger` through a queue to a file handler on a background thread."""
+    file_handler = _LazyFileHandler(
+        os.path.join(log_dir, filename),
+        maxBytes=1024*1024,  # 1MB
+        backupCount=5
+    )
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger.addHandler(_DeferredQueueHandler(log_queue))
+
+    listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+
+def _configure(name: str, filename: str) -> logging.Logger:
     logger = logging.getLogger(name)
     if not logger.handlers:  # Only add handlers if they don't exist
-        logger.setLevel(logging.DEBUG)
-        
-        # Create logs directory if it doesn't exist
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-        
-        # File handler
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'sprig.log'),
-            maxBytes=1024*1024,  # 1MB
-            backupCount=5
-        )
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Create formatter and add it to the handler
-        file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(file_formatter)
-        
-        # Add the handler to the logger
-        logger.addHandler(file_handler)
-    
+        levels = _parse_levels(os.getenv("SPRIG_LOG_LEVEL", ""))
+        for logger_name, level in levels.items():
+            logging.getLogger(logger_name).setLevel(level)
+        _listeners.append(_start_pipeline(logger, filename))
+        if len(_listeners) == 1:
+            atexit.register(stop_logging)
     return logger
 
+
+def setup_logging(name="sprig"):
+    """Set up logging configuration for the main application.
+
+    Levels come from the `SPRIG_LOG_LEVEL` environment variable (INFO by
+    default). Records are written to logs/sprig.log by a background thread.
+    """
+    return _configure(name, 'sprig.log')
+
 def setup_shell_logging():
     """Set up logging configuration specifically for the shell component."""
-    logger = logging.getLogger('sprig.shell')
-    if not logger.handlers:
-        logger.setLevel(logging.DEBUG)
-        
-        # Create logs directory if it doesn't exist
-        log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'logs')
-        os.makedirs(log_dir, exist_ok=True)
-        
-        # File handler for shell-specific logs
-        file_handler = RotatingFileHandler(
-            os.path.join(log_dir, 'shell.log'),
-            maxBytes=1024*1024,  # 1MB
-            backupCount=5
-        )
-        file_handler.setLevel(logging.DEBUG)
-        
-        # Create formatter and add it to the handler
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        
-        # Add the handler to the logger
-        logger.addHandler(file_handler)
-    
+    return _configure('sprig.shell', 'shell.log')
+
+def get_category_logger(category: str) -> logging.Logger:
+    """Logger for a high-volume category such as "keys" or "stream".
+
+    Records go wherever their parent's records go, limited to the rate in
+    RATE_LIMITS for the category.
+    """
+    setup_logging()
+    logger = logging.getLogger(f"sprig.{category}")
+    if logger.name in RATE_LIMITS and not logger.filters:
+        logger.addFilter(RateLimitFilter(RATE_LIMITS[logger.name]))
     return logger
+
+def stop_logging() -> None:
+    """Flush queued records and stop the writer threads."""
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,237 @@
+import os
+import re
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+_SEPARATORS = re.compile(r"\|\||&&|[|;&(]")
+_WORDS = re.compile(r"(?<!\\)\s+")
+_ESCAPED = re.compile(r"\\(.)")
+_SPECIAL = re.compile(r"([\s'\"\\$&;|<>()*?!#`{}\[\]])")
+_END = "\U0010ffff"  # Sorts after every character a name can contain
+
+# Words that run the next word as a command
+PREFIX_COMMANDS = {"sudo", "doas", "time", "exec", "nohup", "env", "command", "builtin", "xargs", "watch", "nice"}
+# Commands whose arguments are files, and those whose arguments are directories
+PATH_COMMANDS = {
+    "cat", "less", "more", "head", "tail", "vi", "vim", "nvim", "nano", "emacs", "code", "open", "ls",
+    "cp", "mv", "rm", "ln", "touch", "chmod", "chown", "source", ".", "bash", "sh", "zsh", "python",
+    "python3", "node", "file", "stat", "wc", "diff", "tar", "unzip", "du",
+}
+DIRECTORY_COMMANDS = {"cd", "pushd", "rmdir"}
+BUILTINS = ["alias", "bg", "cd", "exit", "export", "fg", "history", "jobs", "popd", "pushd", "source",
+            "type", "unalias", "unset"]
+
+
+class _Listing:
+    """The sorted entry names of one directory; names of subdirectories end in "/"."""
+
+    __slots__ = ("names", "mtime", "checked")
+
+    def __init__(self, names: List[str], mtime: int):
+        self.names = names
+        self.mtime = mtime
+        self.checked = time.monotonic()
+
+
+def _list_directory(path: str) -> _Listing:
+    mtime = os.stat(path).st_mtime_ns  # Before listing, so a change while listing is seen next time
+    names = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            names.append(entry.name + "/" if is_dir else entry.name)
+    names.sort()
+    return _Listing(names, mtime)
+
+
+def _prefix_range(names: List[str], prefix: str) -> Tuple[int, int]:
+    """The slice of sorted `names` that start with `prefix`."""
+    return bisect_left(names, prefix), bisect_left(names, prefix + _END)
+
+
+def _completion(names: List[str], lo: int, hi: int, typed: str) -> Optional[str]:
+    """What every name in names[lo:hi] continues `typed` with, or None if they share nothing more.
+
+    The names are sorted, so what they all share is what the first and the
+    last share.
+    """
+    if lo >= hi:
+        return None
+    if hi - lo == 1:
+        name = names[lo]
+        return name[len(typed):] + ("" if name.endswith("/") else " ")
+    shared = os.path.commonprefix([names[lo], names[hi - 1]])
+    return shared[len(typed):] or None
+
+
+class PathIndex:
+    """Local completion of command names and file paths, without the model.
+
+    Command names come from the executables on PATH (plus a few builtins);
+    paths from per-directory listings. Both are kept sorted, so a prefix
+    query is two bisections and answers in microseconds. A worker thread
+    does all file system access: `set_root` lists the directory tree under
+    a shell's working directory, `max_depth` levels deep, and a directory
+    outside it is listed the first time it is asked about. Sessions share
+    one index, so the tree under each of their directories is listed at
+    most every REINDEX_INTERVAL seconds. A listing is
+    re-checked against its directory's mtime at most every CHECK_INTERVAL
+    seconds when used, and relisted if it changed; PATH likewise.
+
+    `complete` only answers when it is sure: every match continues the
+    input the same way (a single match, or a longer shared prefix).
+    """
+
+    CHECK_INTERVAL = 1.0
+    REINDEX_INTERVAL = 60.0
+    MAX_TREE_DIRECTORIES = 2000  # Listed ahead of time per working directory
+    MAX_LISTINGS = 20_000
+    SKIP = {".git", "node_modules", "__pycache__", ".venv", "venv", ".mypy_cache", ".tox"}
+
+    def __init__(self, max_depth: int = 3):
+        self.max_depth = max_depth
+        self._trees: Dict[str, float] = {}  # Working directory -> when its tree was last listed
+        self._listings: Dict[str, _Listing] = {}  # Written by the worker thread only
+        self._commands: List[str] = sorted(BUILTINS)
+        self._path_mtimes: Dict[str, int] = {}
+        self._commands_checked = -self.CHECK_INTERVAL
+        self._queued = set()  # Directories waiting to be (re)listed
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def set_root(self, cwd: str) -> None:
+        """List the tree under a shell's working directory in the background."""
+        listed = self._trees.get(cwd)
+        if listed is None or time.monotonic() - listed > self.REINDEX_INTERVAL:
+            self._trees[cwd] = time.monotonic()
+            self._submit(self._build_tree, cwd)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def complete(self, text: str, cwd: str) -> Optional[str]:
+        """The tail to append to `text`, if the last word is a command or path it can complete."""
+        words = _WORDS.split(_SEPARATORS.split(text)[-1].lstrip())
+        token, earlier = words[-1], words[:-1]
+        while earlier and (earlier[0] in PREFIX_COMMANDS or "=" in earlier[0]):
+            earlier.pop(0)  # sudo, env and VAR=value run the word after them
+        if not token or token.startswith("-"):
+            return None
+        if not earlier and "/" not in token:
+            return self._complete_command(token)
+        command = earlier[0] if earlier else None
+        if "/" in token or token.startswith(("~", ".")) or command in PATH_COMMANDS or command in DIRECTORY_COMMANDS:
+            return self._complete_path(token, cwd, directories_only=command in DIRECTORY_COMMANDS)
+        return None
+
+    def _complete_command(self, token: str) -> Optional[str]:
+        if time.monotonic() - self._commands_checked > self.CHECK_INTERVAL:
+            self._commands_checked = time.monotonic()
+            self._submit(self._refresh_commands)
+        commands = self._commands
+        return _completion(commands, *_prefix_range(commands, token), token)
+
+    def _complete_path(self, token: str, cwd: str, directories_only: bool) -> Optional[str]:
+        typed = _ESCAPED.sub(r"\1", token)
+        folder, base = typed[:typed.rfind("/") + 1], typed[typed.rfind("/") + 1:]
+        directory = os.path.normpath(os.path.join(cwd, os.path.expanduser(folder))) if folder else cwd
+        listing = self._listing(directory)
+        if listing is None:
+            return None
+        names = listing.names
+        if not base:  # Everything in the directory, except hidden entries
+            names = [name for name in names if not name.startswith(".")]
+        if directories_only:
+            lo, hi = _prefix_range(names, base)
+            names = [name for name in names[lo:hi] if name.endswith("/")]
+        lo, hi = _prefix_range(names, base)
+        tail = _completion(names, lo, hi, base)
+        if tail is None:
+            return None
+        if hi - lo == 1 and not names[lo].endswith("/"):  # Keep the space after a file name unescaped
+            return _SPECIAL.sub(r"\\\1", tail[:-1]) + " "
+        return _SPECIAL.sub(r"\\\1", tail)
+
+    def _listing(self, directory: str) -> Optional[_Listing]:
+        listing = self._listings.get(directory)
+        if listing is None or time.monotonic() - listing.checked > self.CHECK_INTERVAL:
+            if directory not in self._queued:
+                self._queued.add(directory)
+                self._submit(self._refresh, directory)
+        return listing
+
+    def _submit(self, function, *args) -> None:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sprig-paths")
+        self._executor.submit(function, *args)
+
+    # The methods below run on the worker thread
+
+    def _refresh(self, directory: str) -> None:
+        self._queued.discard(directory)
+        listing = self._listings.get(directory)
+        try:
+            if listing is not None and os.stat(directory).st_mtime_ns == listing.mtime:
+                listing.checked = time.monotonic()
+                return
+            self._listings[directory] = _list_directory(directory)
+        except OSError:
+            self._listings[directory] = _Listing([], 0)  # Missing or unreadable; checked again later
+
+    def _build_tree(self, root: str) -> None:
+        start = time.perf_counter()
+        level, listed = [root], 0
+        for depth in range(self.max_depth + 1):
+            below = []
+            for directory in level:
+                if listed >= self.MAX_TREE_DIRECTORIES:
+                    break
+                self._refresh(directory)
+                listed += 1
+                if depth < self.max_depth:
+                    below.extend(os.path.join(directory, name[:-1]) for name in self._listings[directory].names
+                                 if name.endswith("/") and name[:-1] not in self.SKIP)
+            level = below
+        excess = len(self._listings) - self.MAX_LISTINGS
+        if excess > 0:  # Forget the oldest listings outside the new tree
+            stale = [path for path in self._listings if not path.startswith(root)][:excess]
+            for path in stale:
+                del self._listings[path]
+        logger.info(f"Indexed {listed} directories under {root} in {time.perf_counter() - start:.3f}s")
+
+    def _refresh_commands(self) -> None:
+        directories = [path for path in os.environ.get("PATH", "").split(os.pathsep) if path]
+        mtimes = {}
+        for directory in directories:
+            try:
+                mtimes[directory] = os.stat(directory).st_mtime_ns
+            except OSError:
+                pass
+        if mtimes == self._path_mtimes:
+            return
+        extensions = {ext.lower() for ext in os.environ.get("PATHEXT", "").split(os.pathsep) if ext}
+        commands = set(BUILTINS)
+        for directory in mtimes:
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if os.name == "nt":
+                            stem, ext = os.path.splitext(entry.name)
+                            if ext.lower() in extensions:
+                                commands.add(stem)
+                        elif entry.is_file() and os.access(entry.path, os.X_OK):
+                            commands.add(entry.name)
+            except OSError:
+                continue
+        self._commands = sorted(commands)
+        self._path_mtimes = mtimes
+        logger.info(f"Indexed {len(commands)} commands on PATH")
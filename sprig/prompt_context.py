@@ -0,0 +1,148 @@
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+class _Block:
+    """A command and its output, truncated at head and tail.
+
+    Consecutive identical lines are collapsed into one entry with a repeat
+    count. The rendered text is cached until the block changes.
+    """
+
+    __slots__ = ("command", "head", "tail", "omitted", "_rendered")
+
+    def __init__(self, command: Optional[str], tail_lines: int):
+        self.command = command
+        self.head: List[list] = []  # [line, repeats]
+        self.tail: deque = deque(maxlen=tail_lines)
+        self.omitted = 0
+        self._rendered: Optional[Tuple[str, int]] = None
+
+    def add(self, line: str, head_lines: int) -> None:
+        self._rendered = None
+        last = self.tail[-1] if self.tail else (self.head[-1] if self.head else None)
+        if last is not None and last[0] == line:
+            last[1] += 1
+        elif len(self.head) < head_lines and not self.tail:
+            self.head.append([line, 1])
+        else:
+            if len(self.tail) == self.tail.maxlen:
+                self.omitted += self.tail[0][1]
+            self.tail.append([line, 1])
+
+    def render(self) -> Tuple[str, int]:
+        """Return the block text and its estimated token count."""
+        if self._rendered is None:
+            lines = self.command_lines()
+            lines.extend(self._entry_text(entry) for entry in self.head)
+            if self.omitted:
+                lines.append(f"... ({self.omitted} lines omitted) ...")
+            lines.extend(self._entry_text(entry) for entry in self.tail)
+            text = "\n".join(lines)
+            self._rendered = (text, estimate_tokens(text) + 1)
+        return self._rendered
+
+    def render_tail(self, budget: int) -> Tuple[str, int]:
+        """Render the command and as many of the latest lines as fit in `budget`."""
+        lines = []
+        used = sum(estimate_tokens(line) + 1 for line in self.command_lines())
+        for entry in reversed(list(self.head) + list(self.tail)):
+            text = self._entry_text(entry)
+            cost = estimate_tokens(text) + 1
+            if used + cost > budget:
+                break
+            lines.append(text)
+            used += cost
+        if len(lines) < len(self.head) + len(self.tail) or self.omitted:
+            lines.append("...")
+        lines.extend(reversed(self.command_lines()))
+        return "\n".join(reversed(lines)), used
+
+    def command_lines(self) -> List[str]:
+        return [f"> {self.command}"] if self.command is not None else []
+
+    @staticmethod
+    def _entry_text(entry: list) -> str:
+        line, repeats = entry
+        return f"{line} (repeated {repeats} times)" if repeats > 1 else line
+
+
+class PromptContext:
+    """Token-budgeted window over recent commands and their output.
+
+    Lines are folded into per-command blocks as they arrive, so building the
+    prompt only concatenates cached block texts. The newest block is always
+    included (truncated to fit if needed); older blocks are included whole
+    while the budget allows, and after that only their command lines.
+    """
+
+    def __init__(self, token_budget: int = 1000, head_lines: int = 10,
+                 tail_lines: int = 20, max_line_chars: int = 200, max_blocks: int = 200):
+        self.token_budget = token_budget
+        self.head_lines = head_lines
+        self.tail_lines = tail_lines
+        self.max_line_chars = max_line_chars
+        self._blocks: deque = deque(maxlen=max_blocks)
+        self.version = 0
+        self._built: Tuple[int, str] = (-1, "")
+
+    def add_command(self, command: str) -> None:
+        """Start a new block for an executed command."""
+        self._blocks.append(_Block(command, self.tail_lines))
+        self.version += 1
+
+    def add_output(self, lines: Iterable[str]) -> None:
+        """Append output lines to the current block."""
+        if not self._blocks:
+            self._blocks.append(_Block(None, self.tail_lines))
+        block = self._blocks[-1]
+        for line in lines:
+            if len(line) > self.max_line_chars:
+                line = line[:self.max_line_chars] + "..."
+            block.add(line, self.head_lines)
+        self.version += 1
+
+    def clear(self) -> None:
+        """Forget all commands and output."""
+        self._blocks.clear()
+        self.version += 1
+
+    def build(self) -> str:
+        """Return the context text, rebuilding it only if something changed."""
+        version, text = self._built
+        if version == self.version:
+            return text
+
+        start = time.perf_counter()
+        budget = self.token_budget
+        parts = []
+        for i, block in enumerate(reversed(self._blocks)):
+            if budget <= 0:
+                break
+            block_text, tokens = block.render()
+            if tokens > budget:
+                if i == 0:
+                    block_text, tokens = block.render_tail(budget)
+                else:
+                    block_text = "\n".join(block.command_lines())
+                    tokens = estimate_tokens(block_text) + 1
+                    if not block_text or tokens > budget:
+                        continue
+            parts.append(block_text)
+            budget -= tokens
+
+        text = "\n".join(reversed(parts))
+        self._built = (self.version, text)
+        logger.debug(
+            "Context built: ~%d tokens, %d chars, %d blocks in %.2f ms",
+            self.token_budget - budget, len(text), len(parts), (time.perf_counter() - start) * 1000,
+        )
+        return text
@@ -0,0 +1,265 @@
+import asyncio
+import fcntl
+import os
+import re
+import shutil
+import signal
+import struct
+import sys
+import tempfile
+import termios
+from typing import Optional
+from urllib.parse import unquote, urlparse
+from .logging_config import setup_shell_logging
+from .shell import Shell
+
+logger = setup_shell_logging()
+
+# Runs in the child before the shell: makes the pty (already on fd 0) the
+# controlling terminal of the new session, so job control and ^C work. A
+# helper process is used so that we never fork this multi-threaded process.
+_ADOPT_TTY = (
+    "import fcntl, os, sys, termios; "
+    "fcntl.ioctl(0, termios.TIOCSCTTY, 0); "
+    "os.execvp(sys.argv[1], sys.argv[1:])"
+)
+
+# Loads the user's bashrc, then replaces the prompt with an OSC 7 report of
+# the working directory, which PtyShell strips from the output.
+_BASHRC = r"""[ -f ~/.bashrc ] && . ~/.bashrc
+PS1=''
+PS2=''
+PROMPT_COMMAND='printf "\033]7;file://%s%s\007" "$HOSTNAME" "$PWD"'
+"""
+
+_OSC7 = re.compile(r"\x1b\]7;([^\x07\x1b]*)(?:\x07|\x1b\\)")
+
+
+class _OutputBuffer(asyncio.Protocol):
+    """Holds pty output until the reader task takes it.
+
+    Above HIGH_WATER bytes the transport stops reading the pty, so the
+    kernel's buffer fills and the program writing blocks until we catch
+    up. Unlike a StreamReader, the buffer can be thrown away on Ctrl+C.
+    """
+
+    HIGH_WATER = 1024 * 1024
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._transport: Optional[asyncio.ReadTransport] = None
+        self._waiter: Optional[asyncio.Future] = None
+        self._paused = False
+        self._eof = False
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def data_received(self, data: bytes):
+        self._buffer += data
+        if len(self._buffer) > self.HIGH_WATER and not self._paused:
+            self._paused = True
+            self._transport.pause_reading()
+        self._wake()
+
+    def eof_received(self):
+        self._eof = True
+        self._wake()
+
+    def connection_lost(self, exc):
+        self._eof = True  # EIO once the shell has exited
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    def _resume(self):
+        if self._paused and len(self._buffer) <= self.HIGH_WATER // 4:
+            self._paused = False
+            self._transport.resume_reading()
+
+    async def read(self, size: int) -> bytes:
+        """Up to `size` buffered bytes, waiting if there are none; b"" at EOF."""
+        while not self._buffer and not self._eof:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        self._resume()
+        return data
+
+    def discard(self) -> int:
+        """Drop everything buffered; returns the number of bytes dropped."""
+        dropped = len(self._buffer)
+        self._buffer.clear()
+        self._resume()
+        return dropped
+
+
+class PtyShell(Shell):
+    """POSIX shell backend on a pseudo-terminal.
+
+    Programs see a terminal, so they line-buffer their output instead of
+    block-buffering it as they do on pipes. Both ends of the pty are asyncio
+    pipe transports, so reads and writes run on the event loop. Ctrl+C goes
+    through the pty's line discipline, which signals the foreground job
+    just like a real terminal.
+    """
+
+    NEWLINE_MODE = False  # The pty's line discipline already sends "\r\n"
+
+    def __init__(self, command: Optional[str] = None, columns: int = 80, rows: int = 24):
+        super().__init__(command)
+        self.columns = columns
+        self.rows = rows
+        self._master_fd: Optional[int] = None
+        self._write_transport: Optional[asyncio.WriteTransport] = None
+        self._read_transport: Optional[asyncio.ReadTransport] = None
+        self._output: Optional[_OutputBuffer] = None
+        self._rcfile: Optional[str] = None
+        self._osc_seen = False
+        self._pending_escape = ""  # Start of an OSC sequence split across reads
+
+    def _argv(self):
+        if self.command:
+            return ["/bin/sh", "-c", self.command]
+        bash = shutil.which("bash")
+        if not bash:
+            return [os.environ.get("SHELL", "/bin/sh"), "-i"]
+        with tempfile.NamedTemporaryFile("w", prefix="sprig-", suffix=".bashrc", delete=False) as rc:
+            rc.write(_BASHRC)
+        self._rcfile = rc.name
+        return [bash, "--noediting", "--rcfile", self._rcfile, "-i"]
+
+    async def start(self, callback):
+        """Start the shell on a new pseudo-terminal.
+
+        `callback` is awaited with each chunk of decoded output.
+        """
+        if self.process:
+            return
+
+        self.output_callback = callback
+        master_fd, slave_fd = os.openpty()
+        attrs = termios.tcgetattr(slave_fd)
+        attrs[3] &= ~termios.ECHO  # The terminal shows typed commands itself
+        termios.tcsetattr(slave_fd, termios.TCSANOW, attrs)
+        self._master_fd = master_fd
+        self.resize(self.columns, self.rows)
+
+        env = dict(os.environ, TERM="xterm-256color", COLORTERM="truecolor")
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, "-c", _ADOPT_TTY, *self._argv(),
+                stdin=slave_fd,
+                stdout=slave_fd,
+                stderr=slave_fd,
+                start_new_session=True,
+                env=env,
+            )
+        finally:
+            os.close(slave_fd)
+
+        loop = asyncio.get_running_loop()
+        self._read_transport, self._output = await loop.connect_read_pipe(
+            _OutputBuffer, os.fdopen(master_fd, "rb", 0)
+        )
+        self._write_transport, _ = await loop.connect_write_pipe(
+            asyncio.Protocol, os.fdopen(os.dup(master_fd), "wb", 0)
+        )
+        logger.info(f"PTY shell started (pid {self.process.pid})")
+        self._reader_task = asyncio.create_task(self.read_output())
+
+    def _output_stream(self) -> Optional[_OutputBuffer]:
+        return self._output
+
+    def _filter_output(self, text: str, final: bool = False) -> str:
+        """Remove OSC 7 working directory reports from `text`, noting the last one."""
+        text = self._pending_escape + text
+        self._pending_escape = ""
+        start = text.rfind("\x1b]")
+        if start >= 0 and not final and not _OSC7.match(text, start) and \
+                "\x07" not in text[start:] and "\x1b\\" not in text[start:]:
+            text, self._pending_escape = text[:start], text[start:]
+        if "\x1b]7;" not in text:
+            return text
+
+        cwd = None
+        for match in _OSC7.finditer(text):
+            cwd = unquote(urlparse(match.group(1)).path)
+        text = _OSC7.sub("", text)
+        if cwd and cwd != self.cwd:
+            self.cwd = cwd
+            if self.on_cwd_changed:
+                self.on_cwd_changed()
+        self._osc_seen = True
+        return text
+
+    def write(self, text: str):
+        """Write text to the shell's terminal."""
+        if self._write_transport and not self._write_transport.is_closing():
+            self._write_transport.write(text.encode(self.encoding, errors="replace"))
+
+    def send_interrupt(self):
+        """Interrupt the foreground job, as Ctrl+C in a terminal does.
+
+        Like the tty driver, which flushes its queues on ^C, output that
+        has not been shown yet is dropped so a flood stops at once.
+        """
+        if self.process:
+            self.write("\x03")
+            dropped = self._output.discard() if self._output else 0
+            logger.info(f"Sent interrupt, dropped {dropped} bytes of pending output")
+
+    def clear(self):
+        """Nothing to do: the emulator clears its own screen."""
+
+    def resize(self, columns: int, rows: int) -> None:
+        """Tell programs in the shell the size of the terminal."""
+        self.columns, self.rows = max(1, columns), max(1, rows)
+        if self._master_fd is not None:
+            try:
+                fcntl.ioctl(self._master_fd, termios.TIOCSWINSZ, struct.pack("HHHH", self.rows, self.columns, 0, 0))
+            except OSError:
+                pass
+
+    async def terminate(self):
+        """Hang up the terminal, as closing a terminal window does, and wait for the shell."""
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
+        for transport in (self._write_transport, self._read_transport):
+            if transport:
+                transport.close()
+        self._write_transport = self._read_transport = None
+        self._master_fd = None
+        if self.process:
+            process, self.process = self.process, None
+            if process.returncode is None:
+                try:
+                    os.killpg(process.pid, signal.SIGHUP)
+                    await asyncio.wait_for(process.wait(), timeout=1.0)
+                except ProcessLookupError:
+                    pass
+                except asyncio.TimeoutError:
+                    os.killpg(process.pid, signal.SIGKILL)
+        if self._rcfile:
+            os.unlink(self._rcfile)
+            self._rcfile = None
+
+    def get_working_directory(self) -> str:
+        """The shell's current directory.
+
+        Reported by the shell's prompt (OSC 7) when it can; otherwise read
+        from /proc where that exists.
+        """
+        if not self._osc_seen and self.process and os.path.exists("/proc/self/cwd"):
+            try:
+                self.cwd = os.readlink(f"/proc/{self.process.pid}/cwd")
+            except OSError:
+                pass
+        return self.cwd
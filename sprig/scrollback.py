@@ -0,0 +1,341 @@
+import mmap
+import tempfile
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Union
+from .logging_config import setup_logging
+
+logger = setup_logging()
+
+
+class StyledLine:
+    """A scrollback line with colours: its text and flat (style id, length) runs."""
+
+    __slots__ = ("text", "runs")
+
+    def __init__(self, text: str, runs: array):
+        self.text = text
+        self.runs = runs
+
+
+def _encode(line: Union[str, StyledLine]) -> bytes:
+    """A spool record: the UTF-8 text, then for styled lines NUL and the runs, then LF."""
+    if isinstance(line, str):
+        return line.encode("utf-8", "replace") + b"\n"
+    runs = ",".join(map(str, line.runs))
+    return f"{line.text}\x00{runs}\n".encode("utf-8", "replace")
+
+
+def _decode(record: bytes) -> Union[str, StyledLine]:
+    text = record.decode("utf-8", "replace")
+    if "\x00" not in text:
+        return text
+    text, runs = text.split("\x00", 1)
+    return StyledLine(text, array("I", map(int, runs.split(","))))
+
+
+def _matches(line: Union[str, StyledLine], needle: str, fold: bool) -> bool:
+    text = line if isinstance(line, str) else line.text
+    return needle in (text.lower() if fold else text)
+
+
+class _Segment:
+    """One spool file. Records are appended through a small buffer and read
+    back through a read-only mmap, which is remapped as the file grows."""
+
+    STRIDE = 64  # Lines per index entry
+    FLUSH_BYTES = 256 * 1024
+    SEARCH_CHUNK = 4 * 1024 * 1024
+
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(prefix="sprig-scrollback-", buffering=0)
+        self.size = 0  # Bytes appended, including buffered ones
+        self.lines = 0
+        self.index = array("Q")  # Byte offset of every STRIDE-th line
+        self._buffer: List[bytes] = []
+        self._buffered = 0
+        self._map: Optional[mmap.mmap] = None
+
+    def extend(self, records: List[bytes]) -> None:
+        offsets = list(accumulate(map(len, records), initial=self.size))
+        first = -self.lines % self.STRIDE  # First record that starts an index block
+        self.index.extend(offsets[first:len(records):self.STRIDE])
+        data = b"".join(records)
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.size += len(data)
+        self.lines += len(records)
+        if self._buffered >= self.FLUSH_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.file.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered = 0
+
+    def view(self) -> mmap.mmap:
+        """The file mapped up to the last record appended."""
+        self.flush()
+        if self._map is None or len(self._map) < self.size:
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.file.close()
+
+    def _line_start(self, view: mmap.mmap, line: int) -> int:
+        pos = self.index[line // self.STRIDE]
+        for _ in range(line % self.STRIDE):
+            pos = view.find(b"\n", pos) + 1
+        return pos
+
+    def line(self, line: int) -> Union[str, StyledLine]:
+        view = self.view()
+        start = self._line_start(view, line)
+        return _decode(view[start:view.find(b"\n", start)])
+
+    def rfind(self, needle: bytes, fold: bool, before: int) -> Optional[int]:
+        """The last line before line `before` whose text contains `needle`.
+
+        The file is scanned backwards a chunk at a time with `bytes.rfind`;
+        with `fold`, chunks are lowercased first (ASCII letters only).
+        Matches in the style runs of a record are skipped.
+        """
+        if before <= 0:
+            return None
+        view = self.view()
+        end = self.size if before >= self.lines else self._line_start(view, before)
+        while end > 0:
+            start = max(0, end - self.SEARCH_CHUNK)
+            if start:
+                start = view.rfind(b"\n", 0, start) + 1  # Whole lines only
+            chunk = view[start:end]
+            if fold:
+                chunk = chunk.lower()
+            pos = chunk.rfind(needle)
+            while pos >= 0:
+                line_start = chunk.rfind(b"\n", 0, pos) + 1
+                if chunk.find(b"\x00", line_start, pos) < 0:
+                    return self._line_at(view, start + pos)
+                pos = chunk.rfind(needle, 0, pos + len(needle) - 1)
+            end = start
+        return None
+
+    def _line_at(self, view: mmap.mmap, offset: int) -> int:
+        block = bisect_right(self.index, offset) - 1
+        return block * self.STRIDE + view[self.index[block]:offset].count(b"\n")
+
+
+class ScrollbackSpool:
+    """Scrollback lines too old to keep in memory, in temporary files on disk.
+
+    Lines are appended as one record each and read back through mmap, so
+    only the pages being looked at are brought into memory. Finding a line
+    uses a sparse index of one byte offset per `_Segment.STRIDE` lines,
+    so memory stays a few bytes per thousand lines however long the
+    session runs. The spool is a chain of files of SEGMENT_BYTES; once it
+    holds more than `max_bytes`, the oldest file is deleted along with its
+    lines. The files are unnamed temporary files, gone when Sprig exits.
+    """
+
+    SEGMENT_BYTES = 64 * 1024 * 1024
+    BATCH = 1024  # Lines collected before they are encoded and written
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max(max_bytes, self.SEGMENT_BYTES)
+        self._segments: List[_Segment] = []
+        self._starts: List[int] = []  # First line of each segment
+        self._lines = 0  # Written lines, not counting `_pending`
+        self._pending: List[Union[str, StyledLine]] = []
+
+    def __len__(self) -> int:
+        return self._lines + len(self._pending)
+
+    @property
+    def size(self) -> int:
+        """Bytes on disk."""
+        return sum(segment.size for segment in self._segments)
+
+    def __getitem__(self, index: int) -> Union[str, StyledLine]:
+        if not 0 <= index < len(self):
+            raise IndexError("spool index out of range")
+        if index >= self._lines:
+            return self._pending[index - self._lines]
+        k = bisect_right(self._starts, index) - 1
+        return self._segments[k].line(index - self._starts[k])
+
+    def append(self, line: Union[str, StyledLine]) -> None:
+        self._pending.append(line)
+        if len(self._pending) >= self.BATCH:
+            self.flush()
+
+    def extend(self, lines: Iterable[Union[str, StyledLine]]) -> None:
+        """Append lines, oldest first."""
+        self._pending.extend(lines)
+        if len(self._pending) >= self.BATCH:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the pending lines out."""
+        if not self._pending:
+            return
+        records = [line.encode("utf-8", "replace") + b"\n" if type(line) is str else _encode(line)
+                   for line in self._pending]
+        self._pending = []
+        for start in range(0, len(records), self.BATCH):
+            segment = self._segments[-1] if self._segments else None
+            if segment is None or segment.size >= self.SEGMENT_BYTES:
+                segment = self._new_segment()
+            batch = records[start:start + self.BATCH]
+            segment.extend(batch)
+            self._lines += len(batch)
+
+    def rfind(self, query: str, before: int, fold: bool = False) -> Optional[int]:
+        """The last line before `before` containing `query`; `fold` ignores case."""
+        self.flush()
+        needle = (query.lower() if fold else query).encode("utf-8")
+        for k in range(len(self._segments) - 1, -1, -1):
+            first = self._starts[k]
+            if first >= before:
+                continue
+            found = self._segments[k].rfind(needle, fold, before - first)
+            if found is not None:
+                return first + found
+        return None
+
+    def clear(self) -> None:
+        for segment in self._segments:
+            segment.close()
+        self._segments, self._starts, self._lines = [], [], 0
+        self._pending = []
+
+    def _new_segment(self) -> _Segment:
+        while self._segments and self.size + self.SEGMENT_BYTES > self.max_bytes:
+            dropped = self._segments.pop(0)
+            self._starts.pop(0)
+            dropped.close()
+            self._lines -= dropped.lines
+            self._starts = [start - dropped.lines for start in self._starts]
+            logger.info(f"Scrollback spool full, dropped the oldest {dropped.lines} lines")
+        segment = _Segment()
+        self._segments.append(segment)
+        self._starts.append(self._lines)
+        return segment
+
+
+class Scrollback:
+    """Fixed-capacity ring buffer of output lines, optionally backed by a spool.
+
+    Lines are strings, or `StyledLine`s for output with colours.
+    Appending is O(1); once the buffer is full the oldest line is moved to
+    the `spool` if there is one, or dropped. Indexing follows list
+    semantics across both (0 is the oldest retained line, -1 the newest)
+    and slices return plain lists.
+    """
+
+    def __init__(self, capacity: int = 100_000, spool: Optional[ScrollbackSpool] = None):
+        if capacity < 1:
+            raise ValueError("Scrollback capacity must be at least 1")
+        self.capacity = capacity
+        self.spool = spool
+        self._lines: List[str] = []
+        self._start = 0  # Index of the oldest line once the buffer has wrapped
+
+    def __len__(self) -> int:
+        return len(self._lines) + (len(self.spool) if self.spool is not None else 0)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __iter__(self) -> Iterator[str]:
+        if self.spool is not None:
+            for i in range(len(self.spool)):
+                yield self.spool[i]
+        lines, start = self._lines, self._start
+        yield from lines[start:]
+        yield from lines[:start]
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("scrollback index out of range")
+        spooled = size - len(self._lines)
+        if index < spooled:
+            return self.spool[index]
+        return self._lines[(self._start + index - spooled) % len(self._lines)]
+
+    def append(self, line: str) -> None:
+        """Add a line, evicting the oldest one when full."""
+        if len(self._lines) < self.capacity:
+            self._lines.append(line)
+        else:
+            if self.spool is not None:
+                self.spool.append(self._lines[self._start])
+            self._lines[self._start] = line
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, lines: Iterable[str]) -> None:
+        """Add several lines in order, a slice at a time."""
+        lines = list(lines)
+        capacity = self.capacity
+        overflow = len(self._lines) + len(lines) - capacity
+        if overflow > 0 and self.spool is not None:
+            self.spool.extend(self._oldest(overflow))
+            if overflow > len(self._lines):
+                self.spool.extend(lines[:overflow - len(self._lines)])
+        if len(lines) >= capacity:
+            self._lines = lines[-capacity:]
+            self._start = 0
+            return
+        free = capacity - len(self._lines)
+        if free > 0:
+            self._lines.extend(lines[:free])
+            lines = lines[free:]
+        while lines:
+            count = min(len(lines), capacity - self._start)
+            self._lines[self._start:self._start + count] = lines[:count]
+            self._start = (self._start + count) % capacity
+            lines = lines[count:]
+
+    def _oldest(self, count: int) -> List[str]:
+        """Up to `count` of the oldest lines held in memory."""
+        lines, start = self._lines, self._start
+        oldest = lines[start:start + count]
+        if len(oldest) < count:
+            oldest += lines[:min(count - len(oldest), start)]
+        return oldest
+
+    def rfind(self, query: str, before: Optional[int] = None) -> Optional[int]:
+        """Index of the last line before `before` (default: the end) containing `query`.
+
+        Case is ignored unless `query` has capitals.
+        """
+        fold = query.lower() == query
+        needle = query.lower() if fold else query
+        size = len(self)
+        before = size if before is None else min(before, size)
+        spooled = size - len(self._lines)
+        for index in range(before - 1, spooled - 1, -1):
+            if _matches(self[index], needle, fold):
+                return index
+        if self.spool is not None and spooled:
+            return self.spool.rfind(needle, min(before, spooled), fold)
+        return None
+
+    def clear(self) -> None:
+        """Remove all lines."""
+        self._lines = []
+        self._start = 0
+        if self.spool is not None:
+            self.spool.clear()
@@ -1,85 +1,105 @@
-import subprocess
-import threading
-import queue
-import logging
 import asyncio
-from typing import Callable, Optional
+import codecs
+import locale
+import logging
+from typing import Awaitable, Callable, Optional
 import os
-from .logging_config import setup_shell_logging
+from .logging_config import get_category_logger, setup_shell_logging
 
 logger = setup_shell_logging()
+io_logger = get_category_logger("shell.io")
 
 class Shell:
-    def __init__(self):
+    READ_SIZE = 64 * 1024
+    NEWLINE_MODE = True  # Pipes carry bare "\n" line ends
+
+    def __init__(self, command: Optional[str] = None):
         logger.info("Shell initialized")
-        self.process: Optional[subprocess.Popen] = None
-        self.output_queue = queue.Queue()
-        self.output_thread: Optional[threading.Thread] = None
-        self.output_callback: Optional[Callable] = None
-        self._event_loop = None
-
-    def start(self, callback: Callable):
-        """Start the shell process."""
+        self.command = command
+        self.cwd = os.getcwd()  # The shell starts in our directory
+        self.encoding = locale.getpreferredencoding(False)  # Of what we write and what the shell prints
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.output_callback: Optional[Callable[[str], Awaitable[None]]] = None
+        self.on_cwd_changed: Optional[Callable[[], None]] = None
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def start(self, callback: Callable[[str], Awaitable[None]]):
+        """Start the shell process.
+
+        `callback` is awaited with each chunk of decoded output.
+        """
         if self.process:
             return
 
         self.output_callback = callback
-        self._event_loop = asyncio.get_event_loop()
         # Start cmd.exe with "cmd" as the first argument to ensure echo is enabled
-        shell = os.environ.get('COMSPEC', 'cmd.exe')
-        self.process = subprocess.Popen(
-            [shell],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            bufsize=0,
-            universal_newlines=True,
-            shell=True,
+        shell = self.command or os.environ.get('COMSPEC', 'cmd.exe')
+        self.process = await asyncio.create_subprocess_shell(
+            shell,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
             env=os.environ
         )
         
         logger.info("Shell process started")
         
-        # Start thread to read output
-        self.output_thread = threading.Thread(target=self.read_output, daemon=True)
-        self.output_thread.start()
+        # Read output on the event loop; no reader thread needed
+        self._reader_task = asyncio.create_task(self.read_output())
 
-    def read_output(self):
-        """Read output from the shell process."""
-        if not self.process:
+    async def read_output(self):
+        """Read output from the shell process in large chunks.
+
+        Each chunk is decoded and handed to the output callback as it is,
+        escape sequences and all; the terminal's screen model interprets it.
+        """
+        stream = self._output_stream()
+        if stream is None:
             return
 
-        buffer = ""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
         try:
             while True:
-                char = self.process.stdout.read(1)
-                if not char:
+                try:
+                    data = await stream.read(self.READ_SIZE)
+                except OSError:
+                    break  # EIO from a pty whose shell has exited
+                if not data:
                     break
-                    
-                buffer += char
-                if char == '\n':
-                    if buffer.strip():  # Only log non-empty lines
-                        future = asyncio.run_coroutine_threadsafe(
-                            self.output_callback(buffer.strip()),
-                            self._event_loop
-                        )
-                        try:
-                            # Wait for the callback to complete with a timeout
-                            future.result(timeout=1.0)
-                        except Exception as e:
-                            logger.exception("Error in output callback")
-                    buffer = ""
-                    
+                await self._deliver(self._filter_output(decoder.decode(data)))
+                # A read returns at once while output is buffered; yield so
+                # keys and interrupts queued meanwhile go before the next chunk
+                await asyncio.sleep(0)
+
+            await self._deliver(self._filter_output(decoder.decode(b"", final=True), final=True))
         except Exception as e:
             logger.error(f"Error reading from shell: {str(e)}", exc_info=True)
 
+    def _output_stream(self) -> Optional[asyncio.StreamReader]:
+        return self.process.stdout if self.process else None
+
+    def _filter_output(self, text: str, final: bool = False) -> str:
+        """Hook for backends that need to remove control sequences from output.
+
+        Text held back for the next chunk is passed on when `final` is set.
+        """
+        return text
+
+    async def _deliver(self, text: str) -> None:
+        """Pass a chunk of output to the output callback."""
+        if not text:
+            return
+        try:
+            await self.output_callback(text)
+        except Exception:
+            logger.exception("Error in output callback")
+
     def write(self, text: str):
         """Write text to the shell process."""
         if self.process and self.process.stdin:
             try:
-                logger.debug(f"Writing to shell: {text!r}")
-                self.process.stdin.write(text)
-                self.process.stdin.flush()
+                io_logger.debug("Writing to shell: %r", text)
+                self.process.stdin.write(text.encode(self.encoding, errors="replace"))
             except Exception as e:
                 logger.error(f"Error writing to shell: {str(e)}")
 
@@ -93,13 +113,32 @@ class Shell:
         """Clear the shell screen."""
         self.write("cls\n")
 
-    def terminate(self):
-        """Terminate the shell process."""
+    def resize(self, columns: int, rows: int) -> None:
+        """Pipes have no size; the PTY backend passes it on."""
+
+    async def terminate(self):
+        """Terminate the shell process and wait for it to exit."""
+        if self._reader_task:
+            self._reader_task.cancel()
+            self._reader_task = None
         if self.process:
-            self.process.terminate()
-            self.process = None
-            self._event_loop = None
+            process, self.process = self.process, None
+            process.stdin.close()
+            if process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    process.kill()
     
-    def get_working_directory(self):
-        if self.process:
-            return self.process.cwd
+    def get_working_directory(self) -> str:
+        """Directory the shell was started in; `cd` inside the shell is not tracked."""
+        return self.cwd
+
+
+def create_shell(command: Optional[str] = None) -> Shell:
+    """The shell backend for this platform: a pseudo-terminal on POSIX, pipes elsewhere."""
+    if os.name == "posix":
+        from .pty_shell import PtyShell
+        return PtyShell(command)
+    return Shell(command)
@@ -0,0 +1,53 @@
+# Sprig completions for bash, from the daemon started by `python -m sprig serve`.
+#
+#   source /path/to/sprig/shell_init/sprig.bash
+#
+# Alt+/ (or the key sequence in $SPRIG_BIND_KEY) inserts the suggestion for
+# the text before the cursor. Bash cannot open Unix sockets itself, so this
+# needs socat, or an nc with -U and -N (OpenBSD netcat).
+
+if [[ -z $SPRIG_SOCKET ]]; then
+    if [[ -n $XDG_RUNTIME_DIR ]]; then
+        SPRIG_SOCKET=$XDG_RUNTIME_DIR/sprig.sock
+    else
+        SPRIG_SOCKET=${TMPDIR:-/tmp}
+        SPRIG_SOCKET=${SPRIG_SOCKET%/}/sprig-$UID.sock
+    fi
+fi
+: "${SPRIG_TIMEOUT:=3}"
+
+__sprig_escape() {
+    local s=${1//\\/\\\\}
+    s=${s//$'\t'/\\t}
+    __sprig_escaped=${s//$'\n'/\\n}
+}
+
+__sprig_send() {
+    if command -v socat >/dev/null; then
+        socat -t "$SPRIG_TIMEOUT" - "UNIX-CONNECT:$SPRIG_SOCKET" 2>/dev/null
+    else
+        nc -N -U -w "$SPRIG_TIMEOUT" "$SPRIG_SOCKET" 2>/dev/null
+    fi
+}
+
+__sprig_complete() {
+    local before=${READLINE_LINE:0:READLINE_POINT} request command reply id suggestion
+    __sprig_escape "$PWD"
+    request="complete"$'\t'"1"$'\t'"$__sprig_escaped"
+    __sprig_escape "$before"
+    request+=$'\t'"$__sprig_escaped"
+    while IFS= read -r command; do  # The last two commands, oldest first
+        command=${command#"${command%%[![:space:]]*}"}
+        __sprig_escape "$command"
+        request+=$'\t'"$__sprig_escaped"
+    done < <(fc -ln -2 -1 2>/dev/null)
+    reply=$(printf '%s\n' "$request" | __sprig_send) || return
+    IFS=$'\t' read -r id suggestion <<< "$reply"
+    printf -v suggestion '%b' "$suggestion"  # Undo the escaping
+    READLINE_LINE="$before$suggestion${READLINE_LINE:READLINE_POINT}"
+    READLINE_POINT=$((READLINE_POINT + ${#suggestion}))
+}
+
+if [[ $- == *i* ]]; then
+    bind -x "\"${SPRIG_BIND_KEY:-\\e/}\": __sprig_complete"
+fi
@@ -1,22 +1,28 @@
-from textual.widgets import Static
-from textual.containers import ScrollableContainer
-from textual.containers import Container
+from textual.scroll_view import ScrollView
 from textual.events import Key
-from prompt_toolkit.history import InMemoryHistory
+from textual.geometry import Size
+from textual.strip import Strip
+from rich.segment import Segment
+from rich.style import Style
 from rich.text import Text
-from textual.app import ComposeResult
-from .logging_config import setup_logging
+from .logging_config import get_category_logger, setup_logging
 from textual.reactive import reactive
 import logging
 import time
-from typing import List
-from .shell import Shell
+from typing import List, Optional
+from .shell import create_shell
 from .autocomplete_client import AutocompleteClient
+from .completion_service import CompletionService
+from .completion_store import CompletionStore
+from .history_store import HistoryStore
+from .scrollback import ScrollbackSpool
+from .vt_screen import VTScreen
 import asyncio
 
 logger = setup_logging()
+key_logger = get_category_logger("keys")
 
-class TerminalEmulator(ScrollableContainer, can_focus=True):
+class TerminalEmulator(ScrollView, can_focus=True):
     DEFAULT_CSS = """
     TerminalEmulator {
         background: #1e1e1e;
@@ -31,69 +37,202 @@ class TerminalEmulator(ScrollableContainer, can_focus=True):
     }
     """
 
-    current_input = reactive("")
-    output_lines: List[str] = reactive([])
-    suggestion: str = reactive("")
-    cursor_visible = reactive(True)  # Track cursor visibility state
+    FRAME_INTERVAL = 1 / 60  # Upper bound on the redraw rate
+    # Output faster than FLOOD_RATE characters a second, measured over
+    # FLOOD_WINDOW, is a flood: output-only frames drop to FLOOD_FRAME_INTERVAL
+    FLOOD_RATE = 1_000_000
+    FLOOD_WINDOW = 0.1
+    FLOOD_FRAME_INTERVAL = 1 / 20
+    SEARCH_RESULTS = 50  # History matches Ctrl+R can step through
+    FIND_STYLE = Style(color="black", bgcolor="yellow")
 
-    def __init__(self, model_name: str = "anthropic-sonnet"):
+    # Redraws go through the frame scheduler, not the reactive repaint
+    current_input = reactive("", repaint=False)
+    suggestion: str = reactive("", repaint=False)
+    cursor_visible = reactive(True, repaint=False)  # Track cursor visibility state
+
+    def __init__(self, model_name: str = "anthropic-sonnet", scrollback_lines: int = 10_000,
+                 hedge_model: Optional[str] = None, hedge_mode: str = "hedge",
+                 history_path: Optional[str] = None, spool_mb: int = 1024,
+                 completion_cache_path: Optional[str] = None, service: Optional[CompletionService] = None):
+        """A terminal session; `service` is the completion engine it shares with other sessions.
+
+        Without a service, the session makes its own from `model_name`,
+        `hedge_model`, `hedge_mode`, `history_path` and `completion_cache_path`.
+        """
         super().__init__()
-        self.history = InMemoryHistory()
+        # Output beyond `scrollback_lines` is spooled to disk, up to `spool_mb`
+        spool = ScrollbackSpool(spool_mb * 1024 * 1024) if spool_mb > 0 else None
+        self.vt = VTScreen(scrollback_lines=scrollback_lines, spool=spool)
+        self._input_strips: Optional[List[Strip]] = None
+        self._owns_service = service is None
+        if service is None:
+            service = CompletionService(model_name, hedge_model, hedge_mode, HistoryStore(history_path),
+                                        CompletionStore(completion_cache_path))
+        self.service = service
+        self.history = service.history
         self.cursor_position = 0
-        self.command_history = []
-        self._last_update_time = time.time()
-        self.shell = Shell()
-        self.autocomplete = AutocompleteClient(self, model_name)
-        self.content = Static("")
+        self.search_query: Optional[str] = None  # Set while reverse searching (Ctrl+R)
+        self._search_results: List[str] = []
+        self._search_pos = 0
+        self.find_query: Optional[str] = None  # Set while finding in the output (Ctrl+F)
+        self._find_line: Optional[int] = None
+        self._find_failed = False
+        self._last_frame_time = 0.0
+        self._frame_pending = False
+        self._frame_due = 0.0
+        self._frame_timer = None
+        self.flooding = False
+        self._rate_start = 0.0
+        self._rate_chars = 0
+        self._output_dirty = False
+        self._screen_dirty = False
+        self._input_dirty = False
+        self.shell = create_shell()
+        self.autocomplete = AutocompleteClient(self, service=service)
+        self.autocomplete.set_suggestion_callback(self._on_suggestion)
         self._cursor_timer = None
-        self._autocomplete_timer = None
+        self._warm_up_task = None
+        self._history_task = None
+        self.hidden = False  # In a background tab: output is captured but not drawn
+        self._shell_task: Optional[asyncio.Task] = None
         logger.info("Terminal emulator initialized")
 
-    def compose(self) -> ComposeResult:
-        """Compose the terminal widget."""
-        yield self.content
+    def start_shell(self) -> None:
+        """Spawn the shell without waiting for it.
+
+        SprigApp calls this as soon as its event loop runs, so the shell
+        starts up while the UI is being built. Output that arrives before
+        the widget is mounted is drawn with the first frame.
+        """
+        if self._shell_task is not None:
+            return
+        self.shell.on_cwd_changed = self._on_cwd_changed
+        self.vt.newline_mode = self.shell.NEWLINE_MODE
+        self.vt.respond = self.shell.write
+        self._shell_task = asyncio.create_task(self.shell.start(self.handle_shell_output))
 
-    def on_mount(self) -> None:
+    async def on_mount(self) -> None:
         """Handle widget mount."""
-        self.shell.start(self.handle_shell_output)
+        self.start_shell()
+        self.shell.resize(self.size.width, self.size.height)
+        self.vt.resize(self.size.width, self.size.height)
         self.focus()
-        self.update_display()
+        self._request_display_update(output=True)
         self._cursor_timer = self.set_interval(0.5, self._blink_cursor)
-        self._autocomplete_timer = self.set_interval(0.2, self._check_for_autocomplete)
+        # Started after the first frame, which they would otherwise hold up
+        self.call_after_refresh(self._start_background_work)
+
+    def _on_cwd_changed(self) -> None:
+        self.autocomplete.paths.set_root(self.shell.cwd)  # Index the new directory before it is typed in
+        self._request_display_update()
+
+    def _start_background_work(self) -> None:
+        self._history_task = asyncio.create_task(self.history.load())
+        self._warm_up_task = asyncio.create_task(self.autocomplete.warm_up())
+
+    def _write_to_shell(self, text: str) -> None:
+        """Write to the shell, once it has started if it is still starting."""
+        if self._shell_task is None or self._shell_task.done():
+            self.shell.write(text)
+        else:
+            self._shell_task.add_done_callback(lambda _: self.shell.write(text))
 
     def clear(self) -> None:
         """Clear the terminal output."""
-        self.output_lines = []
+        self.vt.clear()
+        self._request_display_update(output=True)
         self.shell.clear()
 
     def watch_current_input(self) -> None:
         """Watch for changes in current_input."""
-        self.suggestion = ""  # Clear suggestion when input changes
-        self._request_display_update()
-
-    def watch_output_lines(self) -> None:
-        """Watch for changes in output lines."""
+        # Shows instant suggestions and schedules the debounced AI request
+        self.autocomplete.on_input_changed()
         self._request_display_update()
 
     def watch_suggestion(self) -> None:
         """Watch for changes in suggestion."""
         self._request_display_update()
 
-    def _request_display_update(self) -> None:
-        """Request a throttled display update."""
-        current_time = time.time()
-        if current_time - self._last_update_time > 0.016:  # ~60fps
+    def _request_display_update(self, output: bool = False, screen: bool = False) -> None:
+        """Mark the display dirty and schedule a frame.
+
+        All changes made before the frame runs are merged into a single
+        render, and at most one frame is drawn per FRAME_INTERVAL. The frame
+        reads the state when it runs, so the latest change is never lost.
+        `output` marks the whole view dirty and `screen` only the rows the
+        screen model reports as changed; otherwise only the input line is
+        redrawn.
+
+        During a flood, frames for shell output alone wait for
+        FLOOD_FRAME_INTERVAL, but any other change brings the frame
+        forward, so typing stays at the full frame rate.
+        """
+        if output:
+            self._output_dirty = True
+        elif screen:
+            self._screen_dirty = True
+        else:
+            self._input_dirty = True
+        if not self.is_mounted or self.hidden:
+            return  # Mounting, or showing the tab again, draws everything
+        flood_frame = self.flooding and screen and not output
+        due = self._last_frame_time + (self.FLOOD_FRAME_INTERVAL if flood_frame else self.FRAME_INTERVAL)
+        if self._frame_pending:
+            if self._frame_timer is None or due >= self._frame_due:
+                return
+            self._frame_timer.stop()  # Bring the frame forward
+        self._frame_pending = True
+        self._frame_due = due
+        delay = due - time.monotonic()
+        if delay > 0:
+            self._frame_timer = self.set_timer(delay, self._render_frame)
+        else:
+            self._frame_timer = None
+            self.call_later(self._render_frame)
+
+    def _render_frame(self) -> None:
+        """Draw everything that changed since the last frame."""
+        self._frame_pending = False
+        self._frame_timer = None
+        self._last_frame_time = time.monotonic()
+        output_dirty, self._output_dirty = self._output_dirty, False
+        screen_dirty, self._screen_dirty = self._screen_dirty, False
+        input_dirty, self._input_dirty = self._input_dirty, False
+        if output_dirty or screen_dirty:
+            layout_changed, rows = self.vt.take_changes()
+            output_dirty = output_dirty or layout_changed
+        if output_dirty:
             self.update_display()
-            self._last_update_time = current_time
+            return
+        if screen_dirty:
+            for y in rows:
+                self.refresh_lines(y)
+        if input_dirty:
+            self._update_input_line()
 
     def on_key(self, event: Key) -> None:
         """Handle key events."""
         event.prevent_default()
         event.stop()
 
-        logger.debug(f"Keypress: {event.key}")
-        
-        if event.key == "ctrl+c":
+        key_logger.debug("Keypress: %s", event.key)
+
+        if self.find_query is not None:
+            self._on_find_key(event)
+            return
+
+        # Any key brings the prompt back into view
+        if self.scroll_offset.y < self.max_scroll_y:
+            self._request_display_update(output=True)
+
+        if self.search_query is not None:
+            self._on_search_key(event)
+        elif event.key == "ctrl+r":
+            self._start_search()
+        elif event.key == "ctrl+f":
+            self._start_find()
+        elif event.key == "ctrl+c":
             self.shell.send_interrupt()
             self.current_input = ""
             self.cursor_position = 0
@@ -103,13 +242,14 @@ class TerminalEmulator(ScrollableContainer, can_focus=True):
             if self.cursor_position > 0:
                 self.cursor_position -= 1
                 self.suggestion = ""
+                self._request_display_update()
         elif event.key == "right":
             if self.cursor_position < len(self.current_input):
                 self.cursor_position += 1
                 self.suggestion = ""
+                self._request_display_update()
         elif event.key == "tab":
-            logger.debug("Tab pressed")
-            logger.debug(self.suggestion)
+            key_logger.debug("Tab pressed, suggestion: %r", self.suggestion)
             if self.suggestion:  # Accept suggestion if present
                 self.current_input += self.suggestion
                 self.cursor_position = len(self.current_input)  # Move cursor to end
@@ -117,22 +257,11 @@ class TerminalEmulator(ScrollableContainer, can_focus=True):
             else:  # Get new suggestion
                 logger.debug("Tab pressed, requesting completion")
                 self._check_for_autocomplete()
+        elif event.key in ("down", "ctrl+n", "up"):
+            # Step through the other candidates of the last completion
+            self.autocomplete.cycle(-1 if event.key == "up" else 1)
         elif event.key == "enter":
-            if self.current_input:
-                # Cancel any pending autocomplete
-                self.autocomplete.cancel_pending()
-                
-                self.command_history.append(self.current_input)
-                self.history.append_string(self.current_input)
-                # Add command to output immediately for better responsiveness
-                self.output_lines.append(f"> {self.current_input}")
-                self.shell.write(f"{self.current_input}\n")
-                self.current_input = ""
-                self.cursor_position = 0
-                self.suggestion = ""
-                # Force refresh immediately after sending command
-                self.update_display()
-                self.refresh(layout=True)
+            self._submit()
         elif event.key == "backspace":
             if self.cursor_position > 0:
                 self.current_input = (
@@ -140,33 +269,153 @@ class TerminalEmulator(ScrollableContainer, can_focus=True):
                     self.current_input[self.cursor_position:]
                 )
                 self.cursor_position -= 1
-        elif event.key == "space":  # Handle space key explicitly
+        elif event.is_printable and event.character:
+            # Punctuation arrives with key names such as "minus"; insert the character
             self.current_input = (
                 self.current_input[:self.cursor_position] +
-                " " +
-                self.current_input[self.cursor_position:]
-            )
-            self.cursor_position += 1
-        elif len(event.key) == 1:  # Single character
-            self.current_input = (
-                self.current_input[:self.cursor_position] +
-                event.key +
+                event.character +
                 self.current_input[self.cursor_position:]
             )
             self.cursor_position += 1
 
+    def _submit(self) -> None:
+        """Run the input line as a command."""
+        if not self.current_input:
+            return
+        # Cancel any pending autocomplete
+        self.autocomplete.cancel_pending()
+
+        self.autocomplete.record_command(self.current_input)
+        # Add command to output immediately for better responsiveness
+        self.vt.write_line(f"> {self.current_input}")
+        self._write_to_shell(f"{self.current_input}\n")
+        self.current_input = ""
+        self.cursor_position = 0
+        self.suggestion = ""
+        self._request_display_update(output=True)
+
+    def _start_search(self) -> None:
+        """Enter reverse search over the command history (Ctrl+R)."""
+        self.autocomplete.cancel_pending()
+        self.suggestion = ""
+        self.search_query = ""
+        self._update_search()
+
+    def _update_search(self) -> None:
+        self._search_results = self.history.search(self.search_query, self.SEARCH_RESULTS)
+        self._search_pos = 0
+        self._request_display_update()
+
+    def _end_search(self, accept: bool) -> None:
+        """Leave reverse search, putting the selected match on the input line if `accept`."""
+        match = self._search_match()
+        self.search_query = None
+        self._search_results = []
+        if accept and match:
+            self.current_input = match
+            self.cursor_position = len(match)
+        self._request_display_update()
+
+    def _search_match(self) -> str:
+        if self._search_pos < len(self._search_results):
+            return self._search_results[self._search_pos]
+        return ""
+
+    def _on_search_key(self, event: Key) -> None:
+        """Handle a key while reverse searching.
+
+        Typing narrows the search and Ctrl+R steps to the next match. Enter
+        runs the match, Escape, Tab and the arrow keys put it on the input
+        line for editing, and Ctrl+G or Ctrl+C leave the input as it was.
+        """
+        key = event.key
+        if key == "ctrl+r":
+            if self._search_pos + 1 < len(self._search_results):
+                self._search_pos += 1
+                self._request_display_update()
+        elif key in ("ctrl+g", "ctrl+c"):
+            self._end_search(accept=False)
+        elif key == "enter":
+            self._end_search(accept=True)
+            self._submit()
+        elif key in ("escape", "tab", "left", "right", "up", "down", "home", "end"):
+            self._end_search(accept=True)
+        elif key == "backspace":
+            if self.search_query:
+                self.search_query = self.search_query[:-1]
+                self._update_search()
+        elif event.is_printable and event.character:
+            self.search_query += event.character
+            self._update_search()
+
+    def _start_find(self) -> None:
+        """Enter find mode, searching the output from the newest line up (Ctrl+F)."""
+        self.autocomplete.cancel_pending()
+        self.suggestion = ""
+        self.find_query = ""
+        self._find_line = None
+        self._find_failed = False
+        self._request_display_update()
+
+    def _end_find(self) -> None:
+        self.find_query = None
+        self._find_line = None
+        self._request_display_update(output=True)
+
+    def _find(self, before: Optional[int]) -> None:
+        """Show the last line above `before` (default: the end) containing the query."""
+        line = self.vt.rfind(self.find_query, before) if self.find_query else None
+        self._find_failed = bool(self.find_query) and line is None
+        if line is not None or not self.find_query:
+            self._find_line = line
+        if line is not None:
+            text = self.vt.line_text(line)
+            query = self.find_query
+            column = (text.lower() if query.lower() == query else text).find(query)
+            x = 0 if column + len(query) <= self.size.width else max(0, column - 8)
+            self.scroll_to(x, max(0, line - self.size.height // 2), animate=False, force=True)
+        self.refresh()
+        self._request_display_update()
+
+    def _on_find_key(self, event: Key) -> None:
+        """Handle a key in find mode.
+
+        Typing extends the query, which is looked for again from the line
+        shown; Ctrl+F, Enter or Up go to the previous match. Escape, Ctrl+G
+        or Ctrl+C leave find mode and return to the prompt.
+        """
+        key = event.key
+        if key in ("ctrl+f", "enter", "up"):
+            if self.find_query:
+                self._find(self._find_line)
+        elif key in ("escape", "ctrl+g", "ctrl+c"):
+            self._end_find()
+        elif key == "backspace":
+            if self.find_query:
+                self.find_query = self.find_query[:-1]
+                self._find(None)
+        elif event.is_printable and event.character:
+            self.find_query += event.character
+            self._find(None if self._find_line is None else self._find_line + 1)
+
     def _check_for_autocomplete(self) -> None:
         """Check if input has changed and request autocomplete if needed."""
 
-        logger.debug(self.current_input, self.output_lines)
+        logger.debug("Autocomplete check for input: %r", self.current_input)
 
         self.autocomplete.check_for_autocomplete()
         self.suggestion = self.autocomplete.suggestion
 
+    def _on_suggestion(self, suggestion: str) -> None:
+        """Show suggestions as they stream in."""
+        if suggestion == self.suggestion and not self._input_dirty:
+            self.autocomplete.mark_painted()  # Already on screen, nothing to redraw
+        self.suggestion = suggestion
+
     def _blink_cursor(self) -> None:
         """Toggle the cursor visibility state."""
         self.cursor_visible = not self.cursor_visible
-        self.update_display()
+        self._request_display_update()
 
     def _get_current_line_with_cursor(self) -> Text:
         """Get the current input line with cursor."""
@@ -194,44 +443,167 @@ class TerminalEmulator(ScrollableContainer, can_focus=True):
         line.append(after_cursor, style="white")
         return line
 
+    def _get_search_line(self) -> Text:
+        """The reverse search prompt, with the query highlighted in the match."""
+        match = self._search_match()
+        line = Text()
+        label = "reverse-i-search" if match or not self.search_query else "failed reverse-i-search"
+        line.append(f"({label})`", style="bold green")
+        line.append(self.search_query, style="white")
+        line.append("█" if self.cursor_visible else " ", style="white")
+        line.append("': ", style="bold green")
+        line.append(match, style="white")
+        if self.search_query:
+            found = match.lower().find(self.search_query.lower())
+            if found >= 0:
+                start = len(line) - len(match) + found
+                line.stylize("black on yellow", start, start + len(self.search_query))
+        return line
+
+    def _get_find_line(self) -> Text:
+        """The find prompt, with the position of the line shown."""
+        line = Text()
+        line.append("(failed find)`" if self._find_failed else "(find)`", style="bold green")
+        line.append(self.find_query, style="white")
+        line.append("█" if self.cursor_visible else " ", style="white")
+        line.append("'", style="bold green")
+        if self._find_line is not None:
+            line.append(f"  line {self._find_line + 1} of {len(self.vt)}", style="grey")
+        return line
+
+    def _highlight_match(self, strip: Strip, index: int) -> Strip:
+        """`strip` with the find query highlighted where it occurs in line `index`."""
+        query = self.find_query
+        text = self.vt.line_text(index)
+        start = (text.lower() if query.lower() == query else text).find(query)
+        if start < 0:
+            return strip
+        end = start + len(query)
+        before, match, *after = strip.divide([start, end, max(end, strip.cell_length)])
+        match = Strip(Segment.apply_style(match, post_style=self.FIND_STYLE))
+        return Strip.join([before, match, *after])
+
+    def _get_input_strips(self) -> List[Strip]:
+        """Render the prompt, input and suggestion, wrapped to the widget width."""
+        if self._input_strips is None:
+            content = Text()
+            if self.find_query is not None:
+                content.append(self._get_find_line())
+            elif self.search_query is not None:
+                content.append(self._get_search_line())
+            else:
+                content.append(self.shell.get_working_directory() + "> ", style="bold green")
+                content.append(self._get_current_line_with_cursor())
+                if self.suggestion:
+                    content.append(self.suggestion, style="grey")
+                    position = self.autocomplete.candidate_position
+                    if position:
+                        content.append(f"  ({position[0]}/{position[1]})", style="dim")
+
+            console = self.app.console
+            options = console.options.update_width(max(self.size.width, 1))
+            lines = console.render_lines(content, options, style=self.rich_style, pad=False)
+            self._input_strips = [Strip(line) for line in lines]
+        return self._input_strips
+
+    def render_line(self, y: int) -> Strip:
+        """Render one row of the viewport.
+
+        Only rows that are on screen are ever built, so the cost of a frame
+        depends on the widget height rather than the scrollback length.
+        """
+        scroll_x, scroll_y = self.scroll_offset
+        index = scroll_y + y
+        width = self.size.width
+        output_rows = len(self.vt)
+        if index < output_rows:
+            strip = Strip(self.vt.segments(index, self.rich_style))
+            if index == self._find_line and self.find_query:
+                strip = self._highlight_match(strip, index)
+        else:
+            input_strips = self._get_input_strips()
+            self.autocomplete.mark_painted()
+            row = index - output_rows
+            if row >= len(input_strips):
+                return Strip.blank(width, self.rich_style)
+            strip = input_strips[row]
+        return strip.crop_extend(scroll_x, scroll_x + width, self.rich_style)
+
     def update_display(self):
         """Update the terminal display."""
-        # Create the display text
-        content = Text()
-        
-        # Add output lines (show all lines)
-        for line in self.output_lines:
-            content.append(line + "\n", style="white")
-        
-        # Add current input with prompt
-        content.append(self.shell.get_working_directory() + "> ", style="bold green")
-        content.append(self._get_current_line_with_cursor())
-        
-        # Add suggestion if present
-        if self.suggestion:
-            content.append(self.suggestion, style="grey")
-        
-        # Update the content widget
-        self.content.update(content)
-        # Scroll to bottom
-        self.scroll_end(animate=False)
+        self._input_strips = None
+        height = len(self.vt) + len(self._get_input_strips())
+        self.virtual_size = Size(self.vt.width, height)
+        self.refresh()
+        if self.find_query is not None:
+            return  # Stay on the line found
+        # Scroll to bottom. Forced, because scrolling is refused while the
+        # scrollbar for the new virtual size has not been laid out yet.
+        self.scroll_to(0, self.max_scroll_y, animate=False, force=True)
 
-    def on_unmount(self) -> None:
+    def _update_input_line(self) -> None:
+        """Redraw only the input rows, unless their height changed."""
+        row_count = len(self._get_input_strips())
+        self._input_strips = None
+        if len(self._get_input_strips()) != row_count:
+            self.update_display()
+            return
+        self.refresh_lines(len(self.vt), row_count)
+
+    def on_hide(self) -> None:
+        """Stop drawing while in a background tab; the screen model keeps taking output."""
+        self.hidden = True
+        if self._cursor_timer:
+            self._cursor_timer.pause()
+
+    def on_show(self) -> None:
+        """Draw everything that changed while the tab was in the background."""
+        if not self.hidden:
+            return
+        self.hidden = False
+        if self._cursor_timer:
+            self._cursor_timer.resume()
+        self._request_display_update(output=True)
+
+    def on_resize(self) -> None:
+        """Resize the screen and re-wrap the input line for the new size."""
+        self.shell.resize(self.size.width, self.size.height)
+        self.vt.resize(self.size.width, self.size.height)
+        self._request_display_update(output=True)
+
+    async def on_unmount(self) -> None:
         """Clean up when widget is unmounted."""
         if self._cursor_timer:
             self._cursor_timer.stop()
-        if self._autocomplete_timer:
-            self._autocomplete_timer.stop()
+        for task in (self._warm_up_task, self._history_task):
+            if task and not task.done():
+                task.cancel()
+        if self._shell_task:
+            await asyncio.gather(self._shell_task, return_exceptions=True)
         if self.shell:
-            self.shell.terminate()
-
-    async def handle_shell_output(self, line: str):
-        """Handle output from the shell."""
-        self.output_lines.append(line)
-        # Limit output lines
-        if len(self.output_lines) > 1000:
-            self.output_lines = self.output_lines[-1000:]
-        # Force refresh immediately
-        self.update_display()
-        # Request a layout refresh in case content size changed
-        self.refresh(layout=True)
+            await self.shell.terminate()
+        await self.autocomplete.aclose()
+        if self._owns_service:
+            await self.service.aclose()
+
+    def _measure_output_rate(self, chars: int) -> None:
+        """Enter or leave flood mode from the output rate over the last window."""
+        now = time.monotonic()
+        self._rate_chars += chars
+        elapsed = now - self._rate_start
+        if elapsed < self.FLOOD_WINDOW:
+            return
+        flooding = self._rate_chars / elapsed > self.FLOOD_RATE
+        if flooding != self.flooding:
+            self.flooding = flooding
+            logger.info(f"{'Entering' if flooding else 'Leaving'} flood mode "
+                        f"({self._rate_chars / elapsed / 1e6:.1f}M chars/s)")
+        self._rate_start, self._rate_chars = now, 0
+
+    async def handle_shell_output(self, text: str):
+        """Feed a chunk of shell output to the screen."""
+        self._measure_output_rate(len(text))
+        lines = self.vt.feed(text)
+        if lines:
+            self.autocomplete.record_output(lines)
+        self._request_display_update(screen=True)
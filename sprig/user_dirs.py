@@ -0,0 +1,10 @@
+import os
+
+
+def user_cache_dir() -> str:
+    """Sprig's cache directory: `sprig` in `%LOCALAPPDATA%` on Windows, else in `$XDG_CACHE_HOME` or ~/.cache."""
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "sprig")
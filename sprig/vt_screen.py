@@ -0,0 +1,665 @@
+import re
+import sys
+from array import array
+from itertools import groupby
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+from rich.color import Color
+from rich.segment import Segment
+from rich.style import Style
+
+from .scrollback import Scrollback, ScrollbackSpool, StyledLine
+
+_CHARS = "w" if sys.version_info >= (3, 13) else "u"  # "u" is deprecated from 3.13
+
+# SGR attribute flags
+BOLD, DIM, ITALIC, UNDERLINE, BLINK, REVERSE, CONCEAL, STRIKE = (1 << bit for bit in range(8))
+_SGR_FLAGS = {1: BOLD, 2: DIM, 3: ITALIC, 4: UNDERLINE, 5: BLINK, 6: BLINK, 7: REVERSE, 8: CONCEAL, 9: STRIKE}
+_SGR_RESETS = {21: BOLD | DIM, 22: BOLD | DIM, 23: ITALIC, 24: UNDERLINE, 25: BLINK,
+               27: REVERSE, 28: CONCEAL, 29: STRIKE}
+
+_SPECIAL = re.compile(r"[\x00-\x1f\x7f]")
+_ESCAPE = re.compile(r"""
+    \x1b\[ (?P<params>[\x30-\x3f]*) [\x20-\x2f]* (?P<final>[\x40-\x7e])   # CSI
+  | \x1b\] [^\x07\x1b]* (?:\x07|\x1b\\)                                 # OSC
+  | \x1b[PX^_] .*? \x1b\\                                               # DCS, SOS, PM, APC
+  | \x1b (?![\[\]PX^_]) (?P<inter>[\x20-\x2f]*) (?P<esc>[\x30-\x7e])      # Other escapes
+""", re.VERBOSE | re.DOTALL)
+# A sequence cut off by the end of a read; kept until the rest arrives
+_ESCAPE_PREFIX = re.compile(r"\x1b(?:\[[\x30-\x3f]*[\x20-\x2f]*|\][^\x07\x1b]*\x1b?|[PX^_].*|[\x20-\x2f]*)\Z",
+                            re.DOTALL)
+MAX_PENDING = 64 * 1024
+# Runs of whole plain lines, which take the bulk path in `feed`
+_PLAIN_LINES = re.compile(r"(?:[^\x00-\x1f\x7f]*\r\n)+")
+_PLAIN_LINES_LF = re.compile(r"(?:[^\x00-\x1f\x7f]*\r?\n)+")
+
+
+def _make_style(fg, bg, flags: int) -> Style:
+    def color(value) -> Optional[Color]:
+        if value is None:
+            return None
+        return Color.from_rgb(*value) if isinstance(value, tuple) else Color.from_ansi(value)
+
+    return Style(
+        color=color(fg), bgcolor=color(bg),
+        bold=bool(flags & BOLD) or None, dim=bool(flags & DIM) or None,
+        italic=bool(flags & ITALIC) or None, underline=bool(flags & UNDERLINE) or None,
+        blink=bool(flags & BLINK) or None, reverse=bool(flags & REVERSE) or None,
+        conceal=bool(flags & CONCEAL) or None, strike=bool(flags & STRIKE) or None,
+    )
+
+
+class StyleTable:
+    """Interns SGR attribute sets; rows store the small integer ids.
+
+    Id 0 is the default style. Should a program use more than 65535
+    distinct styles, the rest fall back to the default.
+    """
+
+    MAX_STYLES = 65535
+
+    def __init__(self):
+        self._ids: Dict[tuple, int] = {(None, None, 0): 0}
+        self.styles: List[Style] = [Style()]
+
+    def intern(self, fg, bg, flags: int) -> int:
+        key = (fg, bg, flags)
+        style_id = self._ids.get(key)
+        if style_id is None:
+            if len(self.styles) >= self.MAX_STYLES:
+                return 0
+            style_id = self._ids[key] = len(self.styles)
+            self.styles.append(_make_style(fg, bg, flags))
+        return style_id
+
+
+class Row:
+    """One live screen row: characters and style ids in parallel arrays."""
+
+    __slots__ = ("chars", "styles")
+
+    def __init__(self):
+        self.chars = array(_CHARS)
+        self.styles = array("H")
+
+    def __len__(self) -> int:
+        return len(self.chars)
+
+    @property
+    def text(self) -> str:
+        return self.chars.tounicode()
+
+    @property
+    def runs(self) -> array:
+        runs = array("I")
+        for style, group in groupby(self.styles):
+            runs.append(style)
+            runs.append(sum(1 for _ in group))
+        return runs
+
+    def _pad(self, length: int) -> None:
+        missing = length - len(self.chars)
+        if missing > 0:
+            self.chars.fromunicode(" " * missing)
+            self.styles.extend(array("H", (0,)) * missing)
+
+    def write(self, x: int, text: str, style: int) -> None:
+        self._pad(x)
+        end = x + len(text)
+        self.chars[x:end] = array(_CHARS, text)
+        self.styles[x:end] = array("H", (style,)) * len(text)
+
+    def erase(self, start: int, end: Optional[int] = None) -> None:
+        """Blank cells start..end; erasing to the end of the row drops them."""
+        if end is None or end >= len(self.chars):
+            del self.chars[start:]
+            del self.styles[start:]
+        elif start < end:
+            self.write(start, " " * (end - start), 0)
+
+    def insert(self, x: int, count: int) -> None:
+        if x < len(self.chars):
+            self.chars[x:x] = array(_CHARS, " " * count)
+            self.styles[x:x] = array("H", (0,)) * count
+
+    def delete(self, x: int, count: int) -> None:
+        del self.chars[x:x + count]
+        del self.styles[x:x + count]
+
+    def freeze(self) -> Union[str, StyledLine]:
+        """The compact scrollback form: a plain string unless the row has colours."""
+        text = self.chars.tounicode()
+        if self.styles.count(0) == len(self.styles):
+            return text
+        return StyledLine(text, self.runs)
+
+
+Line = Union[str, StyledLine, Row]
+
+
+class VTScreen:
+    """A VT100/xterm screen with scrollback.
+
+    Output is parsed as it arrives. The live screen is a list of `Row`s at
+    most `rows` high; carriage returns and cursor movement rewrite those
+    rows in place, so a progress bar costs one row however often it is
+    redrawn. Rows that scroll off the top are frozen into the scrollback.
+    The alternate screen used by full-screen programs is kept separately
+    and never reaches the scrollback.
+
+    Lines are not wrapped at `columns`; long lines scroll horizontally, as
+    plain output always has. The terminal asks `take_changes` after each
+    feed which rows need repainting.
+    """
+
+    def __init__(self, columns: int = 80, rows: int = 24, scrollback_lines: int = 100_000,
+                 spool: Optional[ScrollbackSpool] = None):
+        self.columns = max(1, columns)
+        self.rows = max(1, rows)
+        self.scrollback = Scrollback(scrollback_lines, spool)
+        self.styles = StyleTable()
+        self.newline_mode = False  # Treat LF as CR LF, for output from pipes
+        self.respond: Optional[Callable[[str], None]] = None  # Sends replies to status queries
+        self.width = 0  # Widest line seen, for horizontal scrolling
+        self._main: List[Row] = []
+        self._alternate: Optional[List[Row]] = None
+        self.lines = self._main
+        self._pending = ""
+        self._completed: List[str] = []
+        self._dirty: Set[int] = set()
+        self._structural = True
+        self._shown_rows = 0
+        self._reset_modes()
+
+    def _reset_modes(self) -> None:
+        self.x = self.y = 0
+        self.top, self.bottom = 0, self.rows - 1  # Scrolling region
+        self.insert_mode = False
+        self._fg = self._bg = None
+        self._flags = 0
+        self.style = 0
+        self._saved = (0, 0, 0, None, None, 0)
+
+    # Display
+
+    @property
+    def alternate(self) -> bool:
+        return self._alternate is not None
+
+    def _used_rows(self) -> int:
+        """Live rows up to the last with content, or the cursor's if output is mid-line."""
+        if self._alternate is not None:
+            return self.rows
+        lines = self.lines
+        used = len(lines)
+        while used and not len(lines[used - 1]):
+            used -= 1
+        if self.x > 0 and self.y >= used:
+            used = self.y + 1
+        return used
+
+    def __len__(self) -> int:
+        base = 0 if self._alternate is not None else len(self.scrollback)
+        return base + self._used_rows()
+
+    def line(self, index: int) -> Line:
+        """The line shown at `index`, counting from the oldest scrollback line."""
+        if self._alternate is None:
+            if index < len(self.scrollback):
+                return self.scrollback[index]
+            index -= len(self.scrollback)
+        return self.lines[index] if index < len(self.lines) else ""
+
+    def line_text(self, index: int) -> str:
+        line = self.line(index)
+        return line if isinstance(line, str) else line.text
+
+    def segments(self, index: int, base: Style) -> List[Segment]:
+        """Rich segments for the line at `index`, drawn over `base`."""
+        line = self.line(index)
+        if isinstance(line, str):
+            return [Segment(line, base)]
+        text, styles = line.text, self.styles.styles
+        segments = []
+        pos = 0
+        runs = line.runs
+        for i in range(0, len(runs), 2):
+            style_id, end = runs[i], pos + runs[i + 1]
+            segments.append(Segment(text[pos:end], base + styles[style_id] if style_id else base))
+            pos = end
+        return segments
+
+    def rfind(self, query: str, before: Optional[int] = None) -> Optional[int]:
+        """Index of the last line before `before` containing `query`, or None.
+
+        Searches the screen, then the scrollback (and its spool). Case is
+        ignored unless `query` has capitals.
+        """
+        if not query:
+            return None
+        size = len(self)
+        before = size if before is None else min(before, size)
+        base = size - self._used_rows()
+        fold = query.lower() == query
+        for index in range(before - 1, base - 1, -1):
+            text = self.line_text(index)
+            if query in (text.lower() if fold else text):
+                return index
+        if self._alternate is not None:
+            return None
+        return self.scrollback.rfind(query, min(before, base))
+
+    def take_changes(self) -> Tuple[bool, Set[int]]:
+        """What changed since the last call: (layout changed, dirty line indexes)."""
+        shown = self._used_rows()
+        structural = self._structural or shown != self._shown_rows
+        base = 0 if self._alternate is not None else len(self.scrollback)
+        dirty = {base + y for y in self._dirty if y < shown}
+        self._structural = False
+        self._shown_rows = shown
+        self._dirty = set()
+        return structural, dirty
+
+    def resize(self, columns: int, rows: int) -> None:
+        self.columns = max(1, columns)
+        rows = max(1, rows)
+        if rows == self.rows:
+            return
+        self.rows = rows
+        while len(self._main) > rows:
+            self._freeze(self._main.pop(0))
+            if self._alternate is None:
+                self.y = max(0, self.y - 1)
+        if self._alternate is not None:
+            del self._alternate[rows:]
+        self.y = min(self.y, rows - 1)
+        self.top, self.bottom = 0, rows - 1
+        self._structural = True
+
+    def clear(self) -> None:
+        """Forget the scrollback and the screen."""
+        self.scrollback.clear()
+        del self.lines[:]
+        self.x = self.y = 0
+        self.width = 0
+        self._structural = True
+
+    def write_line(self, text: str) -> None:
+        """Put `text` on a line of its own, e.g. to echo a command."""
+        if self.x > 0 or (self.y < len(self.lines) and len(self.lines[self.y])):
+            self._index()
+        self.x = 0
+        self._print(text)
+        self._index()
+        self.x = 0
+
+    # Parsing
+
+    def feed(self, text: str) -> List[str]:
+        """Process shell output. Returns the non-blank lines it completed."""
+        if self._pending:
+            text, self._pending = self._pending + text, ""
+        self._completed = completed = []
+        search, match_escape = _SPECIAL.search, _ESCAPE.match
+        match_plain = (_PLAIN_LINES_LF if self.newline_mode else _PLAIN_LINES).match
+        pos, end = 0, len(text)
+        while pos < end:
+            if self.x == 0 and self._can_bulk():
+                plain = match_plain(text, pos)
+                if plain is not None:
+                    self._bulk_lines(plain.group())
+                    pos = plain.end()
+                    continue
+            special = search(text, pos)
+            if special is None:
+                self._print(text[pos:])
+                break
+            i = special.start()
+            if i > pos:
+                self._print(text[pos:i])
+            char = text[i]
+            if char == "\x1b":
+                escape = match_escape(text, i)
+                if escape is None:
+                    if end - i < MAX_PENDING and _ESCAPE_PREFIX.match(text, i):
+                        self._pending = text[i:]
+                        break
+                    pos = i + 1  # Not a sequence we know; drop the ESC
+                    continue
+                self._escape(escape)
+                pos = escape.end()
+            else:
+                self._control(char)
+                pos = i + 1
+        return completed
+
+    def _can_bulk(self) -> bool:
+        """Whether plain lines can skip the parser: the cursor is on an empty
+        last row of the main screen with no margins or attributes set."""
+        lines, y = self.lines, self.y
+        return (self._alternate is None and self.style == 0 and not self.insert_mode
+                and self.top == 0 and self.bottom == self.rows - 1
+                and y >= len(lines) - 1 and (y >= len(lines) or not len(lines[y])))
+
+    def _bulk_lines(self, text: str) -> None:
+        """Print whole lines, each ending in a newline, at the cursor.
+
+        Equivalent to parsing them, but lines that scroll straight off
+        the screen go to the scrollback without becoming rows.
+        """
+        new = text.split("\n")
+        new.pop()
+        if "\r" in text:
+            new = [line[:-1] if line.endswith("\r") else line for line in new]
+        self._completed.extend(line for line in map(str.rstrip, new) if line)
+        widest = max(map(len, new))
+        if widest > self.width:
+            self.width = widest
+
+        lines, y = self.lines, self.y
+        del lines[y:]
+        while len(lines) < y:
+            lines.append(Row())
+        final_y = min(y + len(new), self.rows - 1)
+        scrolled = y + len(new) - final_y
+        if scrolled:
+            kept = min(scrolled, y)
+            for row in lines[:kept]:
+                self._freeze(row)
+            del lines[:kept]
+            self.scrollback.extend(new[:scrolled - kept])
+            new = new[scrolled - kept:]
+            self._structural = True
+        for line in new:
+            row = Row()
+            row.write(0, line, 0)
+            lines.append(row)
+        self._dirty.update(range(final_y - len(new), final_y))
+        self.y = final_y
+
+    def _row(self, y: int) -> Row:
+        lines = self.lines
+        while len(lines) <= y:
+            lines.append(Row())
+        return lines[y]
+
+    def _print(self, text: str) -> None:
+        row = self._row(self.y)
+        if self.insert_mode:
+            row.insert(self.x, len(text))
+        row.write(self.x, text, self.style)
+        self.x += len(text)
+        if len(row) > self.width:
+            self.width = len(row)
+            self._structural = True
+        self._dirty.add(self.y)
+
+    def _control(self, char: str) -> None:
+        if char == "\n" or char == "\x0b" or char == "\x0c":
+            if self._alternate is None and self.y < len(self.lines):
+                text = self.lines[self.y].text.rstrip()
+                if text:
+                    self._completed.append(text)
+            if self.newline_mode:
+                self.x = 0
+            self._index()
+        elif char == "\r":
+            self.x = 0
+        elif char == "\x08":
+            self.x = max(0, self.x - 1)
+        elif char == "\t":
+            self.x = max(self.x, min(self.columns - 1, (self.x // 8 + 1) * 8))  # Stops at the last column
+
+    def _index(self) -> None:
+        """Move down a row, scrolling at the bottom margin."""
+        if self.y == self.bottom:
+            self._scroll_up(1)
+        elif self.y < self.rows - 1:
+            self.y += 1
+
+    def _reverse_index(self) -> None:
+        if self.y == self.top:
+            self._scroll_down(1)
+        elif self.y > 0:
+            self.y -= 1
+
+    def _freeze(self, row: Row) -> None:
+        self.scrollback.append(row.freeze())
+
+    def _scroll_up(self, count: int) -> None:
+        lines, top, bottom = self.lines, self.top, self.bottom
+        full_screen = self._alternate is None and top == 0
+        for _ in range(min(count, bottom - top + 1)):
+            if full_screen and bottom == self.rows - 1:
+                if lines:
+                    self._freeze(lines.pop(0))
+                else:
+                    self.scrollback.append("")
+                continue
+            self._row(bottom)
+            row = lines.pop(top)
+            if full_screen:
+                self._freeze(row)
+            lines.insert(bottom, Row())
+        self._structural = True
+
+    def _scroll_down(self, count: int) -> None:
+        lines, top, bottom = self.lines, self.top, self.bottom
+        for _ in range(min(count, bottom - top + 1)):
+            self._row(bottom)
+            del lines[bottom]
+            lines.insert(top, Row())
+        self._structural = True
+
+    def _escape(self, match: "re.Match") -> None:
+        final = match.group("final")
+        if final is not None:
+            self._csi(match.group("params"), final)
+            return
+        esc = match.group("esc")
+        if esc is None or match.group("inter"):
+            return  # OSC and DCS strings, charset designations
+        if esc == "7":
+            self._save_cursor()
+        elif esc == "8":
+            self._restore_cursor()
+        elif esc == "D":
+            self._index()
+        elif esc == "E":
+            self.x = 0
+            self._index()
+        elif esc == "M":
+            self._reverse_index()
+        elif esc == "c":
+            if self._alternate is not None:
+                self._leave_alternate()
+            self._reset_modes()
+            self.clear()
+
+    def _save_cursor(self) -> None:
+        self._saved = (self.x, self.y, self.style, self._fg, self._bg, self._flags)
+
+    def _restore_cursor(self) -> None:
+        self.x, self.y, self.style, self._fg, self._bg, self._flags = self._saved
+        self.y = min(self.y, self.rows - 1)
+
+    def _enter_alternate(self) -> None:
+        if self._alternate is None:
+            self._save_cursor()
+            self._alternate = self.lines = []
+            self.x = self.y = 0
+            self._structural = True
+
+    def _leave_alternate(self) -> None:
+        if self._alternate is not None:
+            self._alternate = None
+            self.lines = self._main
+            self.top, self.bottom = 0, self.rows - 1
+            self._restore_cursor()
+            self._structural = True
+
+    def _csi(self, params: str, final: str) -> None:
+        private = params[:1] in ("?", ">", "<", "=")
+        if private:
+            marker, params = params[0], params[1:]
+        if any(byte in params for byte in "<=>?"):
+            return  # A marker after the first byte is malformed; terminals ignore the sequence
+        args = [int(part.split(":")[0] or 0) for part in params.split(";")] if params else []
+
+        def arg(i: int = 0, default: int = 1) -> int:
+            return (args[i] if i < len(args) else 0) or default
+
+        if private:
+            if marker == "?" and final in "hl":
+                for mode in args:
+                    if mode in (47, 1047, 1049):
+                        self._enter_alternate() if final == "h" else self._leave_alternate()
+            return
+
+        if final == "m":
+            self._sgr(args)
+        elif final == "A":
+            self.y = max(self.top if self.y >= self.top else 0, self.y - arg())
+        elif final in "Be":
+            self.y = min(self.bottom if self.y <= self.bottom else self.rows - 1, self.y + arg())
+        elif final in "Ca":
+            self.x = min(self.columns - 1, self.x + arg())
+        elif final == "D":
+            self.x = max(0, self.x - arg())
+        elif final == "E":
+            self.x, self.y = 0, min(self.rows - 1, self.y + arg())
+        elif final == "F":
+            self.x, self.y = 0, max(0, self.y - arg())
+        elif final in "G`":
+            self.x = min(self.columns - 1, arg() - 1)
+        elif final == "d":
+            self.y = min(self.rows - 1, arg() - 1)
+        elif final in "Hf":
+            self.y = min(self.rows - 1, arg(0) - 1)
+            self.x = min(self.columns - 1, arg(1) - 1)
+        elif final == "J":
+            self._erase_display(arg(0, 0))
+        elif final == "K":
+            self._erase_line(arg(0, 0))
+        elif final == "L":
+            if self.top <= self.y <= self.bottom:
+                top, self.top = self.top, self.y
+                self._scroll_down(arg())
+                self.top = top
+        elif final == "M":
+            if self.top <= self.y <= self.bottom:
+                top, self.top = self.top, self.y
+                self._delete_lines(arg())
+                self.top = top
+        elif final == "P":
+            self._row(self.y).delete(self.x, arg())
+            self._dirty.add(self.y)
+        elif final == "@":
+            self._row(self.y).insert(self.x, min(arg(), max(0, self.columns - self.x)))  # No more than fit
+            self._dirty.add(self.y)
+        elif final == "X":
+            self._row(self.y).erase(self.x, self.x + min(arg(), max(0, self.columns - self.x)))
+            self._dirty.add(self.y)
+        elif final == "S":
+            self._scroll_up(arg())
+        elif final == "T":
+            self._scroll_down(arg())
+        elif final == "r":
+            top, bottom = arg(0) - 1, min(self.rows, arg(1, self.rows)) - 1
+            if top < bottom:
+                self.top, self.bottom = top, bottom
+                self.x = self.y = 0
+        elif final == "s":
+            self._save_cursor()
+        elif final == "u":
+            self._restore_cursor()
+        elif final in "hl":
+            if 4 in args:
+                self.insert_mode = final == "h"
+        elif final == "n" and self.respond:
+            if arg(0, 0) == 6:
+                self.respond(f"\x1b[{self.y + 1};{self.x + 1}R")
+            elif arg(0, 0) == 5:
+                self.respond("\x1b[0n")
+        elif final == "c" and self.respond:
+            self.respond("\x1b[?1;2c")
+
+    def _delete_lines(self, count: int) -> None:
+        """Delete rows at the cursor within the margins; they are not kept."""
+        lines, top, bottom = self.lines, self.top, self.bottom
+        for _ in range(min(count, bottom - top + 1)):
+            self._row(bottom)
+            del lines[top]
+            lines.insert(bottom, Row())
+        self._structural = True
+
+    def _erase_display(self, mode: int) -> None:
+        lines = self.lines
+        if mode == 0:
+            if self.y < len(lines):
+                lines[self.y].erase(self.x)
+                del lines[self.y + 1:]
+        elif mode == 1:
+            for y in range(min(self.y, len(lines))):
+                lines[y] = Row()
+            if self.y < len(lines):
+                lines[self.y].erase(0, self.x + 1)
+        elif mode == 2:
+            del lines[:]
+        elif mode == 3 and self._alternate is None:
+            self.scrollback.clear()
+        self._structural = True
+
+    def _erase_line(self, mode: int) -> None:
+        if self.y >= len(self.lines):
+            return
+        row = self.lines[self.y]
+        if mode == 0:
+            row.erase(self.x)
+        elif mode == 1:
+            row.erase(0, self.x + 1)
+        elif mode == 2:
+            row.erase(0)
+        self._dirty.add(self.y)
+
+    def _sgr(self, args: List[int]) -> None:
+        fg, bg, flags = self._fg, self._bg, self._flags
+        if not args:
+            args = [0]
+        i = 0
+        while i < len(args):
+            code = args[i]
+            if code == 0:
+                fg = bg = None
+                flags = 0
+            elif code in _SGR_FLAGS:
+                flags |= _SGR_FLAGS[code]
+            elif code in _SGR_RESETS:
+                flags &= ~_SGR_RESETS[code]
+            elif 30 <= code <= 37:
+                fg = code - 30
+            elif 40 <= code <= 47:
+                bg = code - 40
+            elif 90 <= code <= 97:
+                fg = code - 90 + 8
+            elif 100 <= code <= 107:
+                bg = code - 100 + 8
+            elif code == 39:
+                fg = None
+            elif code == 49:
+                bg = None
+            elif code in (38, 48):
+                color = None
+                if args[i + 1:i + 2] == [5] and i + 2 < len(args):
+                    color = min(255, args[i + 2])
+                    i += 2
+                elif args[i + 1:i + 2] == [2] and i + 4 < len(args):
+                    color = tuple(min(255, c) for c in args[i + 2:i + 5])
+                    i += 4
+                if code == 38:
+                    fg = color
+                else:
+                    bg = color
+            i += 1
+        self._fg, self._bg, self._flags = fg, bg, flags
+        self.style = self.styles.intern(fg, bg, flags)
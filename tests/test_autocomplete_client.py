@@ -0,0 +1,80 @@
+import asyncio
+import os
+
+from benchmarks.mock_openrouter import MockOpenRouter
+from sprig.autocomplete_client import AutocompleteClient
+from sprig.completion_service import CompletionService
+from sprig.completion_store import CompletionStore
+from sprig.history_store import HistoryStore
+
+
+class _Terminal:
+    current_input = ""
+
+
+async def _client(server: MockOpenRouter) -> AutocompleteClient:
+    os.environ.setdefault("OPENROUTER_API_KEY", "test")
+    os.environ["OPENROUTER_BASE_URL"] = server.url
+    service = CompletionService("gpt-4o-mini", history=HistoryStore(os.devnull), store=CompletionStore(":memory:"))
+    client = AutocompleteClient(_Terminal(), service=service)
+    await client.warm_up()
+    return client
+
+
+def test_cancelled_stream_is_not_cached():
+    async def run():
+        async with MockOpenRouter(tokens=["status", " --short", " --branch"], token_interval=0.2) as server:
+            client = await _client(server)
+            key = ("git ", client.context.version)
+            shown = []
+            client.set_suggestion_callback(shown.append)
+            task = asyncio.create_task(client.get_suggestion("> git", "", cache_key=key))
+            while not shown:
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            assert client.cache.lookup("git ", client.context.version) is None
+            assert client._candidate_tail("git ") is None
+
+            assert await client.get_suggestion("> git", "", cache_key=key) == "status --short --branch"
+            assert client.cache.lookup("git ", client.context.version) == "status --short --branch"
+            await client.aclose()
+            await client.service.aclose()
+
+    asyncio.run(run())
+
+
+def test_input_is_requested_once_the_circuit_closes():
+    async def run():
+        async with MockOpenRouter(tokens=["status"]) as server:
+            client = await _client(server)
+            governor = client.service.governor
+            governor._open(0.3)
+            requests = server.requests
+            client.terminal.current_input = "git "
+            client.check_for_autocomplete()
+            await asyncio.sleep(0.1)
+            assert server.requests == requests
+            await asyncio.sleep(0.5)
+            assert server.requests == requests + 1
+            assert client.suggestion == "status"
+            await client.aclose()
+            await client.service.aclose()
+
+    asyncio.run(run())
+
+
+def test_dropped_stream_is_not_cached_or_stored():
+    async def run():
+        async with MockOpenRouter(tokens=["status", " --short"], drop_after=1) as server:
+            client = await _client(server)
+            key = ("git ", client.context.version)
+            assert await client.get_suggestion("> git", "", cache_key=key) is None
+            assert server.dropped == 1
+            assert client.cache.lookup("git ", client.context.version) is None
+            assert client.store.lookup("git ", client._cwd(), client._store_context) is None
+            assert client._candidate_tail("git ") is None
+            await client.aclose()
+            await client.service.aclose()
+
+    asyncio.run(run())
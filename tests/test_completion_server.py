@@ -0,0 +1,26 @@
+import asyncio
+import os
+import tempfile
+
+from benchmarks.mock_openrouter import MockOpenRouter
+from sprig.completion_server import CompletionServer
+from sprig.completion_store import CompletionStore
+
+
+def test_dropped_stream_is_not_stored():
+    async def run():
+        async with MockOpenRouter(tokens=["status", " --short"], drop_after=1) as server:
+            os.environ.setdefault("OPENROUTER_API_KEY", "test")
+            os.environ["OPENROUTER_BASE_URL"] = server.url
+            daemon = CompletionServer(os.path.join(tempfile.mkdtemp(), "sprig.sock"), model_name="gpt-4o-mini",
+                                      store=CompletionStore(":memory:"))
+            await daemon.start()
+            assert await daemon.complete("git ", "/repo", []) == ""
+            assert daemon.store.lookup("git ", "/repo", CompletionStore.context_key([])) is None
+
+            server.drop_after = None
+            assert await daemon.complete("git ", "/repo", []) == "status --short"
+            assert daemon.store.lookup("git ", "/repo", CompletionStore.context_key([])) == "status --short"
+            await daemon.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+import asyncio
+import os
+
+from benchmarks.mock_openrouter import MockOpenRouter
+from sprig.completion_service import CompletionService
+from sprig.completion_store import CompletionStore
+from sprig.history_store import HistoryStore
+
+
+def test_stream_failing_midway_counts_as_failed():
+    async def run():
+        async with MockOpenRouter(tokens=["status", " --short"], drop_after=1) as server:
+            os.environ.setdefault("OPENROUTER_API_KEY", "test")
+            os.environ["OPENROUTER_BASE_URL"] = server.url
+            service = CompletionService("gpt-4o-mini", history=HistoryStore(os.devnull),
+                                        store=CompletionStore(":memory:"))
+            governor = service.governor
+            async for ranked in governor.get_completion("> git", ""):
+                assert ranked == ["status"]
+            assert governor.stats["failed"] == 1
+            assert list(governor._outcomes) == ["failed"]
+
+            for _ in range(governor.CONSECUTIVE_FAILURES - 1):
+                async for _ranked in governor.get_completion("> git", ""):
+                    pass
+            assert governor.state == "open"
+            await service.aclose()
+
+    asyncio.run(run())
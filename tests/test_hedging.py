@@ -0,0 +1,30 @@
+import asyncio
+import os
+
+from benchmarks.mock_openrouter import MockOpenRouter
+from sprig.ai_completer import AICompleter
+from sprig.hedging import HedgedCompleter
+from sprig.latency import CompletionSpan
+
+
+def test_secondary_win_keeps_primary_wait_and_its_own_tokens():
+    async def run():
+        os.environ.setdefault("OPENROUTER_API_KEY", "test")
+        async with MockOpenRouter(tokens=["status"], ttft=2.0) as primary_server, \
+                MockOpenRouter(tokens=["log", " --oneline"], ttft=0.05) as secondary_server:
+            primary = AICompleter("gpt-4o-mini", base_url=primary_server.url)
+            secondary = AICompleter("anthropic-sonnet", base_url=secondary_server.url, client=primary.client)
+            hedger = HedgedCompleter(primary, secondary, default_delay=0.2)
+            await hedger.warm_up()
+            span = CompletionSpan()
+            suggestions = [ranked async for ranked in hedger.get_completion("> git", "", span)]
+            assert suggestions[-1] == ["log --oneline"]
+            assert hedger.stats["secondary_wins"] == 1
+            assert span.tokens == 2 and span.error is None
+            assert hedger.stats["secondary_tokens"] == 2 and hedger.stats["primary_tokens"] == 0
+            # The primary was cut off after the hedge delay: that wait is a lower bound on its time to first token
+            assert len(hedger._ttfts) == 1
+            assert hedger._ttfts.percentile(0.5) >= 0.2
+            await hedger.aclose()
+
+    asyncio.run(run())
@@ -0,0 +1,29 @@
+import asyncio
+
+from sprig.history_store import HistoryStore
+
+
+def test_appended_commands_are_found_by_other_sessions(tmp_path):
+    path = str(tmp_path / "history")
+    first, second = HistoryStore(path), HistoryStore(path)
+    asyncio.run(second.load())
+    for command in ("git status", "git stash pop", "ls -la\nwc -l"):
+        first.append(command)
+    first.close()
+
+    assert second.search("stash") == ["git stash pop"]
+    assert second.search("wc")[0] == "ls -la\nwc -l"
+    assert second.index.complete("git s")
+
+    third = HistoryStore(path)
+    asyncio.run(third.load())
+    assert third.search("git")[:2] == ["git stash pop", "git status"]
+
+
+def test_own_commands_are_searchable_before_the_file_is_loaded(tmp_path):
+    store = HistoryStore(str(tmp_path / "history"))
+    store.append("make test")
+    assert store.search("test") == ["make test"]
+    asyncio.run(store.load())
+    assert store.search("test") == ["make test"]
+    store.close()
@@ -0,0 +1,32 @@
+import asyncio
+import locale
+
+from sprig.pty_shell import PtyShell
+from sprig.shell import Shell
+
+
+async def _run(shell: Shell, text: str = "") -> str:
+    output = []
+    exited = asyncio.Event()
+
+    async def collect(chunk: str) -> None:
+        output.append(chunk)
+
+    await shell.start(collect)
+    reader = shell._reader_task
+    reader.add_done_callback(lambda _: exited.set())
+    if text:
+        shell.write(text)
+    await asyncio.wait_for(exited.wait(), 5)
+    return "".join(output)
+
+
+def test_input_and_output_use_one_encoding(monkeypatch):
+    monkeypatch.setattr(locale, "getpreferredencoding", lambda do_setlocale=True: "latin-1")
+    for shell in (Shell("head -n 1"), PtyShell("head -n 1")):
+        assert asyncio.run(_run(shell, "café\n")).rstrip("\r\n") == "café"
+
+
+def test_escape_held_at_the_end_of_output_is_delivered():
+    shell = PtyShell("printf 'done\\033]0;title'")
+    assert asyncio.run(_run(shell)).endswith("done\x1b]0;title")
@@ -0,0 +1,18 @@
+from sprig.vt_screen import VTScreen
+
+
+def test_misplaced_private_marker_is_ignored():
+    screen = VTScreen(80, 5)
+    screen.feed("\x1b[1?hab\x1b[?1;2>lcd\x1b[2;3Hx")
+    assert screen.line_text(0).rstrip() == "abcd"
+    assert screen.line_text(1).rstrip() == "  x"
+
+
+def test_oversized_insert_and_erase_stay_within_the_width():
+    screen = VTScreen(10, 3)
+    screen.feed("abcdef\x1b[1;3H\x1b[300000000@")
+    assert screen.line_text(0) == "ab" + " " * 8 + "cdef"
+    screen.feed("\x1b[2;1Habcdefghij\x1b[2;3H\x1b[300000000X")
+    assert screen.line_text(1).rstrip() == "ab"
+    screen.feed("\x1b[3;1H\t\t\t\tz")
+    assert screen.line_text(2).rstrip() == " " * 9 + "z"